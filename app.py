@@ -12,6 +12,7 @@ from datetime import datetime, timedelta
 import atexit
 import json  # Для логирования проблемных товаров в формате JSON
 import threading
+import uuid
 from flask import Flask, request, jsonify, render_template, session, redirect, url_for, Response, abort
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
@@ -22,7 +23,18 @@ from flask_caching import Cache
 from sqlalchemy.exc import IntegrityError
 from zoneinfo import ZoneInfo  # Для работы с timezone-aware объектами
 from apscheduler.schedulers.background import BackgroundScheduler
-from smart_search import search_products
+from product_attributes import normalize_filters
+from smart_search import (search_products, search_products_batch, SORT_OPTIONS, refresh_search_structures, ensure_search_data, update_search_data,
+                          warm_lemma_cache, result_cache_stats, lemma_cache_stats)
+from search_fts import ensure_fts_index
+from suggest import get_suggest_index, refresh_suggest_index, record_search_query, flush_search_queries
+from product_matching import load_product_matches, rebuild_product_matches, group_offers
+from driver_pool import driver_pool
+from page_loader import fetch_stats
+from circuit_breaker import breaker_stats
+from crawler import crawl_progress, crawl_running, run_crawl
+from page_changes import PageTracker, change_stats, load_page_fingerprints, save_page_fingerprints
+import config
 
 
 
@@ -70,6 +82,22 @@ def populate_search_query():
         db.session.commit()
         app.logger.info("Updated search_query for existing records.")
 
+# Перед первым запросом дополняем предвычисленные данные для поиска и строим инвертированный индекс
+@app.before_first_request
+def build_search_index():
+    db.create_all()  # создаёт таблицу product_search_data, если её ещё нет
+    updated = ensure_search_data()
+    if updated:
+        app.logger.info("Precomputed search data for %d products.", updated)
+    index = refresh_search_structures()
+    app.logger.info("Search index built: %d products, %d terms", len(index), len(index.postings))
+    refresh_suggest_index()
+    load_product_matches()
+    # Прогреваем кэш лемм по словарю каталога в фоне, не задерживая первый запрос
+    threading.Thread(target=warm_lemma_cache, daemon=True).start()
+    if config.SEARCH_ENGINE == "fts":
+        ensure_fts_index()
+
 # ---------------------
 # Основные маршруты
 # ---------------------
@@ -84,27 +112,18 @@ def cart():
 # ---------------------
 # Вспомогательные функции для API поиска
 # ---------------------
-def is_refinement(new_query, base_query):
-    new_tokens = new_query.lower().split()
-    base_tokens = base_query.lower().split()
-    if new_tokens == base_tokens:
-        return False
-
-    def is_numeric(token):
-        try:
-            float(token)
-            return True
-        except ValueError:
-            return False
-
-    base_non_numeric = [token for token in base_tokens if not is_numeric(token)]
-    return all(token in new_tokens for token in base_non_numeric)
+# Идентификатор сессии поиска: по нему уточняющие запросы находят кандидатов предыдущего
+def search_session_key():
+    if "search_session" not in session:
+        session["search_session"] = uuid.uuid4().hex
+    return session["search_session"]
 
 async def run_parsers(query, stores, timeout=6):
     loop = asyncio.get_event_loop()
     tasks = {}
     for store, func in stores.items():
-        future = loop.run_in_executor(None, func, query)
+        # При обновлении выдачи на лету – только первая страница поиска магазина
+        future = loop.run_in_executor(None, func, query, config.LIVE_MAX_RESULT_PAGES)
         tasks[store] = asyncio.wait_for(future, timeout=timeout)
     results = {}
     for store, task in tasks.items():
@@ -121,19 +140,112 @@ async def run_parsers(query, stores, timeout=6):
 # ---------------------
 # API поиска
 # ---------------------
+# Общие параметры /api/search и /api/search/batch; при ошибке – ValueError с текстом для ответа
+def parse_search_options(data):
+    options = {}
+    # Флажок "только в наличии" приходит из JSON как true/false
+    available_only = data.get("availableOnly")
+    if available_only is not None and not isinstance(available_only, bool):
+        raise ValueError("Некорректный параметр availableOnly")
+    options["available_only"] = bool(available_only)
+    # Порог схожести – число от 0 до 100 (NaN не проходит проверку диапазона)
+    try:
+        threshold = data.get("similarityThreshold")
+        if isinstance(threshold, bool):
+            raise TypeError
+        options["similarity_threshold"] = float(threshold) if threshold not in (None, "") else 60
+    except (ValueError, TypeError):
+        raise ValueError("Некорректный параметр similarityThreshold")
+    if not 0 <= options["similarity_threshold"] <= 100:
+        raise ValueError("Некорректный параметр similarityThreshold")
+    # Постраничная выдача: limit/offset действуют в пределах каждого магазина
+    try:
+        limit = data.get("limit")
+        options["limit"] = int(limit) if limit is not None else None
+        options["offset"] = max(int(data.get("offset", 0)), 0)
+    except (ValueError, TypeError):
+        raise ValueError("Некорректные параметры limit/offset")
+    if options["limit"] is not None and options["limit"] <= 0:
+        raise ValueError("Некорректные параметры limit/offset")
+    # Фильтры по атрибутам: {"volume_ml": {"min": 300, "max": 500}, "material": "пп", ...}
+    try:
+        options["filters"] = normalize_filters(data.get("filters"))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Некорректные фильтры: {e}")
+    # Диапазон цен и сортировка выполняются на сервере
+    try:
+        min_price = data.get("minPrice")
+        max_price = data.get("maxPrice")
+        options["min_price"] = float(min_price) if min_price not in (None, "") else None
+        options["max_price"] = float(max_price) if max_price not in (None, "") else None
+    except (ValueError, TypeError):
+        raise ValueError("Некорректные параметры minPrice/maxPrice")
+    options["sort"] = data.get("sort") or "default"
+    if options["sort"] not in SORT_OPTIONS:
+        raise ValueError("Некорректный параметр sort")
+    return options
+
 @app.route('/api/search', methods=['POST'])
 def api_search():
     data = request.get_json()
     query = data.get("query", "").strip()
     if not query:
         return jsonify({"error": "Пустой запрос"}), 400
-    available_only = data.get("availableOnly", False)
-    similarity_threshold = data.get("similarityThreshold", 60)
-    grouped_results = search_products(query, available_only=available_only, similarity_threshold=similarity_threshold)
-    
+    try:
+        options = parse_search_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    limit, offset, sort = options.pop("limit"), options.pop("offset"), options.pop("sort")
+    # groupBy="offers": вместо списков по магазинам – группы одинаковых товаров
+    # разных магазинов, в группе предложения от самой низкой цены за штуку
+    if data.get("groupBy") == "offers":
+        items = search_products(query, group=False, store=data.get("store"),
+                                session_key=search_session_key(), **options)
+        return jsonify(group_offers(items, limit, offset, sort))
+    grouped_results = search_products(query, limit=limit, offset=offset, store=data.get("store"), sort=sort,
+                                      session_key=search_session_key(), **options)
+    # В историю для подсказок попадают только запросы, по которым что-то нашлось
+    # (и только первая страница, чтобы листание не считалось повторным поиском)
+    if grouped_results and offset == 0 and not data.get("store"):
+        record_search_query(query)
+
     return jsonify(grouped_results)
 
 
+# Поиск по списку запросов (например, вставленному списку закупок): по одному запросу в строке
+# или массивом. Ответ – {запрос: результаты по магазинам, как у /api/search}.
+@app.route('/api/search/batch', methods=['POST'])
+def api_search_batch():
+    data = request.get_json() or {}
+    queries = data.get("queries")
+    if isinstance(queries, str):
+        queries = queries.splitlines()
+    if not isinstance(queries, list):
+        return jsonify({"error": "queries должен быть списком запросов"}), 400
+    queries = [query.strip() for query in queries if isinstance(query, str) and query.strip()]
+    if not queries:
+        return jsonify({"error": "Пустой список запросов"}), 400
+    if len(queries) > config.BATCH_MAX_QUERIES:
+        return jsonify({"error": f"Не больше {config.BATCH_MAX_QUERIES} запросов за раз"}), 400
+    try:
+        options = parse_search_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    options.pop("offset")
+    return jsonify(search_products_batch(queries, **options))
+
+
+@app.route('/api/suggest')
+def api_suggest():
+    prefix = request.args.get("q", "")
+    try:
+        limit = min(max(int(request.args.get("limit", config.SUGGEST_LIMIT)), 1), 50)
+    except ValueError:
+        return jsonify({"error": "Некорректный параметр limit"}), 400
+    index = get_suggest_index() or refresh_suggest_index()
+    return jsonify({"query": prefix, "suggestions": index.suggest(prefix, limit)})
+
+
 @app.route('/api/search/update', methods=['POST'])
 def api_search_update():
     data = request.get_json()
@@ -380,11 +492,34 @@ def profile():
 def admin_update_products():
     if not getattr(current_user, "is_admin", False):
         abort(403)
+    if crawl_running():
+        return jsonify({"message": "Обновление товаров уже идёт."}), 409
     # Запускаем фоновый парсер в отдельном потоке, чтобы не блокировать запрос
     thread = threading.Thread(target=lambda: (app.app_context().push(), background_parser_job()))
     thread.start()
     return jsonify({"message": "Обновление товаров запущено."})
 
+# ---------------------
+# Статистика поисковых кэшей – доступна только администратору
+# ---------------------
+@app.route('/admin/search_stats')
+@login_required
+def admin_search_stats():
+    if not getattr(current_user, "is_admin", False):
+        abort(403)
+    return jsonify({"result_cache": result_cache_stats(), "lemma_cache": lemma_cache_stats()})
+
+# ---------------------
+# Статистика парсеров (ход обхода, пропуск неизменившихся страниц, способы загрузки, автоматы
+# отключения магазинов, пул драйверов) – доступна только администратору
+# ---------------------
+@app.route('/admin/parser_stats')
+@login_required
+def admin_parser_stats():
+    if not getattr(current_user, "is_admin", False):
+        abort(403)
+    return jsonify({"crawl": crawl_progress.snapshot(), "changes": change_stats.snapshot(), "fetch": fetch_stats.snapshot(), "breakers": breaker_stats(), "driver_pool": driver_pool.stats()})
+
 # ---------------------
 # Фоновый парсер и планировщик
 # ---------------------
@@ -398,20 +533,111 @@ ph_formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s')
 ph.setFormatter(ph_formatter)
 problematic_logger.addHandler(ph)
 
+def save_parsed_products(query, store_name, products_list):
+    """
+    Записывает товары, найденные парсером магазина store_name по запросу query:
+      - Ищется запись по уникальному полю link.
+      - Если запись существует, выполняется сравнение всех полей (name, search_query, price,
+        price_display, site, img_url, quantity, step, availability). При обнаружении изменений запись
+        обновляется новыми данными (включая время обновления).
+      - Если записи нет – создаётся новая.
+      - Обработка каждого товара осуществляется в отдельном вложенном блоке транзакции,
+        так что ошибка одного товара не отменяет обновление остальных.
+    В случае появления ошибки (например, UNIQUE constraint или NOT NULL для price) данные о проблемном товаре и
+    описание ошибки логируются в файл problematic_products.log в формате JSON.
+    Возвращает False, если товары не удалось сохранить.
+    """
+    try:
+        for prod in products_list:
+            try:
+                # Обрабатываем отдельный товар в блоке вложенной транзакции.
+                with db.session.begin_nested():
+                    existing = Product.query.filter_by(link=prod["link"]).first()
+                    new_last_updated = datetime.utcnow()
+                    # Если price равен None, преобразуем его в 0.
+                    price = prod.get("price") if prod.get("price") is not None else 0
+                    new_data = {
+                        "name": prod["name"],
+                        "search_query": prod["name"].lower(),
+                        "price": price,
+                        "price_display": prod.get("price_display", str(price)),
+                        "site": prod.get("site"),
+                        "img_url": prod.get("img_url", ""),
+                        "quantity": prod.get("quantity", 1),
+                        "step": prod.get("step", 1),
+                        "availability": prod.get("availability", "Неизвестно"),
+                        "last_updated": new_last_updated
+                    }
+                    if existing:
+                        # Если хотя бы одно поле отличается – обновляем запись.
+                        if (existing.name != new_data["name"] or
+                            existing.search_query != new_data["search_query"] or
+                            existing.price != new_data["price"] or
+                            existing.price_display != new_data["price_display"] or
+                            existing.site != new_data["site"] or
+                            existing.img_url != new_data["img_url"] or
+                            existing.quantity != new_data["quantity"] or
+                            existing.step != new_data["step"] or
+                            existing.availability != new_data["availability"]):
+                            existing.name = new_data["name"]
+                            existing.search_query = new_data["search_query"]
+                            existing.price = new_data["price"]
+                            existing.price_display = new_data["price_display"]
+                            existing.site = new_data["site"]
+                            existing.img_url = new_data["img_url"]
+                            existing.quantity = new_data["quantity"]
+                            existing.step = new_data["step"]
+                            existing.availability = new_data["availability"]
+                            existing.last_updated = new_data["last_updated"]
+                            update_search_data(existing)
+                    else:
+                        new_product = Product(
+                            name=new_data["name"],
+                            search_query=new_data["search_query"],
+                            price=new_data["price"],
+                            price_display=new_data["price_display"],
+                            site=new_data["site"],
+                            link=prod["link"],
+                            img_url=new_data["img_url"],
+                            quantity=new_data["quantity"],
+                            step=new_data["step"],
+                            availability=new_data["availability"],
+                            last_updated=new_data["last_updated"]
+                        )
+                        db.session.add(new_product)
+                        db.session.flush()  # получаем id для предвычисленных данных поиска
+                        update_search_data(new_product)
+                # Завершаем вложенную транзакцию для товара
+            except Exception as prod_e:
+                db.session.rollback()
+                problematic_entry = {
+                    "query": query,
+                    "store": store_name,
+                    "product_data": prod,
+                    "error": str(prod_e),
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+                problematic_logger.error(json.dumps(problematic_entry, ensure_ascii=False))
+                continue
+        db.session.commit()
+    except IntegrityError as ie:
+        app.logger.error(f"IntegrityError в запросе '{query}', магазин {store_name}: {ie}")
+        db.session.rollback()
+        return False
+    except Exception as e:
+        app.logger.error(f"Ошибка обработки данных для запроса '{query}', магазин {store_name}: {e}")
+        db.session.rollback()
+        return False
+    return True
+
 def background_parser_job():
     """
-    Обновлённый фоновый парсер для предопределённых запросов:
-      - Для каждого запроса в PREDEFINED_QUERIES и для каждого магазина
-      - Вызывается соответствующий парсер, и для каждого товара:
-           • Ищется запись по уникальному полю link.
-           • Если запись существует, выполняется сравнение всех полей (name, search_query, price,
-             price_display, site, img_url, quantity, step, availability). При обнаружении изменений запись
-             обновляется новыми данными (включая время обновления).
-           • Если записи нет – создаётся новая.
-           • Обработка каждого товара осуществляется в отдельном вложенном блоке транзакции,
-             так что ошибка одного товара не отменяет обновление остальных.
-      - В случае появления ошибки (например, UNIQUE constraint или NOT NULL для price) данные о проблемном товаре и
-        описание ошибки логируются в файл problematic_products.log в формате JSON.
+    Обновлённый фоновый парсер для предопределённых запросов: задачи (запрос из
+    config.PREDEFINED_QUERIES, магазин) выполняются параллельно (crawler.run_crawl),
+    найденные товары записывает save_parsed_products в одном потоке. Страницы выдачи,
+    не изменившиеся с прошлого обхода (page_changes), не разбираются, а задача, у
+    которой не изменилась ни одна страница, не трогает базу. Если обход уже идёт,
+    новый не запускается.
     """
     stores = {
         "gudvin": gudvin.parse_gudvin,
@@ -420,169 +646,38 @@ def background_parser_job():
         "artplast": artplast.parse_artplast,
         "newpackspb": newpackspb.parse_newpackspb
     }
-    PREDEFINED_QUERIES = [
-        "пакет фасовочный",
-        "палочки",
-        "Средство для кофейных",
-        "Мыло",
-        "Ножницы",
-        "Салфетки",
-        "Микрофибра",
-        "стакан",
-        "крышка",
-        "крышка для стакана",
-        "пакет",
-        "Контейнер",
-        "Крышка для контейнера",
-        "Коробка",
-        "Пакет-майка",
-        "Лента",
-        "Наклейка",
-        "Средство",
-        "Химия",
-        "Средство для очистки молочных систем",
-        "Средство для кофемашины",
-        "Средство для удаления кофейных масел",
-        "Кольца кодировочные",
-        "Тарталетка",
-        "Уголок",
-        "Уголки",
-        "Держатель для стаканов",
-        "Размешиватель",
-        "Трубочки",
-        "Трубочки прямые",
-        "Трубочки с изгибом",
-        "Вилка",
-        "Вилки",
-        "Ложка",
-        "Ложки",
-        "Нож",
-        "Ножи",
-        "Соусник",
-        "Бумага для выпечки",
-        "Пергамент",
-        "Мешок кондитерский",
-        "Бахилы",
-        "Одноразовые шапочки",
-        "Салфетки",
-        "салфетки влажные",
-        "Тряпка",
-        "Щетка",
-        "Губка",
-        "Мешок для мусора",
-        "Мешки для мусора",
-        "Пакет мусорный",
-        "Чековая лента",
-        "Этикет лента",
-        "Перчатки",
-        "Туалетная бумага",
-        "освежитель воздуха",
-        "Полотенце",
-        "Зубочистки",
-        "Тарелка",
-        "Антисептик",
-        "Сахар",
-        "Сахар порц",
-        "Соль",
-        "Соль порц",
-        "Перец",
-        "Перец порц",
-        "Корица",
-        
-        
-    ]
-    for query in PREDEFINED_QUERIES:
-        for store_name, parser_func in stores.items():
-            attempts = 0
-            products_list = []
-            success = False
-            while attempts < 3 and not success:
-                try:
-                    attempts += 1
-                    products_list = parser_func(query)
-                    success = True
-                except Exception as e:
-                    app.logger.error(f"Attempt {attempts}/3: Error loading {parser_func.__name__} for query '{query}': {e}")
-                    if attempts < 3:
-                        import time
-                        time.sleep(1)
-            app.logger.info(f"[{datetime.utcnow().isoformat()}] Обработал запрос '{query}' для магазина {store_name}, найдено товаров: {len(products_list)}")
-            try:
-                for prod in products_list:
-                    try:
-                        # Обрабатываем отдельный товар в блоке вложенной транзакции.
-                        with db.session.begin_nested():
-                            existing = Product.query.filter_by(link=prod["link"]).first()
-                            new_last_updated = datetime.utcnow()
-                            # Если price равен None, преобразуем его в 0.
-                            price = prod.get("price") if prod.get("price") is not None else 0
-                            new_data = {
-                                "name": prod["name"],
-                                "search_query": prod["name"].lower(),
-                                "price": price,
-                                "price_display": prod.get("price_display", str(price)),
-                                "site": prod.get("site"),
-                                "img_url": prod.get("img_url", ""),
-                                "quantity": prod.get("quantity", 1),
-                                "step": prod.get("step", 1),
-                                "availability": prod.get("availability", "Неизвестно"),
-                                "last_updated": new_last_updated
-                            }
-                            if existing:
-                                # Если хотя бы одно поле отличается – обновляем запись.
-                                if (existing.name != new_data["name"] or
-                                    existing.search_query != new_data["search_query"] or
-                                    existing.price != new_data["price"] or
-                                    existing.price_display != new_data["price_display"] or
-                                    existing.site != new_data["site"] or
-                                    existing.img_url != new_data["img_url"] or
-                                    existing.quantity != new_data["quantity"] or
-                                    existing.step != new_data["step"] or
-                                    existing.availability != new_data["availability"]):
-                                    existing.name = new_data["name"]
-                                    existing.search_query = new_data["search_query"]
-                                    existing.price = new_data["price"]
-                                    existing.price_display = new_data["price_display"]
-                                    existing.site = new_data["site"]
-                                    existing.img_url = new_data["img_url"]
-                                    existing.quantity = new_data["quantity"]
-                                    existing.step = new_data["step"]
-                                    existing.availability = new_data["availability"]
-                                    existing.last_updated = new_data["last_updated"]
-                            else:
-                                new_product = Product(
-                                    name=new_data["name"],
-                                    search_query=new_data["search_query"],
-                                    price=new_data["price"],
-                                    price_display=new_data["price_display"],
-                                    site=new_data["site"],
-                                    link=prod["link"],
-                                    img_url=new_data["img_url"],
-                                    quantity=new_data["quantity"],
-                                    step=new_data["step"],
-                                    availability=new_data["availability"],
-                                    last_updated=new_data["last_updated"]
-                                )
-                                db.session.add(new_product)
-                        # Завершаем вложенную транзакцию для товара
-                    except Exception as prod_e:
-                        db.session.rollback()
-                        problematic_entry = {
-                            "query": query,
-                            "store": store_name,
-                            "product_data": prod,
-                            "error": str(prod_e),
-                            "timestamp": datetime.utcnow().isoformat()
-                        }
-                        problematic_logger.error(json.dumps(problematic_entry, ensure_ascii=False))
-                        continue
-                db.session.commit()
-            except IntegrityError as ie:
-                app.logger.error(f"IntegrityError в запросе '{query}', магазин {store_name}: {ie}")
-                db.session.rollback()
-            except Exception as e:
-                app.logger.error(f"Ошибка обработки данных для запроса '{query}', магазин {store_name}: {e}")
-                db.session.rollback()
+    tasks = [(query, store_name) for query in dict.fromkeys(config.PREDEFINED_QUERIES) for store_name in stores]
+    fingerprints = load_page_fingerprints()
+    trackers = {}
+
+    def parse(query, store_name):
+        tracker = trackers[(query, store_name)] = PageTracker(store_name, query, fingerprints.get((store_name, query)))
+        products = stores[store_name](query, tracker=tracker, raise_errors=True)
+        change_stats.record(tracker)
+        return None if tracker.unchanged else products
+
+    def write(query, store_name, products_list):
+        # Отпечатки – только после записи товаров, иначе несохранённые товары не попадут в базу и в следующий раз.
+        # Для неизменившейся выдачи товары не трогаются, но новые валидаторы и время проверки сохраняются
+        if products_list is None or save_parsed_products(query, store_name, products_list):
+            save_page_fingerprints(trackers.pop((query, store_name)))
+
+    if not run_crawl(tasks, parse, write, context=app.app_context):
+        return
+    # После обновления каталога досчитываем устаревшие данные для поиска (например, после
+    # правки словаря синонимов), пересобираем поисковый индекс и словарь для прогрева кэша
+    ensure_search_data()
+    index = refresh_search_structures()
+    app.logger.info("Search index rebuilt: %d products, %d terms", len(index), len(index.postings))
+    flush_search_queries()
+    suggestions = refresh_suggest_index()
+    app.logger.info("Suggest index rebuilt: %d words, %d queries", len(suggestions.words), len(suggestions.queries))
+    # Сопоставление товаров разных магазинов – один раз за обход, а не при каждом поиске
+    rebuild_product_matches()
+
+def flush_search_history_job():
+    with app.app_context():
+        flush_search_queries()
 
 def start_scheduler(app):
     """
@@ -600,9 +695,17 @@ def start_scheduler(app):
         hours=3,
         next_run_time=next_run
     )
+    # История поиска для подсказок пишется пачками, а не при каждом запросе
+    scheduler.add_job(
+        func=flush_search_history_job,
+        trigger='interval',
+        seconds=config.SEARCH_HISTORY_FLUSH_INTERVAL
+    )
     scheduler.start()
     app.logger.info("APScheduler запущен")
     atexit.register(lambda: scheduler.shutdown())
+    # Запросы, накопленные после последней записи, не теряются при остановке
+    atexit.register(flush_search_history_job)
 
 # ---------------------
 # Запуск приложения
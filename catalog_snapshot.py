@@ -0,0 +1,101 @@
+# catalog_snapshot.py
+"""
+Колоночный снимок каталога для фильтров и сортировки по цене.
+
+После каждой загрузки каталога таблица products выгружается в массивы NumPy:
+id (по возрастанию), цена, цена за штуку, код магазина и код наличия.
+Проверка наличия, диапазона цен и магазина для всех кандидатов выполняется
+несколькими векторными операциями до загрузки строк из БД. Снимок только
+читается и подменяется целиком, как и индекс поиска.
+"""
+import threading
+
+import numpy as np
+
+from models import db, Product, ProductAttributes
+
+# Товар считается доступным, если в статусе есть эта подстрока
+IN_STOCK_MARKER = "в наличии"
+
+
+class CatalogSnapshot:
+    def __init__(self, rows):
+        """rows – кортежи (id, price, site, availability, pack_count) в порядке id."""
+        count = len(rows)
+        self.ids = np.empty(count, dtype=np.int64)
+        self.prices = np.empty(count, dtype=np.float64)
+        self.unit_prices = np.empty(count, dtype=np.float64)
+        self.site_codes = np.empty(count, dtype=np.int32)
+        self.availability_codes = np.empty(count, dtype=np.int32)
+        sites = {}
+        statuses = {}
+        for i, (product_id, price, site, availability, pack_count) in enumerate(rows):
+            price = price or 0.0
+            self.ids[i] = product_id
+            self.prices[i] = price
+            # Цена за штуку по количеству в упаковке из названия ("100 шт")
+            self.unit_prices[i] = price / pack_count if pack_count and pack_count > 1 else price
+            self.site_codes[i] = sites.setdefault(site or "", len(sites))
+            self.availability_codes[i] = statuses.setdefault(availability or "", len(statuses))
+        self.sites = list(sites)
+        self.statuses = list(statuses)
+        # Код статуса -> есть ли товар в наличии
+        self.in_stock = np.array([IN_STOCK_MARKER in status.lower() for status in self.statuses], dtype=bool)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def locate(self, ids):
+        """Позиции id в снимке и маска найденных (товары, добавленные после сборки снимка, не найдены)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return positions, self.ids[positions] == ids
+
+    def mask(self, positions, available_only=False, min_price=None, max_price=None, store=None):
+        mask = np.ones(len(positions), dtype=bool)
+        if available_only:
+            mask &= self.in_stock[self.availability_codes[positions]]
+        if min_price is not None:
+            mask &= self.prices[positions] >= min_price
+        if max_price is not None:
+            mask &= self.prices[positions] <= max_price
+        if store is not None:
+            if store not in self.sites:
+                return np.zeros(len(positions), dtype=bool)
+            mask &= self.site_codes[positions] == self.sites.index(store)
+        return mask
+
+    def filter_ids(self, ids, **conditions):
+        """
+        Возвращает (id, прошедшие фильтры; id, которых нет в снимке).
+        Вторые снимок проверить не может – это делает вызывающий код.
+        """
+        ids = np.fromiter(ids, dtype=np.int64, count=len(ids))
+        positions, found = self.locate(ids)
+        passed = found & self.mask(positions, **conditions)
+        return set(ids[passed].tolist()), set(ids[~found].tolist())
+
+
+def build_catalog_snapshot():
+    rows = (db.session.query(Product.id, Product.price, Product.site, Product.availability,
+                             ProductAttributes.pack_count)
+            .outerjoin(ProductAttributes, ProductAttributes.product_id == Product.id)
+            .order_by(Product.id)
+            .all())
+    return CatalogSnapshot(rows)
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_catalog_snapshot():
+    return _snapshot
+
+
+def set_catalog_snapshot(snapshot):
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = snapshot
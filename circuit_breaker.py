@@ -0,0 +1,121 @@
+# circuit_breaker.py
+"""
+Повторы с экспоненциальной задержкой и автоматы отключения магазинов.
+
+После BREAKER_FAILURE_THRESHOLD неудачных загрузок подряд магазин
+отключается на BREAKER_COOLDOWN секунд: fetch_page сразу выбрасывает
+StoreUnavailable, и ни поиск на сайте, ни фоновый обход не ждут таймаутов
+недоступного магазина. По истечении паузы пропускается одна пробная загрузка:
+удачная включает магазин, неудачная отключает его снова на вдвое большую
+паузу (не больше BREAKER_MAX_COOLDOWN). Автоматы общие для всех потоков.
+"""
+import logging
+import random
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class StoreUnavailable(Exception):
+    pass
+
+
+def backoff_delay(attempt, base=None, cap=None):
+    """Пауза перед повтором номер attempt (с 1): случайная в [0, min(cap, base * 2^(attempt-1))]."""
+    base = config.RETRY_BACKOFF_BASE if base is None else base
+    cap = config.RETRY_BACKOFF_MAX if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=3, cooldown=120, max_cooldown=1800):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cooldown = cooldown
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _cooled_down(self):
+        return time.monotonic() - self.opened_at >= self.cooldown
+
+    def is_open(self):
+        """Отключён ли магазин (без захвата пробной загрузки)."""
+        with self._lock:
+            return self.state == self.HALF_OPEN or (self.state == self.OPEN and not self._cooled_down())
+
+    def allow(self):
+        """Можно ли загружать страницу; после паузы разрешает одну пробную загрузку."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self._cooled_down():
+                self.state = self.HALF_OPEN
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("%s: магазин снова доступен", self.name)
+            self.state = self.CLOSED
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            elif self.failures < self.failure_threshold:
+                return
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            cooldown = self.cooldown
+        logger.warning("%s: %d неудачных загрузок подряд, магазин отключён на %.0f с",
+                       self.name, self.failures, cooldown)
+
+    def abandon(self):
+        """Пробная загрузка не состоялась не по вине магазина – следующий allow() разрешит новую."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def stats(self):
+        with self._lock:
+            remaining = max(self.cooldown - (time.monotonic() - self.opened_at), 0.0) if self.state == self.OPEN else 0.0
+            return {"state": self.state, "failures": self.failures, "rejected": self.rejected,
+                    "cooldown": self.cooldown, "reopens_in": remaining}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def store_breaker(store):
+    with _breakers_lock:
+        breaker = _breakers.get(store)
+        if breaker is None:
+            breaker = _breakers[store] = CircuitBreaker(
+                store,
+                failure_threshold=config.BREAKER_FAILURE_THRESHOLD,
+                cooldown=config.BREAKER_COOLDOWN,
+                max_cooldown=config.BREAKER_MAX_COOLDOWN,
+            )
+        return breaker
+
+
+def breaker_stats():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
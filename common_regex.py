@@ -10,3 +10,71 @@ INTEGER_REGEX = re.compile(r'\d+')
 PACK_REGEX_ARTPLAST = re.compile(r'х\s*(\d+)\s*шт', re.IGNORECASE)
 # Для Gudvin: поиск упаковки вида "уп: <число> шт"
 PACK_REGEX_GUDVIN = re.compile(r'уп[:\s]*(\d+)\s*шт', re.IGNORECASE)
+# Для Hozka: признак отсутствия товара
+UNAVAILABLE_REGEX_HOZKA = re.compile(r"(Под заказ|Скоро появится)", re.IGNORECASE)
+
+# Номер страницы в ссылках пагинации выдачи: "?page=2", "&PAGEN_1=2" и "/page/2/" (WooCommerce)
+PAGE_PARAM_REGEX = re.compile(r'[?&](?:page|PAGEN_\d+)=(\d+)')
+PAGE_PATH_REGEX = re.compile(r'/page/(\d+)/')
+
+# Сообщение магазина о пустой выдаче поиска
+NO_RESULTS_REGEX = re.compile(
+    r'ничего не найдено|ничего не нашлось|не найдено ни одного|товары не найдены|не дал[оа]? результатов|нет результатов',
+    re.IGNORECASE
+)
+
+# Нормализация страницы выдачи для отпечатка (см. html_parsing.listing_fingerprint): блоки, которые
+# не относятся к товарам и могут меняться при каждой загрузке, – скрипты, стили, комментарии, <head>
+LISTING_NOISE_REGEX = re.compile(
+    r'<(script|style|noscript|template|head)\b.*?</\1\s*>|<!--.*?-->',
+    re.IGNORECASE | re.DOTALL
+)
+# Теги оформления сайта (шапка, меню, боковая колонка, подвал) и содержимого страницы, внутри
+# которого такие же теги – часть карточки (см. html_parsing.strip_page_chrome): группа 1 – "/"
+# у закрывающего тега, группа 2 – имя
+PAGE_STRUCTURE_TAG_REGEX = re.compile(
+    r'<(/?)(header|nav|aside|footer|main|article|section|ul|ol|li|table)\b[^>]*>', re.IGNORECASE
+)
+# Одноразовые значения: скрытые поля форм (sessid, csrf) и атрибуты nonce/token
+VOLATILE_HTML_REGEX = re.compile(
+    r'<input\b[^>]*\btype=["\']?hidden[^>]*>|\s[\w-]*(?:nonce|token|csrf|sessid)[\w-]*=(?:"[^"]*"|\'[^\']*\')',
+    re.IGNORECASE
+)
+WHITESPACE_REGEX = re.compile(r'\s+')
+
+# Классы элементов карточек товаров (см. parsers/): подстрока в одном из классов
+# или класс целиком в строке атрибута class для SoupStrainer
+NAME_CLASS_ARTPLAST = re.compile(r'hover:text-violet')
+PRICE_CLASS_ARTPLAST = re.compile(r'min-w-')
+PRICE_SPAN_CLASS_ARTPLAST = re.compile(r'tracking-wider')
+AVAILABILITY_CLASS_ARTPLAST = re.compile(r'text-green|text-orange')
+PRICE_CLASS_NEWPACKSPB = re.compile(r'price-wrapper')
+AMOUNT_CLASS_NEWPACKSPB = re.compile(r'woocommerce-Price-amount')
+TITLE_CLASS_HOZKA = re.compile(r'line-clamp-2')
+PRICE_CLASS_HOZKA = re.compile(r'font-bold')
+QUANTITY_CLASS_HOZKA = re.compile(r'mt-3')
+LINK_REGEX_HOZKA = re.compile(r'^/catalog/')
+LINK_REGEX_ARTPLAST = re.compile(r'^/tovar/')
+CARD_CLASS_GUDVIN = re.compile(r'(?:^|\s)(?:product-card|product-item|product-snippet)(?:\s|$)')
+CARD_CLASS_PROMISPB = re.compile(r'(?:^|\s)products__item(?:\s|$)')
+# Класс, похожий на класс карточки товара ("product-card", "catalog-item", "tovar"),
+# но не списка ("products"): выше такого блока product_cards не поднимается
+CARD_LIKE_CLASS_REGEX = re.compile(r'(?<![a-z])(?:product|card|item|tovar|goods)(?![a-z])', re.IGNORECASE)
+
+# Атрибуты товара в названии и запросе (см. product_attributes.py)
+# Число, слитое с единицей измерения ("400мл", "5л", "100шт"): при токенизации разделяется,
+# чтобы "400мл" в названии и "400 мл" в запросе давали одни и те же слова
+NUMBER_UNIT_REGEX = re.compile(r'(?<=\d)(?=(?:мл|л|мм|см|шт|г|кг)(?![а-яёa-z]))', re.IGNORECASE)
+_NUMBER = r'(\d+(?:[.,]\d+)?)'
+# Объём: "400 мл", "600мл", "0,85 л", "5л" ("500 л." – это листы, не литры);
+# в паре "400/473мл" (номинальный/полный объём) группа 1 – номинальный, группа 2 – второй
+VOLUME_REGEX = re.compile(_NUMBER + r'(?:\s*/\s*' + _NUMBER + r')?\s*(мл|л)(?![\w.])', re.IGNORECASE)
+# Диаметр: "d-95", "d90", "Ø 80", "диаметр 95"
+DIAMETER_REGEX = re.compile(r'(?<!\w)(?:d|ø|диаметр)\s*-?\s*' + _NUMBER + r'(?:\s*мм)?', re.IGNORECASE)
+# Размеры: "30х40", "400x600", "195*116*92", "217х112х53мм"
+DIMENSIONS_REGEX = re.compile(
+    _NUMBER + r'\s*[хxX×*]\s*' + _NUMBER + r'(?:\s*[хxX×*]\s*' + _NUMBER + r')?(?:\s*(?:мм|см))?',
+    re.IGNORECASE
+)
+# Количество в упаковке: "100шт", "(200 шт/уп)"
+PACK_COUNT_REGEX = re.compile(r'(\d+)\s*шт', re.IGNORECASE)
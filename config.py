@@ -0,0 +1,213 @@
+# config.py
+# Общие настройки приложения
+
+# Движок отбора кандидатов для smart_search:
+#   "index" – инвертированный индекс в памяти,
+#   "fts"   – виртуальная таблица SQLite FTS5 с предварительным ранжированием bm25,
+#   "like"  – исходная цепочка ILIKE по всей таблице (для сравнения в замерах)
+SEARCH_ENGINE = "index"
+
+# Сколько лучших по bm25 кандидатов FTS5 передаётся на доранжирование RapidFuzz
+FTS_CANDIDATE_LIMIT = 1000
+
+# Размеры LRU-кэшей разборов pymorphy2 и стемов Snowball
+LEMMA_CACHE_SIZE = 50000
+STEM_CACHE_SIZE = 50000
+
+# Файл со словарём токенов из названий товаров для прогрева кэшей при старте
+SEARCH_VOCABULARY_PATH = "search_vocabulary.txt"
+
+# Число запросов в кэше результатов поиска
+SEARCH_RESULT_CACHE_SIZE = 512
+
+# Наибольшее число запросов в одном вызове /api/search/batch
+BATCH_MAX_QUERIES = 200
+
+# Кандидаты последнего запроса сессии для уточняющих запросов:
+# сколько сессий хранится и сколько секунд живёт запись
+REFINEMENT_SESSIONS = 256
+REFINEMENT_TTL = 120
+
+# Исправление опечаток по индексу триграмм:
+# сколько похожих слов каталога проверяется, минимальный fuzz.ratio для замены
+# и минимальная длина слова, которое пытаемся исправить
+TYPO_MAX_CANDIDATES = 30
+TYPO_MIN_RATIO = 75
+TYPO_MIN_LENGTH = 4
+
+# На сколько поднимается схожесть товара, у которого совпал атрибут из текста запроса
+# (объём, диаметр, размеры, количество: "стакан 400 мл")
+ATTRIBUTE_MATCH_BOOST = 5
+
+# Минимальная схожесть названий (среднее token_set_ratio и token_sort_ratio) товаров разных магазинов,
+# при которой они считаются одним товаром для сравнения цен
+MATCH_MIN_SIMILARITY = 85
+
+# Подсказки /api/suggest: число подсказок по умолчанию, минимальная длина
+# дополняемого слова и сколько самых частых запросов из истории попадает в индекс;
+# раз в сколько секунд накопленные в памяти запросы записываются в историю
+SUGGEST_LIMIT = 10
+SUGGEST_MIN_PREFIX = 2
+SUGGEST_HISTORY_SIZE = 5000
+SEARCH_HISTORY_FLUSH_INTERVAL = 60
+
+# Пул драйверов Chrome: сколько драйверов остаётся запущенными после простоя и наибольшее
+# их число, через сколько секунд простоя драйвер закрывается, после скольких загрузок
+# и при какой памяти (МБ, нужен psutil; None – не проверять) он пересоздаётся
+DRIVER_POOL_MIN_SIZE = 1
+DRIVER_POOL_MAX_SIZE = 10
+DRIVER_IDLE_TIMEOUT = 300
+DRIVER_MAX_LOADS = 100
+DRIVER_MAX_RSS_MB = 1500
+
+# Способ загрузки страниц поиска по магазинам: "http" – сначала общим HTTP-клиентом,
+# браузер только если парсер не нашёл в ответе товаров; "browser" – сразу драйвером из пула.
+# Страница без товаров в ответе HTTP всё равно загружается браузером, так что "http" безопасен;
+# магазины, которых здесь нет, загружаются браузером. newpackspb (WooCommerce) отдаёт выдачу
+# с сервера готовой, hozka собирает её скриптами
+FETCH_STRATEGIES = {
+    "gudvin": "http",
+    "promispb": "http",
+    "hozka": "browser",
+    "artplast": "http",
+    "newpackspb": "http",
+}
+# Таймаут HTTP-запроса (секунды); после скольких промахов HTTP подряд магазин
+# загружается только браузером и через сколько секунд HTTP пробуется снова
+FETCH_HTTP_TIMEOUT = 10
+FETCH_HTTP_MISS_LIMIT = 3
+FETCH_HTTP_RETRY_INTERVAL = 3600
+# Шаблоны URL (Network.setBlockedURLs, * – любые символы, в т.ч. ?ver=...), которые Chrome
+# не загружает: для всех магазинов и дополнительно для отдельных. Картинки отключены настройками драйвера
+BLOCKED_URLS = [
+    "*.css*", "*.woff*", "*.ttf*", "*.otf*", "*.eot*",
+    "*.mp4*", "*.webm*", "*.mp3*", "*.svg*", "*.ico*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*mc.yandex.ru*", "*top-fwz1.mail.ru*", "*vk.com/rtrg*", "*connect.facebook.net*",
+    "*jivosite.com*", "*jivo.ru*", "*cdn.envybox.io*", "*callibri.ru*",
+    "*youtube.com/embed*", "*api-maps.yandex.ru*",
+]
+STORE_BLOCKED_URLS = {
+    "gudvin": [],
+    "promispb": [],
+    "hozka": [],
+    "artplast": [],
+    "newpackspb": [],
+}
+
+# Страницы выдачи поиска: сколько страниц читается в фоновом обходе и при обновлении
+# выдачи с сайта (/api/search/update) и сколько загрузок страниц одного магазина идёт одновременно
+MAX_RESULT_PAGES = 5
+LIVE_MAX_RESULT_PAGES = 1
+STORE_CONCURRENCY = {
+    "gudvin": 2,
+    "promispb": 2,
+    "hozka": 2,
+    "artplast": 2,
+    "newpackspb": 2,
+}
+STORE_CONCURRENCY_DEFAULT = 2
+# Сколько задач (запрос, магазин) фонового обхода выполняется одновременно – по размеру пула драйверов
+CRAWL_WORKERS = DRIVER_POOL_MAX_SIZE
+# Через сколько секунд страница выдачи разбирается заново, даже если её отпечаток не менялся
+PAGE_FINGERPRINT_MAX_AGE = 24 * 3600
+
+# Готовность страницы в браузере: как часто проверяется число карточек товаров и сколько
+# секунд после их появления ждать, пока оно перестанет меняться
+PAGE_SETTLE_INTERVAL = 0.1
+PAGE_SETTLE_TIMEOUT = 2.0
+# Пауза перед повтором загрузки: случайная до min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2^(n-1)) секунд
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_MAX = 8
+# Автомат отключения магазина: после скольких неудачных загрузок подряд магазин
+# пропускается, на сколько секунд и до какой паузы она растёт при повторных сбоях
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN = 120
+BREAKER_MAX_COOLDOWN = 1800
+# Соединения HTTP-клиента: всего и на один сайт
+HTTP_POOL_SIZE = 20
+HTTP_POOL_PER_HOST = 4
+
+# Разбор страниц магазинов: парсер BeautifulSoup ("lxml" или "html.parser"), строить ли
+# дерево только из карточек товаров, и папка, куда fetch_page сохраняет загруженные
+# страницы для parser_bench.py (None – не сохранять)
+PARSER_BACKEND = "lxml"
+PARSER_SCOPED = True
+PARSER_SAVE_PAGES_DIR = None
+# На сколько уровней выше ссылки на товар может быть его карточка (html_parsing.product_cards)
+PRODUCT_CARD_MAX_DEPTH = 5
+
+# Файл словаря синонимов и период проверки его изменений (секунды)
+SYNONYMS_PATH = "synonyms.json"
+SYNONYMS_RELOAD_INTERVAL = 5
+
+# Запросы, по которым фоновый парсер обновляет каталог
+PREDEFINED_QUERIES = [
+    "пакет фасовочный",
+    "палочки",
+    "Средство для кофейных",
+    "Мыло",
+    "Ножницы",
+    "Салфетки",
+    "Микрофибра",
+    "стакан",
+    "крышка",
+    "крышка для стакана",
+    "пакет",
+    "Контейнер",
+    "Крышка для контейнера",
+    "Коробка",
+    "Пакет-майка",
+    "Лента",
+    "Наклейка",
+    "Средство",
+    "Химия",
+    "Средство для очистки молочных систем",
+    "Средство для кофемашины",
+    "Средство для удаления кофейных масел",
+    "Кольца кодировочные",
+    "Тарталетка",
+    "Уголок",
+    "Уголки",
+    "Держатель для стаканов",
+    "Размешиватель",
+    "Трубочки",
+    "Трубочки прямые",
+    "Трубочки с изгибом",
+    "Вилка",
+    "Вилки",
+    "Ложка",
+    "Ложки",
+    "Нож",
+    "Ножи",
+    "Соусник",
+    "Бумага для выпечки",
+    "Пергамент",
+    "Мешок кондитерский",
+    "Бахилы",
+    "Одноразовые шапочки",
+    "Салфетки",
+    "салфетки влажные",
+    "Тряпка",
+    "Щетка",
+    "Губка",
+    "Мешок для мусора",
+    "Мешки для мусора",
+    "Пакет мусорный",
+    "Чековая лента",
+    "Этикет лента",
+    "Перчатки",
+    "Туалетная бумага",
+    "освежитель воздуха",
+    "Полотенце",
+    "Зубочистки",
+    "Тарелка",
+    "Антисептик",
+    "Сахар",
+    "Сахар порц",
+    "Соль",
+    "Соль порц",
+    "Перец",
+    "Перец порц",
+    "Корица",
+]
@@ -0,0 +1,233 @@
+# crawler.py
+"""
+Параллельный обход магазинов для фонового парсера.
+
+Задачи (запрос, магазин) выполняются пулом из config.CRAWL_WORKERS потоков;
+задач одного магазина одновременно не больше config.STORE_CONCURRENCY (его
+страницы дополнительно ограничивает семафор в fetch_page), задачи отключённых
+автоматом магазинов пропускаются. Найденные товары записывает в базу один
+поток – сессии SQLAlchemy и поисковые структуры не делятся между потоками;
+для задач, выдача которых не изменилась, он только обновляет сведения о
+проверке страниц.
+Одновременно идёт не больше одного обхода; ход текущего и итоги последнего –
+в crawl_progress.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+
+import config
+from circuit_breaker import StoreUnavailable, store_breaker
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlProgress:
+    """Ход обхода: сколько задач выполнено (из них без изменений), провалено, пропущено и записано."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = self._new_state(0)
+        self._state["running"] = False
+        self.last_run = None
+
+    @staticmethod
+    def _new_state(total):
+        return {"running": True, "total": total, "done": 0, "unchanged": 0, "failed": 0, "skipped": 0,
+                "written": 0, "products": 0, "started_at": time.time(), "finished_at": None, "stores": {}}
+
+    def _store(self, store):
+        return self._state["stores"].setdefault(store, {
+            "active": 0, "done": 0, "unchanged": 0, "failed": 0, "skipped": 0, "products": 0, "task_ms": 0.0,
+        })
+
+    def start(self, total):
+        with self._lock:
+            self._state = self._new_state(total)
+
+    def task_started(self, store):
+        with self._lock:
+            self._store(store)["active"] += 1
+
+    def task_done(self, store, elapsed_ms, products=None, failed=False):
+        """
+        Задача завершена; products=None – выдача не изменилась, failed – с ошибкой.
+        Возвращает (завершено задач, всего задач).
+        """
+        with self._lock:
+            entry = self._store(store)
+            entry["active"] -= 1
+            entry["task_ms"] += elapsed_ms
+            if failed:
+                entry["failed"] += 1
+                self._state["failed"] += 1
+            else:
+                entry["done"] += 1
+                self._state["done"] += 1
+                if products is None:
+                    entry["unchanged"] += 1
+                    self._state["unchanged"] += 1
+                else:
+                    entry["products"] += products
+                    self._state["products"] += products
+            return self._state["done"] + self._state["failed"] + self._state["skipped"], self._state["total"]
+
+    def task_skipped(self, store, started=False):
+        """Задача пропущена: магазин отключён автоматом (started – уже после запуска задачи)."""
+        with self._lock:
+            entry = self._store(store)
+            entry["skipped"] += 1
+            self._state["skipped"] += 1
+            if started:
+                entry["active"] -= 1
+
+    def task_written(self):
+        with self._lock:
+            self._state["written"] += 1
+
+    def finish(self):
+        with self._lock:
+            self._state["running"] = False
+            self._state["finished_at"] = time.time()
+            self.last_run = self._snapshot()
+
+    def _snapshot(self):
+        state = dict(self._state, stores={store: dict(entry) for store, entry in self._state["stores"].items()})
+        finished = state["done"] + state["failed"] + state["skipped"]
+        elapsed = (state["finished_at"] or time.time()) - state["started_at"]
+        state["elapsed"] = elapsed
+        # Оценка по средней скорости с начала обхода
+        state["eta"] = elapsed / finished * (state["total"] - finished) if state["running"] and finished else None
+        for entry in state["stores"].values():
+            tasks = entry["done"] + entry["failed"]
+            entry["task_ms_avg"] = entry.pop("task_ms") / tasks if tasks else 0.0
+        return state
+
+    def snapshot(self):
+        with self._lock:
+            return {"current": self._snapshot() if self._state["running"] else None, "last_run": self.last_run}
+
+
+crawl_progress = CrawlProgress()
+
+_run_lock = threading.Lock()
+
+
+def crawl_running():
+    return _run_lock.locked()
+
+
+def _store_limit(store):
+    return config.STORE_CONCURRENCY.get(store, config.STORE_CONCURRENCY_DEFAULT)
+
+
+# Результат задачи, завершившейся ошибкой
+_FAILED = object()
+
+
+def _run_task(parse, query, store):
+    crawl_progress.task_started(store)
+    started = time.perf_counter()
+    try:
+        products = parse(query, store)
+    except StoreUnavailable:
+        # Автомат магазина сработал, пока задача ждала своей очереди или шла
+        logger.info("Обход: магазин %s временно отключён, запрос '%s' пропущен", store, query)
+        crawl_progress.task_skipped(store, started=True)
+        return _FAILED
+    except Exception as e:
+        logger.error("Обход: ошибка парсера %s для запроса '%s': %s", store, query, e)
+        crawl_progress.task_done(store, (time.perf_counter() - started) * 1000, failed=True)
+        return _FAILED
+    if products is None:
+        finished, total = crawl_progress.task_done(store, (time.perf_counter() - started) * 1000)
+        logger.info("Обход [%d/%d]: запрос '%s', магазин %s, выдача не изменилась", finished, total, query, store)
+        return None
+    finished, total = crawl_progress.task_done(store, (time.perf_counter() - started) * 1000, len(products))
+    logger.info("Обход [%d/%d]: запрос '%s', магазин %s, найдено товаров: %d",
+                finished, total, query, store, len(products))
+    return products
+
+
+def _write_loop(results, write, context):
+    with context() if context else nullcontext():
+        while True:
+            item = results.get()
+            if item is None:
+                break
+            query, store, products = item
+            try:
+                write(query, store, products)
+            except Exception as e:
+                logger.error("Обход: не удалось записать товары %s для запроса '%s': %s", store, query, e)
+            crawl_progress.task_written()
+
+
+def run_crawl(tasks, parse, write, context=None, workers=None):
+    """
+    Выполняет задачи (запрос, магазин): parse(query, store) -> список товаров
+    (None – выдача не изменилась, записывать нечего) в пуле потоков; при ошибке
+    загрузки parse выбрасывает исключение: StoreUnavailable – задача пропущена,
+    остальные – провалена. write(query, store, products) – в отдельном потоке-писателе
+    внутри context() (например, app.app_context), для неизменившейся выдачи – с products=None. Возвращает False, если обход
+    уже идёт – тогда задачи не выполняются.
+    """
+    if not _run_lock.acquire(blocking=False):
+        logger.warning("Обход магазинов уже идёт, новый запуск пропущен")
+        return False
+    try:
+        _crawl(tasks, parse, write, context, workers or config.CRAWL_WORKERS)
+    finally:
+        _run_lock.release()
+    return True
+
+
+def _crawl(tasks, parse, write, context, workers):
+    pending = {}  # магазин -> очередь запросов
+    for query, store in tasks:
+        pending.setdefault(store, deque()).append(query)
+    crawl_progress.start(len(tasks))
+    logger.info("Обход магазинов: задач %d, потоков %d", len(tasks), workers)
+
+    results = queue.Queue()
+    writer = threading.Thread(target=_write_loop, args=(results, write, context), name="crawl-writer", daemon=True)
+    writer.start()
+    running = {}  # future -> (запрос, магазин)
+    active = Counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crawl") as executor:
+            while pending or running:
+                # Свободные потоки – магазинам, у которых не занят их лимит, по очереди
+                for store in list(pending):
+                    queries = pending[store]
+                    while queries and len(running) < workers and active[store] < _store_limit(store):
+                        query = queries.popleft()
+                        if store_breaker(store).is_open():
+                            logger.info("Обход: магазин %s временно отключён, запрос '%s' пропущен", store, query)
+                            crawl_progress.task_skipped(store)
+                            continue
+                        running[executor.submit(_run_task, parse, query, store)] = (query, store)
+                        active[store] += 1
+                    if not queries:
+                        del pending[store]
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    query, store = running.pop(future)
+                    active[store] -= 1
+                    products = future.result()
+                    if products is not _FAILED:
+                        results.put((query, store, products))
+    finally:
+        results.put(None)
+        writer.join()
+        crawl_progress.finish()
+    summary = crawl_progress.last_run
+    logger.info("Обход магазинов завершён за %.0f с: выполнено %d (без изменений %d), с ошибкой %d, пропущено %d, "
+                "товаров %d", summary["elapsed"], summary["done"], summary["unchanged"], summary["failed"],
+                summary["skipped"], summary["products"])
@@ -1,42 +1,247 @@
 # driver_pool.py
-import queue
+"""
+Пул драйверов Chrome для парсеров.
+
+Драйверы запускаются лениво – при первой выдаче, когда свободных нет, и не
+больше max_size одновременно. Перед выдачей драйвер проверяется: упавший
+браузер закрывается и заменяется новым. После max_loads загрузок или при
+превышении max_rss_mb памяти (если установлен psutil) драйвер пересоздаётся.
+Фоновый поток закрывает драйверы, простаивающие дольше idle_timeout, оставляя
+min_size запущенных.
+"""
+import atexit
 import logging
+import threading
+import time
+from collections import deque
+
+import config
 from driver_utils import get_driver
 
+try:
+    import psutil
+except ImportError:  # без psutil память драйверов не проверяется
+    psutil = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class DriverPoolDepleted(Exception):
+    pass
+
+
+class _PooledDriver:
+    __slots__ = ("driver", "loads", "released_at")
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.loads = 0
+        self.released_at = time.monotonic()
+
+
+def driver_rss_mb(driver):
+    """Память chromedriver и всех процессов Chrome, запущенных им (МБ), или None без psutil."""
+    if psutil is None:
+        return None
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+    except (AttributeError, psutil.Error):
+        return None
+    total = 0
+    for proc in processes:
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
+
+
+def is_alive(driver):
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+
 class DriverPool:
-    def __init__(self, pool_size=10):  # Увеличиваем размер пула до 10
-        self.pool = queue.Queue(maxsize=pool_size)
-        self.pool_size = pool_size
-        for _ in range(pool_size):
-            driver = get_driver(headless=True)
-            self.pool.put(driver)
-        logger.info("Инициализирован пул из %d драйверов", pool_size)
+    def __init__(self, min_size=1, max_size=10, idle_timeout=300, max_loads=100, max_rss_mb=None):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_loads = max_loads
+        self.max_rss_mb = max_rss_mb
+        self._idle = deque()   # свободные драйверы, последний освобождённый – справа
+        self._in_use = {}      # id(driver) -> _PooledDriver
+        self._starting = 0     # драйверы, которые сейчас запускаются
+        self._condition = threading.Condition()
+        self._reaper = None
+        self._closed = False
+        self._stats = {"spawned": 0, "recycled": 0, "broken": 0, "reaped": 0,
+                       "acquired": 0, "timeouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
 
-    def acquire_driver(self, timeout=None):
+    def _spawn(self):
         try:
-            driver = self.pool.get(timeout=timeout)
-            logger.debug("Драйвер получен из пула")
-            return driver
-        except queue.Empty:
-            logger.error("Нет доступного драйвера в пуле!")
-            raise Exception("Driver pool depleted")
+            entry = _PooledDriver(get_driver(headless=True))
+        except Exception:
+            with self._condition:
+                self._starting -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._starting -= 1
+            self._stats["spawned"] += 1
+            # Новый драйвер сразу считается выданным
+            self._in_use[id(entry.driver)] = entry
+            total = self.size()
+        logger.info("Запущен новый драйвер (всего %d)", total)
+        return entry
 
-    def release_driver(self, driver):
+    def _quit(self, entry):
         try:
-            driver.delete_all_cookies()
+            entry.driver.quit()
         except Exception as e:
-            logger.error("Ошибка при удалении кук: %s", e)
-        self.pool.put(driver)
+            logger.error("Ошибка при закрытии драйвера: %s", e)
+
+    def _start_reaper(self):
+        if self._reaper is None and self.idle_timeout:
+            self._reaper = threading.Thread(target=self._reap_loop, name="driver-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def size(self):
+        return len(self._idle) + len(self._in_use) + self._starting
+
+    def acquire_driver(self, timeout=None):
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        while True:
+            spawn = False
+            entry = None
+            with self._condition:
+                while entry is None and not spawn:
+                    if self._idle:
+                        # На время проверки драйвер считается выданным, чтобы size()
+                        # не занижал число драйверов и пул не превысил max_size
+                        entry = self._idle.pop()
+                        self._in_use[id(entry.driver)] = entry
+                    elif self.size() < self.max_size:
+                        self._starting += 1
+                        spawn = True
+                    else:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            logger.error("Нет доступного драйвера в пуле!")
+                            raise DriverPoolDepleted("Driver pool depleted")
+                        self._condition.wait(remaining)
+                self._start_reaper()
+            if spawn:
+                entry = self._spawn()
+            elif not is_alive(entry.driver):
+                logger.warning("Драйвер из пула не отвечает, запускаю новый")
+                self._quit(entry)
+                with self._condition:
+                    self._in_use.pop(id(entry.driver), None)
+                    self._stats["broken"] += 1
+                    self._condition.notify()
+                continue
+            with self._condition:
+                waited = (time.monotonic() - started) * 1000
+                self._stats["acquired"] += 1
+                self._stats["wait_ms_total"] += waited
+                self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], waited)
+            logger.debug("Драйвер получен из пула")
+            return entry.driver
+
+    def release_driver(self, driver):
+        with self._condition:
+            entry = self._in_use.pop(id(driver), None)
+        if entry is None:
+            # Драйвер не из пула (или пул уже закрыт) – просто закрываем
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            return
+        entry.loads += 1
+        recycle = self._closed or entry.loads >= self.max_loads
+        if not recycle and self.max_rss_mb:
+            rss = driver_rss_mb(driver)
+            recycle = rss is not None and rss > self.max_rss_mb
+            if recycle:
+                logger.info("Драйвер занимает %.0f МБ, пересоздаю", rss)
+        if not recycle:
+            try:
+                driver.delete_all_cookies()
+            except Exception as e:
+                logger.error("Ошибка при удалении кук: %s", e)
+                recycle = True
+        if recycle:
+            self._quit(entry)
+            with self._condition:
+                if not self._closed:
+                    self._stats["recycled"] += 1
+                self._condition.notify()
+            return
+        entry.released_at = time.monotonic()
+        with self._condition:
+            self._idle.append(entry)
+            self._condition.notify()
         logger.debug("Драйвер возвращён в пул")
 
+    def reap_idle(self):
+        """Закрывает драйверы, простаивающие дольше idle_timeout, сверх min_size. Возвращает их число."""
+        now = time.monotonic()
+        expired = []
+        with self._condition:
+            # Слева – драйверы, освобождённые раньше всех
+            while (self._idle and self.size() > self.min_size
+                   and now - self._idle[0].released_at > self.idle_timeout):
+                expired.append(self._idle.popleft())
+            self._stats["reaped"] += len(expired)
+        for entry in expired:
+            self._quit(entry)
+        if expired:
+            logger.info("Закрыто простаивающих драйверов: %d", len(expired))
+        return len(expired)
+
+    def _reap_loop(self):
+        while not self._closed:
+            time.sleep(max(self.idle_timeout / 2, 1))
+            self.reap_idle()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "starting": self._starting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            })
+        acquired = stats["acquired"]
+        stats["wait_ms_avg"] = stats["wait_ms_total"] / acquired if acquired else 0.0
+        return stats
+
     def close_all(self):
-        while not self.pool.empty():
-            driver = self.pool.get()
-            driver.quit()
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for entry in idle:
+            self._quit(entry)
         logger.info("Все драйверы закрыты")
 
-# Глобальный объект пула
-driver_pool = DriverPool(pool_size=10)
+
+# Глобальный объект пула: драйверы запускаются только при первом обращении
+driver_pool = DriverPool(
+    min_size=config.DRIVER_POOL_MIN_SIZE,
+    max_size=config.DRIVER_POOL_MAX_SIZE,
+    idle_timeout=config.DRIVER_IDLE_TIMEOUT,
+    max_loads=config.DRIVER_MAX_LOADS,
+    max_rss_mb=config.DRIVER_MAX_RSS_MB,
+)
+atexit.register(driver_pool.close_all)
@@ -3,6 +3,30 @@ import logging
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 
+import config
+
+# Сколько байт загрузила текущая страница со всеми ресурсами (Resource Timing;
+# сторонние ресурсы без Timing-Allow-Origin считаются как 0)
+PAGE_BYTES_SCRIPT = "return performance.getEntries().reduce((sum, e) => sum + (e.transferSize || 0), 0);"
+
+
+def store_blocked_urls(store=None):
+    return config.BLOCKED_URLS + config.STORE_BLOCKED_URLS.get(store, [])
+
+
+def set_blocked_urls(driver, urls):
+    """Запрещает драйверу загружать URL по шаблонам urls (CDP Network.setBlockedURLs)."""
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": urls})
+
+
+def page_bytes(driver):
+    try:
+        return int(driver.execute_script(PAGE_BYTES_SCRIPT) or 0)
+    except Exception as e:
+        logging.debug("Не удалось получить объём загруженных данных: %s", e)
+        return 0
+
+
 def get_driver(headless: bool = True):
     options = Options()
     if headless:
@@ -21,4 +45,11 @@ def get_driver(headless: bool = True):
     except Exception as e:
         logging.error("Не удалось инициализировать драйвер: %s", e)
         raise
+    # Стили, шрифты, видео, счётчики и виджеты для разбора не нужны; список
+    # конкретного магазина подставляет fetch_page перед загрузкой
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        set_blocked_urls(driver, store_blocked_urls())
+    except Exception as e:
+        logging.error("Не удалось включить блокировку загрузок: %s", e)
     return driver
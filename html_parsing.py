@@ -0,0 +1,195 @@
+# html_parsing.py
+"""
+Разбор HTML страниц магазинов.
+
+make_soup строит дерево BeautifulSoup выбранным в config.PARSER_BACKEND
+парсером (lxml в несколько раз быстрее встроенного html.parser) и, если
+задан strainer, только из карточек товаров – остальная страница (меню,
+фильтры, подвал) в дерево не попадает. product_cards ограничивает поиск полей
+карточкой товара для магазинов, где у карточки нет общего класса.
+page_urls находит следующие страницы выдачи по ссылкам пагинации,
+listing_fingerprint – отпечаток выдачи для пропуска неизменившихся страниц.
+"""
+import hashlib
+import logging
+from urllib.parse import parse_qsl, urljoin, urlsplit
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+import config
+from common_regex import CARD_LIKE_CLASS_REGEX, LISTING_NOISE_REGEX, PAGE_STRUCTURE_TAG_REGEX, VOLATILE_HTML_REGEX, WHITESPACE_REGEX
+
+logger = logging.getLogger(__name__)
+
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+
+def parser_features(backend=None):
+    backend = backend or config.PARSER_BACKEND
+    if backend == "lxml" and not HAS_LXML:
+        logger.warning("lxml не установлен, использую html.parser")
+        return "html.parser"
+    return backend
+
+
+def make_soup(page_source, strainer=None, backend=None, scoped=None):
+    """
+    Дерево страницы. strainer – SoupStrainer карточек товаров; scoped=False
+    (или config.PARSER_SCOPED = False) разбирает страницу целиком.
+    """
+    if scoped is None:
+        scoped = config.PARSER_SCOPED
+    parse_only = strainer if scoped else None
+    return BeautifulSoup(page_source, parser_features(backend), parse_only=parse_only)
+
+
+# Предок, в котором есть элементы разных товаров
+_SHARED = object()
+
+
+def product_cards(elems, key):
+    """
+    Карточки товаров для elems (ссылок на товары и т.п.): наибольший предок
+    каждого элемента, в котором все elems относятся к тому же товару (у них
+    тот же key(element)), но не выше первого блока с классом карточки
+    (CARD_LIKE_CLASS_REGEX) и не дальше config.PRODUCT_CARD_MAX_DEPTH уровней –
+    иначе единственный товар на странице получил бы карточкой всю страницу
+    с логотипом и меню. Поля товара ищутся внутри карточки, а не find_next
+    по всему оставшемуся документу. Один проход вверх от каждого элемента.
+    """
+    owners = {}  # id(предка) -> ключ товара или _SHARED
+    for elem in elems:
+        own = key(elem)
+        for parent in elem.parents:
+            owner = owners.get(id(parent), own)
+            if owner is _SHARED:
+                break  # выше – тоже общие предки
+            owners[id(parent)] = own if owner == own else _SHARED
+    cards = []
+    for elem in elems:
+        card = elem
+        for depth, parent in enumerate(elem.parents, 1):
+            if (parent.name in ("body", "html", "[document]") or owners[id(parent)] is _SHARED
+                    or depth > config.PRODUCT_CARD_MAX_DEPTH):
+                break
+            card = parent
+            if CARD_LIKE_CLASS_REGEX.search(" ".join(parent.get("class", ()))):
+                break
+        cards.append(card)
+    return cards
+
+
+# Ссылки, среди которых ищется пагинация
+PAGINATION_STRAINER = SoupStrainer(["a", "link"], {"href": True})
+
+
+def _search_params(url):
+    # Нечисловые параметры запроса (текст поиска, post_type=...) есть во всех ссылках
+    # пагинации этого поиска и отсеивают прочие ссылки с ?page= на странице
+    return {(key, value) for key, value in parse_qsl(urlsplit(url).query) if not value.isdigit()}
+
+
+def page_urls(page_source, url, page_regex, max_pages):
+    """
+    Ссылки на страницы выдачи 2..max_pages и ссылка rel="next".
+
+    Номер страницы в ссылках пагинации ищется регуляркой page_regex (группа 1).
+    Пропущенные в пагинации номера ("1 2 3 … 20") подставляются в ссылку на
+    последнюю страницу. Если номеров нет, возвращается только rel="next" – по ней
+    страницы читаются по одной.
+    """
+    if max_pages <= 1:
+        return [], None
+    soup = BeautifulSoup(page_source, parser_features(), parse_only=PAGINATION_STRAINER)
+    params = _search_params(url)
+    numbered = {}
+    next_url = None
+    for elem in soup.find_all(["a", "link"]):
+        link = urljoin(url, elem["href"])
+        if not params <= _search_params(link):
+            continue
+        if "next" in (elem.get("rel") or []) and next_url is None:
+            next_url = link
+        match = page_regex.search(link)
+        if match:
+            numbered[int(match.group(1))] = link
+    if not numbered:
+        return [], next_url
+    last = max(numbered)
+    template = numbered[last]
+    match = page_regex.search(template)
+    urls = []
+    for number in range(2, min(last, max_pages) + 1):
+        urls.append(numbered.get(number) or template[:match.start(1)] + str(number) + template[match.end(1):])
+    return urls, next_url
+
+
+def unique_by_link(product_lists):
+    """Товары со всех страниц выдачи без повторов по ссылке (товар мог сдвинуться на другую страницу)."""
+    seen = set()
+    products = []
+    for items in product_lists:
+        for product in items:
+            if product["link"] not in seen:
+                seen.add(product["link"])
+                products.append(product)
+    return products
+
+
+# Шапка, меню, боковая колонка и подвал сайта; внутри содержимого страницы (остальные
+# теги PAGE_STRUCTURE_TAG_REGEX) это уже часть карточки товара или списка
+PAGE_CHROME_TAGS = {"header", "nav", "aside", "footer"}
+
+
+def strip_page_chrome(page_source):
+    """
+    Страница без шапки, меню, боковой колонки и подвала сайта: блоков PAGE_CHROME_TAGS,
+    которые не вложены в main, article, section, списки или таблицы. Вложенность
+    считается только по тегам PAGE_STRUCTURE_TAG_REGEX, как при разборе: закрывающий
+    тег закрывает и незакрытые внутри него (</ul> – последний <li>); блок, не закрытый
+    до конца страницы, остаётся.
+    """
+    stack = []
+    content_depth = 0
+    pieces = []
+    pos = 0
+    chrome_start = None
+    for match in PAGE_STRUCTURE_TAG_REGEX.finditer(page_source):
+        name = match.group(2).lower()
+        if not match.group(1):
+            if chrome_start is None and content_depth == 0 and name in PAGE_CHROME_TAGS:
+                chrome_start = match.start()
+            stack.append(name)
+            content_depth += name not in PAGE_CHROME_TAGS
+            continue
+        if name not in stack:
+            continue
+        while True:
+            closed = stack.pop()
+            content_depth -= closed not in PAGE_CHROME_TAGS
+            if closed == name:
+                break
+        # Блок оформления всегда снаружи остальных тегов: он закрыт, когда стек опустел
+        if chrome_start is not None and not stack:
+            pieces.append(page_source[pos:chrome_start])
+            pos = match.end()
+            chrome_start = None
+    pieces.append(page_source[pos:])
+    return "".join(pieces)
+
+
+def listing_fingerprint(page_source):
+    """
+    Отпечаток выдачи (sha1): страница без скриптов, стилей, шапки, меню и подвала
+    сайта (strip_page_chrome) и одноразовых значений (скрытые поля форм, nonce),
+    пробелы схлопнуты. Считается без построения дерева.
+    """
+    text = LISTING_NOISE_REGEX.sub("", page_source)
+    text = strip_page_chrome(text)
+    text = VOLATILE_HTML_REGEX.sub("", text)
+    text = WHITESPACE_REGEX.sub(" ", text)
+    return hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()
@@ -0,0 +1,95 @@
+# http_client.py
+"""
+Общий HTTP-клиент парсеров на aiohttp.
+
+Парсеры синхронные и выполняются в потоках, поэтому клиент держит свой цикл
+событий в фоновом потоке и одну ClientSession: соединения с магазинами
+переиспользуются между запросами (keep-alive), а get() из любого потока
+ставит корутину в этот цикл и ждёт результата. fetch() умеет условные
+запросы: с validators (ETag, Last-Modified прошлого ответа) сервер может
+ответить 304 без тела.
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import threading
+from collections import namedtuple
+
+import aiohttp
+
+import config
+
+# Заголовки обычного браузера: часть магазинов отдаёт упрощённую страницу без них
+DEFAULT_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.5",
+}
+
+# status 304 – страница не изменилась, text пустой
+HttpResponse = namedtuple("HttpResponse", "status text etag last_modified")
+
+
+class HttpClient:
+    def __init__(self, limit=20, limit_per_host=4):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._loop = None
+        self._session = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="http-client", daemon=True)
+            thread.start()
+            self._session = asyncio.run_coroutine_threadsafe(self._create_session(), loop).result()
+            self._loop, self._thread = loop, thread
+
+    async def _create_session(self):
+        connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host, ttl_dns_cache=300)
+        return aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS)
+
+    async def _fetch(self, url, timeout, headers):
+        async with self._session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+            if response.status == 304:
+                return HttpResponse(304, "", etag, last_modified)
+            response.raise_for_status()
+            return HttpResponse(response.status, await response.text(errors="replace"), etag, last_modified)
+
+    def fetch(self, url, timeout=10, etag=None, last_modified=None):
+        """HttpResponse; с etag/last_modified – условный запрос. При ошибке HTTP или таймауте – исключение."""
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        self._start()
+        future = asyncio.run_coroutine_threadsafe(self._fetch(url, timeout, headers), self._loop)
+        try:
+            return future.result(timeout + 1)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def get(self, url, timeout=10):
+        """Текст страницы; при ошибке HTTP или таймауте – исключение."""
+        return self.fetch(url, timeout).text
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+            self._loop = self._session = self._thread = None
+
+
+http_client = HttpClient(limit=config.HTTP_POOL_SIZE, limit_per_host=config.HTTP_POOL_PER_HOST)
+atexit.register(http_client.close)
@@ -39,7 +39,89 @@ class Product(db.Model):
             "last_updated": self.last_updated.isoformat() if self.last_updated else None
         }
 
-        
+
+class ProductSearchData(db.Model):
+    """
+    Предвычисленные при загрузке данные для поиска по товару:
+    каноническая лемматизированная форма названия и термины для индекса.
+    """
+    __tablename__ = 'product_search_data'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    # Хэш исходного названия и версии нормализации – по нему определяется, что данные устарели
+    signature = db.Column(db.String(40), nullable=False)
+    # Каноническая лемматизированная форма названия (порядок слов сохранён)
+    norm_name = db.Column(db.Text, nullable=False, default="")
+    # Токены, леммы и стеммы названия через пробел
+    index_terms = db.Column(db.Text, nullable=False, default="")
+
+
+class ProductAttributes(db.Model):
+    """
+    Числовые атрибуты товара, извлечённые из названия при загрузке
+    (см. product_attributes.py). Все поля индексированы для фильтров поиска.
+    """
+    __tablename__ = 'product_attributes'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    volume_ml = db.Column(db.Float, index=True)
+    diameter_mm = db.Column(db.Float, index=True)
+    # Размеры в порядке записи в названии (единицы – как на сайте)
+    dim_a = db.Column(db.Float, index=True)
+    dim_b = db.Column(db.Float, index=True)
+    dim_c = db.Column(db.Float, index=True)
+    pack_count = db.Column(db.Integer, index=True)
+    material = db.Column(db.String(32), index=True)
+
+
+class ProductMatch(db.Model):
+    """
+    Группы одинаковых товаров разных магазинов (см. product_matching.py).
+    Товары без пары в таблицу не попадают.
+    """
+    __tablename__ = 'product_matches'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    # id группы – наименьший id товара в группе
+    group_id = db.Column(db.Integer, nullable=False, index=True)
+    # Наибольшая схожесть названия с другим товаром группы
+    similarity = db.Column(db.Float, nullable=False)
+
+
+class SearchQuery(db.Model):
+    """История поисковых запросов – источник подсказок /api/suggest."""
+    __tablename__ = 'search_queries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Запрос в нижнем регистре, слова через один пробел
+    text = db.Column(db.String(255), unique=True, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    last_searched = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PageFingerprint(db.Model):
+    """
+    Отпечатки страниц выдачи фонового обхода (см. page_changes.py): если
+    страница не изменилась с прошлого обхода, её товары не разбираются заново.
+    """
+    __tablename__ = 'page_fingerprints'
+
+    store = db.Column(db.String(64), primary_key=True)
+    # Запрос фонового обхода (не "query" – это имя занято Model.query)
+    query_text = db.Column(db.String(255), primary_key=True)
+    # Номер страницы выдачи, с 1
+    page = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String(512), nullable=False)
+    # sha1 нормализованного HTML выдачи (html_parsing.listing_fingerprint)
+    fingerprint = db.Column(db.String(40), nullable=False)
+    # Валидаторы HTTP для условного запроса (If-None-Match / If-Modified-Since)
+    etag = db.Column(db.String(255))
+    last_modified = db.Column(db.String(64))
+    checked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Когда товары страницы последний раз разбирались и записывались
+    parsed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,143 @@
+# page_changes.py
+"""
+Пропуск неизменившихся страниц выдачи в фоновом обходе.
+
+Для каждой страницы (магазин, запрос, номер) в page_fingerprints хранится
+отпечаток выдачи (html_parsing.listing_fingerprint) и валидаторы HTTP, если
+магазин их присылает. В следующем обходе страница запрашивается условно
+(If-None-Match / If-Modified-Since); при ответе 304 или том же отпечатке она не
+разбирается, а если не изменилась ни одна страница задачи – не трогаются и
+товары в базе: сохраняются только новые валидаторы и время проверки. Страница, которую не разбирали дольше config.PAGE_FINGERPRINT_MAX_AGE
+секунд, разбирается в любом случае.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import config
+from html_parsing import listing_fingerprint
+from models import db, PageFingerprint
+
+logger = logging.getLogger(__name__)
+
+CHANGED, UNCHANGED, NOT_MODIFIED = "changed", "unchanged", "not_modified"
+
+
+class PageTracker:
+    """Страницы выдачи одной задачи обхода (магазин, запрос): прошлые отпечатки и текущая проверка."""
+
+    def __init__(self, store, query, previous=None):
+        self.store = store
+        self.query = query
+        self.previous = previous or {}  # номер страницы -> поля PageFingerprint
+        self.current = {}
+        self.failed_pages = set()
+        self._validators = {}
+
+    def validators(self, page):
+        """(ETag, Last-Modified) прошлого ответа для условного запроса страницы."""
+        entry = self.previous.get(page)
+        return (entry["etag"], entry["last_modified"]) if entry else (None, None)
+
+    def set_validators(self, page, etag, last_modified):
+        self._validators[page] = (etag, last_modified)
+
+    def known_urls(self, max_pages):
+        """Ссылки на страницы 2..max_pages из прошлого обхода (первая не изменилась – пагинация та же)."""
+        urls = []
+        for page in range(2, max_pages + 1):
+            if page not in self.previous:
+                break
+            urls.append(self.previous[page]["url"])
+        return urls
+
+    def not_modified(self, page, url):
+        self.current[page] = dict(self.previous[page], url=url, status=NOT_MODIFIED)
+
+    def failed(self, page):
+        self.failed_pages.add(page)
+
+    def check(self, page, url, html):
+        """Запоминает отпечаток загруженной страницы; True – страница изменилась и её нужно разобрать."""
+        fingerprint = listing_fingerprint(html)
+        entry = self.previous.get(page)
+        changed = entry is None or entry["fingerprint"] != fingerprint
+        etag, last_modified = self._validators.get(page, (None, None))
+        self.current[page] = {
+            "url": url, "fingerprint": fingerprint, "etag": etag, "last_modified": last_modified,
+            "parsed_at": datetime.utcnow() if changed else entry["parsed_at"],
+            "status": CHANGED if changed else UNCHANGED,
+        }
+        return changed
+
+    @property
+    def unchanged(self):
+        """Все загруженные страницы такие же, как в прошлом обходе: записывать в базу нечего."""
+        return bool(self.current) and all(entry["status"] != CHANGED for entry in self.current.values())
+
+
+class ChangeStats:
+    """Сколько страниц и задач обхода пропущено без разбора, по магазинам."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stores = {}
+
+    def record(self, tracker):
+        with self._lock:
+            entry = self._stores.setdefault(tracker.store, {
+                CHANGED: 0, UNCHANGED: 0, NOT_MODIFIED: 0, "tasks": 0, "tasks_skipped": 0,
+            })
+            for page in tracker.current.values():
+                entry[page["status"]] += 1
+            entry["tasks"] += 1
+            entry["tasks_skipped"] += tracker.unchanged
+
+    def snapshot(self):
+        with self._lock:
+            stores = {store: dict(entry) for store, entry in self._stores.items()}
+        for entry in stores.values():
+            pages = entry[CHANGED] + entry[UNCHANGED] + entry[NOT_MODIFIED]
+            entry["page_skip_ratio"] = (entry[UNCHANGED] + entry[NOT_MODIFIED]) / pages if pages else 0.0
+            entry["task_skip_ratio"] = entry["tasks_skipped"] / entry["tasks"] if entry["tasks"] else 0.0
+        return stores
+
+
+change_stats = ChangeStats()
+
+
+def load_page_fingerprints(max_age=None):
+    """{(магазин, запрос): {номер страницы: поля}} без страниц, не разбиравшихся дольше max_age секунд."""
+    max_age = config.PAGE_FINGERPRINT_MAX_AGE if max_age is None else max_age
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    fingerprints = {}
+    for row in PageFingerprint.query.filter(PageFingerprint.parsed_at >= cutoff):
+        fingerprints.setdefault((row.store, row.query_text), {})[row.page] = {
+            "url": row.url, "fingerprint": row.fingerprint, "etag": row.etag,
+            "last_modified": row.last_modified, "parsed_at": row.parsed_at,
+        }
+    return fingerprints
+
+
+def save_page_fingerprints(tracker):
+    """Сохраняет отпечатки проверенных страниц задачи – после записи её товаров."""
+    now = datetime.utcnow()
+    try:
+        for page, entry in tracker.current.items():
+            db.session.merge(PageFingerprint(
+                store=tracker.store, query_text=tracker.query, page=page, url=entry["url"],
+                fingerprint=entry["fingerprint"], etag=entry["etag"], last_modified=entry["last_modified"],
+                checked_at=now, parsed_at=entry["parsed_at"],
+            ))
+        first = tracker.current.get(1)
+        if first and first["status"] != NOT_MODIFIED:
+            # Выдача стала короче – лишние страницы больше не запрашиваем
+            last = max(set(tracker.current) | tracker.failed_pages)
+            PageFingerprint.query.filter(
+                PageFingerprint.store == tracker.store, PageFingerprint.query_text == tracker.query,
+                PageFingerprint.page > last,
+            ).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        logger.error("Не удалось сохранить отпечатки страниц %s для запроса '%s': %s", tracker.store, tracker.query, e)
+        db.session.rollback()
@@ -1,28 +1,317 @@
 # page_loader.py
+import hashlib
+import os
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 
+import config
+from circuit_breaker import StoreUnavailable, backoff_delay, store_breaker
+from common_regex import NO_RESULTS_REGEX
+from driver_pool import DriverPoolDepleted, driver_pool
+from driver_utils import page_bytes, set_blocked_urls, store_blocked_urls
+from html_parsing import page_urls
+from http_client import http_client
+
 logger = logging.getLogger(__name__)
 
-def load_page(driver, url, css_selector, wait_time=15, sleep_after=0.3, attempts=3):
+def wait_until_settled(driver, css_selector, interval, timeout):
+    """Ждёт, пока число элементов css_selector перестанет меняться (список догружается скриптами)."""
+    deadline = time.monotonic() + timeout
+    count = len(driver.find_elements(By.CSS_SELECTOR, css_selector))
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        current = len(driver.find_elements(By.CSS_SELECTOR, css_selector))
+        if current == count:
+            break
+        count = current
+    return count
+
+
+# Текст загруженного документа; пока документ загружается – пустая строка
+LOADED_TEXT_SCRIPT = "return document.readyState === 'complete' && document.body ? document.body.innerText : '';"
+
+
+def results_or_empty(css_selector):
+    """Условие ожидания: появились элементы css_selector или магазин сообщил, что ничего не найдено."""
+    def condition(driver):
+        if driver.find_elements(By.CSS_SELECTOR, css_selector):
+            return "results"
+        if NO_RESULTS_REGEX.search(driver.execute_script(LOADED_TEXT_SCRIPT) or ""):
+            return "empty"
+        return False
+    return condition
+
+
+def document_loaded(driver):
+    return driver.execute_script("return document.readyState") == "complete"
+
+
+def load_page(driver, url, css_selector, wait_time=15, attempts=3):
     """
-    Загружает страницу по URL, ожидает появления элементов, удовлетворяющих css_selector.
-    Производится до attempts попыток при ошибке.
+    Загружает страницу по URL, ожидает появления элементов, удовлетворяющих css_selector,
+    и того, что их число перестало расти. Страница без таких элементов (сообщение
+    «ничего не найдено» или документ загрузился, а элементов нет за wait_time) –
+    пустая выдача, а не ошибка. Производится до attempts попыток при ошибке,
+    между попытками – случайная экспоненциально растущая пауза.
     """
     for attempt in range(1, attempts + 1):
         try:
             driver.get(url)
-            WebDriverWait(driver, wait_time).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, css_selector))
-            )
-            time.sleep(sleep_after)
+            try:
+                found = WebDriverWait(driver, wait_time, poll_frequency=config.PAGE_SETTLE_INTERVAL).until(
+                    results_or_empty(css_selector)
+                )
+            except TimeoutException:
+                if not document_loaded(driver):
+                    raise
+                logger.info("%s: страница загрузилась без '%s', выдача пустая", url, css_selector)
+                return driver.page_source
+            if found == "results":
+                wait_until_settled(driver, css_selector, config.PAGE_SETTLE_INTERVAL, config.PAGE_SETTLE_TIMEOUT)
             return driver.page_source
         except Exception as e:
             logger.error("Attempt %d/%d: Error loading %s: %s", attempt, attempts, url, e)
             if attempt == attempts:
                 raise e
             else:
-                time.sleep(1)
+                time.sleep(backoff_delay(attempt))
+
+
+class FetchStats:
+    """Какой способ загрузки сработал для каждого магазина и сколько он занял."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stores = {}
+
+    def _store(self, store):
+        return self._stores.setdefault(store, {
+            "http": 0, "browser": 0, "failed": 0, "skipped": 0, "http_ms": 0.0, "browser_ms": 0.0, "browser_bytes": 0,
+            "http_misses": 0, "http_disabled_until": 0.0, "last_strategy": None,
+        })
+
+    def record(self, store, strategy, elapsed_ms, loaded_bytes=0):
+        with self._lock:
+            entry = self._store(store)
+            entry[strategy] += 1
+            entry["last_strategy"] = strategy
+            if strategy in ("http", "browser"):
+                entry[strategy + "_ms"] += elapsed_ms
+            if strategy == "browser":
+                entry["browser_bytes"] += loaded_bytes
+            if strategy == "http":
+                entry["http_misses"] = 0
+
+    def http_miss(self, store):
+        """HTTP не дал нужной разметки; после FETCH_HTTP_MISS_LIMIT промахов подряд
+        магазин на FETCH_HTTP_RETRY_INTERVAL секунд загружается сразу браузером."""
+        with self._lock:
+            entry = self._store(store)
+            entry["http_misses"] += 1
+            if entry["http_misses"] >= config.FETCH_HTTP_MISS_LIMIT:
+                entry["http_misses"] = 0
+                entry["http_disabled_until"] = time.monotonic() + config.FETCH_HTTP_RETRY_INTERVAL
+                logger.info("%s: HTTP не даёт товаров, до повторной проверки – только браузер", store)
+
+    def http_enabled(self, store):
+        with self._lock:
+            return self._store(store)["http_disabled_until"] <= time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            stores = {store: dict(entry) for store, entry in self._stores.items()}
+        now = time.monotonic()
+        for entry in stores.values():
+            for strategy in ("http", "browser"):
+                entry[strategy + "_ms_avg"] = entry[strategy + "_ms"] / entry[strategy] if entry[strategy] else 0.0
+            entry["browser_bytes_avg"] = entry["browser_bytes"] / entry["browser"] if entry["browser"] else 0
+            entry["http_disabled_for"] = max(entry.pop("http_disabled_until") - now, 0.0)
+        return stores
+
+
+fetch_stats = FetchStats()
+
+
+def save_page(store, url, html):
+    """Сохраняет страницу в config.PARSER_SAVE_PAGES_DIR/<магазин>/ для parser_bench.py."""
+    directory = os.path.join(config.PARSER_SAVE_PAGES_DIR, store)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        name = hashlib.md5(url.encode("utf-8")).hexdigest() + ".html"
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(html)
+    except OSError as e:
+        logger.error("Не удалось сохранить страницу %s: %s", url, e)
+
+
+_store_slots = {}
+_store_slots_lock = threading.Lock()
+
+
+def store_slots(store):
+    """Семафор магазина: не больше config.STORE_CONCURRENCY одновременных загрузок его страниц."""
+    with _store_slots_lock:
+        slots = _store_slots.get(store)
+        if slots is None:
+            limit = config.STORE_CONCURRENCY.get(store, config.STORE_CONCURRENCY_DEFAULT)
+            slots = _store_slots[store] = threading.BoundedSemaphore(limit)
+        return slots
+
+
+def fetch_page(store, url, css_selector, extract, wait_time=15, attempts=3, tracker=None, page=1):
+    """
+    Страница поиска магазина store: (HTML, товары extract(HTML)).
+
+    Если для магазина в config.FETCH_STRATEGIES указано "http", страница сначала
+    запрашивается общим HTTP-клиентом; драйвер из пула берётся, только если extract
+    не нашёл в ответе товаров (страница собирается скриптами) или запрос не удался.
+    Для "browser" и магазинов, которых нет в FETCH_STRATEGIES, сразу используется
+    драйвер, который ждёт элементов css_selector. Сработавший способ учитывается в fetch_stats.
+    Пока магазин отключён автоматом (circuit_breaker), сразу выбрасывает StoreUnavailable;
+    в автомат засчитываются только ошибки загрузки (сеть, таймаут недогрузившейся
+    страницы, сбой браузера) – пустая выдача поиска считается удачной загрузкой.
+    С tracker (page_changes.PageTracker) HTTP-запрос страницы номер page условный;
+    если сервер ответил 304, возвращается None, а если совпал отпечаток страницы,
+    товары не разбираются и вместо них возвращается None.
+    """
+    breaker = store_breaker(store)
+    if not breaker.allow():
+        fetch_stats.record(store, "skipped", 0.0)
+        raise StoreUnavailable(f"{store}: магазин временно отключён после ошибок загрузки")
+    try:
+        with store_slots(store):
+            result = _fetch_page(store, url, css_selector, extract, wait_time, attempts, tracker, page)
+    except DriverPoolDepleted:
+        # Магазин тут ни при чём
+        breaker.abandon()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+def _page_products(html, url, extract, tracker, page):
+    """Товары страницы; None – страница такая же, как в прошлом обходе, разбирать её не нужно."""
+    if tracker is not None and not tracker.check(page, url, html):
+        return None
+    return extract(html)
+
+
+def _fetch_page(store, url, css_selector, extract, wait_time, attempts, tracker, page):
+    http_empty = False
+    if config.FETCH_STRATEGIES.get(store, "browser") == "http" and fetch_stats.http_enabled(store):
+        started = time.perf_counter()
+        etag, last_modified = tracker.validators(page) if tracker else (None, None)
+        try:
+            response = http_client.fetch(url, timeout=config.FETCH_HTTP_TIMEOUT, etag=etag, last_modified=last_modified)
+            if response.status == 304 and tracker is not None:
+                fetch_stats.record(store, "http", (time.perf_counter() - started) * 1000)
+                tracker.not_modified(page, url)
+                return None
+            html = response.text
+            if tracker is not None:
+                tracker.set_validators(page, response.etag, response.last_modified)
+            products = _page_products(html, url, extract, tracker, page)
+            if products is None or products:
+                fetch_stats.record(store, "http", (time.perf_counter() - started) * 1000)
+                if config.PARSER_SAVE_PAGES_DIR:
+                    save_page(store, url, html)
+                return html, products
+            # Без товаров может быть и шаблон страницы без данных, и пустая выдача –
+            # решает браузер; промахом HTTP это считается, только если он товары нашёл
+            logger.info("%s: в ответе HTTP нет товаров, загружаю браузером", store)
+            http_empty = True
+            if tracker is not None:
+                tracker.set_validators(page, None, None)
+        except Exception as e:
+            logger.warning("%s: HTTP-запрос %s не удался (%s), загружаю браузером", store, url, e)
+            fetch_stats.http_miss(store)
+
+    started = time.perf_counter()
+    try:
+        driver = driver_pool.acquire_driver(timeout=10)
+    except Exception:
+        fetch_stats.record(store, "failed", 0.0)
+        raise
+    try:
+        try:
+            set_blocked_urls(driver, store_blocked_urls(store))
+        except Exception as e:
+            logger.error("%s: не удалось задать блокировку загрузок: %s", store, e)
+        html = load_page(driver, url, css_selector, wait_time=wait_time, attempts=attempts)
+        loaded_bytes = page_bytes(driver)
+    except Exception:
+        fetch_stats.record(store, "failed", 0.0)
+        raise
+    finally:
+        driver_pool.release_driver(driver)
+    fetch_stats.record(store, "browser", (time.perf_counter() - started) * 1000, loaded_bytes)
+    if config.PARSER_SAVE_PAGES_DIR:
+        save_page(store, url, html)
+    products = _page_products(html, url, extract, tracker, page)
+    if http_empty and products:
+        fetch_stats.http_miss(store)
+    return html, products
+
+
+def fetch_result_pages(store, url, css_selector, page_regex, extract, max_pages=None, wait_time=15, attempts=3,
+                       tracker=None):
+    """
+    Товары страниц выдачи поиска (extract(HTML) для каждой страницы): первой
+    и следующих, не больше max_pages (по умолчанию config.MAX_RESULT_PAGES).
+    Номера страниц берутся из пагинации первой страницы, и остальные страницы
+    загружаются параллельно (одновременно – не больше config.STORE_CONCURRENCY
+    для магазина); дальше последнего номера и при одной ссылке rel="next" – по одной.
+    Ошибка загрузки первой страницы выбрасывается, следующих – только пишется в лог.
+
+    С tracker (page_changes.PageTracker) возвращаются только товары страниц, изменившихся
+    с прошлого обхода: на остальные сервер ответил 304 или совпал их отпечаток.
+    """
+    max_pages = config.MAX_RESULT_PAGES if max_pages is None else max_pages
+
+    def fetch(page, page_url):
+        try:
+            return fetch_page(store, page_url, css_selector, extract, wait_time=wait_time, attempts=attempts,
+                              tracker=tracker, page=page)
+        except Exception as e:
+            logger.error("%s: не удалось загрузить страницу выдачи %s: %s", store, page_url, e)
+            if tracker is not None:
+                tracker.failed(page)
+            return None
+
+    first = fetch_page(store, url, css_selector, extract, wait_time=wait_time, attempts=attempts,
+                       tracker=tracker, page=1)
+    if first is not None:
+        urls, next_url = page_urls(first[0], url, page_regex, max_pages)
+    else:
+        # Первая страница не изменилась (304) – пагинация та же, что в прошлом обходе
+        urls, next_url = tracker.known_urls(max_pages), None
+    pages = [first]
+    seen = {url}
+    if urls:
+        workers = config.STORE_CONCURRENCY.get(store, config.STORE_CONCURRENCY_DEFAULT)
+        numbers = range(2, len(urls) + 2)
+        with ThreadPoolExecutor(max_workers=min(workers, len(urls))) as executor:
+            results = list(executor.map(fetch, numbers, urls))
+        pages += results
+        seen.update(urls)
+        # Пагинация могла показать не все номера – продолжаем с последней страницы по rel="next"
+        next_url = page_urls(results[-1][0], urls[-1], page_regex, max_pages)[1] if results[-1] else None
+    while next_url and next_url not in seen and len(pages) < max_pages:
+        seen.add(next_url)
+        result = fetch(len(pages) + 1, next_url)
+        if result is None:
+            break
+        pages.append(result)
+        _, next_url = page_urls(result[0], next_url, page_regex, max_pages)
+    loaded = [result for result in pages if result is not None]
+    if len(pages) > 1:
+        logger.info("%s: загружено страниц выдачи: %d", store, len(loaded))
+    return [products for _, products in loaded if products is not None]
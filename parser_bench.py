@@ -0,0 +1,119 @@
+# parser_bench.py
+"""
+Замеры скорости разбора страниц магазинов на сохранённом HTML.
+
+Страницы собираются самим приложением: при config.PARSER_SAVE_PAGES_DIR
+fetch_page сохраняет каждую загруженную страницу в <папка>/<магазин>/*.html.
+Для каждого магазина разбор прогоняется в нескольких вариантах – исходный
+html.parser по всей странице, lxml по всей странице и lxml только по
+карточкам товаров (config.PARSER_SCOPED) – и печатается число товаров в
+секунду, время на страницу и совпадают ли ссылки найденных товаров.
+
+    python parser_bench.py --pages parser_pages
+    python parser_bench.py --pages parser_pages --store artplast --repeat 10
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+import time
+
+import config
+from parsers import artplast, gudvin, hozka, newpackspb, promispb
+
+# Функции разбора по магазинам (ссылка-заглушка – для товаров без своей ссылки)
+EXTRACTORS = {
+    "artplast": artplast.extract_artplast,
+    "gudvin": gudvin.extract_gudvin,
+    "hozka": hozka.extract_hozka,
+    "newpackspb": lambda html: newpackspb.extract_newpackspb(html, "https://newpackspb.ru/"),
+    "promispb": lambda html: promispb.extract_promispb(html, "https://promispb.ru/"),
+}
+
+# (название, парсер, только карточки); первый вариант – исходный способ разбора
+VARIANTS = [
+    ("html.parser, вся страница", "html.parser", False),
+    ("lxml, вся страница", "lxml", False),
+    ("lxml, только карточки", "lxml", True),
+]
+
+
+def load_pages(pages_dir, store):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, store, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+
+def run_variant(extract, pages, backend, scoped, repeat):
+    """(товаров на всех страницах, лучшее время прохода по страницам в секундах, ссылки товаров)."""
+    config.PARSER_BACKEND, config.PARSER_SCOPED = backend, scoped
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = [extract(html) for html in pages]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    links = [[item["link"] for item in products] for products in results]
+    return sum(len(products) for products in results), best, links
+
+
+def run_benchmark(pages_dir, stores, repeat=3):
+    saved = config.PARSER_BACKEND, config.PARSER_SCOPED
+    report = {}
+    try:
+        for store in stores:
+            pages = load_pages(pages_dir, store)
+            if not pages:
+                continue
+            variants = {}
+            baseline_links = None
+            for name, backend, scoped in VARIANTS:
+                count, seconds, links = run_variant(EXTRACTORS[store], pages, backend, scoped, repeat)
+                if baseline_links is None:
+                    baseline_links = links
+                variants[name] = {
+                    "products": count,
+                    "per_second": count / seconds if seconds else 0.0,
+                    "ms_per_page": seconds * 1000 / len(pages),
+                    "same_links": links == baseline_links,
+                }
+            report[store] = {"pages": len(pages), "variants": variants}
+    finally:
+        config.PARSER_BACKEND, config.PARSER_SCOPED = saved
+    return report
+
+
+def print_report(report):
+    for store, data in report.items():
+        print(f"{store}: страниц {data['pages']}")
+        baseline = None
+        for name, variant in data["variants"].items():
+            baseline = baseline or variant["per_second"]
+            speedup = variant["per_second"] / baseline if baseline else 0.0
+            mark = "" if variant["same_links"] else "  ссылки отличаются от исходного разбора!"
+            print(f"  {name:28s} {variant['per_second']:8.0f} тов/с  {variant['ms_per_page']:7.1f} мс/стр  "
+                  f"x{speedup:.1f}  ({variant['products']} тов.){mark}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры скорости разбора страниц магазинов")
+    parser.add_argument("--pages", default=config.PARSER_SAVE_PAGES_DIR or "parser_pages",
+                        help="папка с сохранёнными страницами <магазин>/*.html")
+    parser.add_argument("--store", choices=sorted(EXTRACTORS), action="append", help="только этот магазин")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов прохода по страницам")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    report = run_benchmark(args.pages, args.store or list(EXTRACTORS), args.repeat)
+    if not report:
+        print(f"В {args.pages} нет сохранённых страниц (см. config.PARSER_SAVE_PAGES_DIR)")
+        return 1
+    print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
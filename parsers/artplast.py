@@ -2,56 +2,60 @@
 import logging
 import re
 from urllib.parse import quote, urljoin
-from bs4 import BeautifulSoup
-from driver_pool import driver_pool
-from common_regex import DECIMAL_REGEX, INTEGER_REGEX, PACK_REGEX_ARTPLAST
+from common_regex import (DECIMAL_REGEX, INTEGER_REGEX, PACK_REGEX_ARTPLAST, NAME_CLASS_ARTPLAST,
+                          PRICE_CLASS_ARTPLAST, PRICE_SPAN_CLASS_ARTPLAST, AVAILABILITY_CLASS_ARTPLAST,
+                          LINK_REGEX_ARTPLAST, PAGE_PARAM_REGEX)
+from html_parsing import make_soup, product_cards, unique_by_link
 from timer_utils import timer
-from page_loader import load_page
+from page_loader import fetch_result_pages
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def parse_artplast(query: str):
+def parse_artplast(query: str, max_pages=None, tracker=None, raise_errors=False):
     encoded_query = quote(query)
     url = f"https://spb.artplast.ru/search/?q={encoded_query}"
     logger.info("[ARTPLAST DEBUG] Request URL: %s", url)
 
-    with timer("ArtPlast: Driver acquisition"):
-        driver = driver_pool.acquire_driver(timeout=10)
-
     try:
-        with timer("ArtPlast: Page loading and waiting"):
-            page_source = load_page(driver, url, "a[href^='/tovar/']", wait_time=15, sleep_after=0.3, attempts=3)
+        with timer("ArtPlast: Page loading and parsing"):
+            pages = fetch_result_pages("artplast", url, "a[href^='/tovar/']", PAGE_PARAM_REGEX, extract_artplast,
+                                       max_pages, wait_time=15, attempts=3, tracker=tracker)
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error("[ARTPLAST DEBUG] Ошибка при загрузке страницы: %s", e)
-        page_source = ""
-    finally:
-        driver.delete_all_cookies()
-        driver_pool.release_driver(driver)
+        pages = []
+
+    return unique_by_link(pages)
+
+
+def extract_artplast(page_source):
+    # У карточки нет общего класса: поля ищутся внутри наибольшего блока вокруг
+    # ссылки на товар, где нет ссылок на другие товары (product_cards)
+    soup = make_soup(page_source)
+    product_elems = soup.find_all("a", href=LINK_REGEX_ARTPLAST)
+    cards = product_cards(product_elems, lambda elem: elem.get("href"))
 
-    with timer("ArtPlast: DOM parsing"):
-        soup = BeautifulSoup(page_source, "html.parser")
-        product_elems = soup.find_all("a", href=lambda href: href and href.startswith("/tovar/"))
-    
     products = []
     seen = set()
-    for elem in product_elems:
+    for elem, card in zip(product_elems, cards):
         try:
             link = urljoin("https://spb.artplast.ru/", elem.get("href"))
             if link in seen:
                 continue
             seen.add(link)
             
-            name_elem = elem.find_next("a", class_=lambda c: c and "hover:text-violet" in c)
+            name_elem = card.find("a", class_=NAME_CLASS_ARTPLAST)
             name = name_elem.get_text(strip=True) if name_elem else "Без названия"
 
             # Дополнительная фильтрация по названию убрана
             
             price_numeric = 0.0
             price_display = ""
-            price_div = elem.find_next("div", class_=lambda c: c and "min-w-" in c)
+            price_div = card.find("div", class_=PRICE_CLASS_ARTPLAST)
             if price_div:
-                price_span = price_div.find("span", class_=lambda c: c and "tracking-wider" in c)
+                price_span = price_div.find("span", class_=PRICE_SPAN_CLASS_ARTPLAST)
                 if price_span:
                     price_text = price_span.get_text(strip=True)
                     numbers = DECIMAL_REGEX.findall(price_text)
@@ -61,10 +65,10 @@ def parse_artplast(query: str):
                         match = INTEGER_REGEX.search(price_text)
                         price_numeric = float(match.group()) if match else 0.0
                     price_display = price_text
-            avail_span = elem.find_next("span", class_=lambda c: c and ("text-green" in c or "text-orange" in c))
+            avail_span = card.find("span", class_=AVAILABILITY_CLASS_ARTPLAST)
             availability = avail_span.get_text(strip=True) if avail_span else "Неизвестно"
             step = 1
-            pack_spans = elem.find_all_next("span", class_="truncate")
+            pack_spans = card.find_all("span", class_="truncate")
             for span in pack_spans:
                 alt_text = span.get_text(strip=True)
                 m_alt = PACK_REGEX_ARTPLAST.search(alt_text)
@@ -72,7 +76,7 @@ def parse_artplast(query: str):
                     step = int(m_alt.group(1))
                     break
             quantity = step
-            img_tag = elem.find_next("img")
+            img_tag = card.find("img")
             img_url = ""
             if img_tag:
                 img_url = img_tag.get("data-src") or img_tag.get("src") or ""
@@ -2,41 +2,45 @@
 import logging
 import re
 from urllib.parse import quote, urljoin
-from bs4 import BeautifulSoup
-from driver_pool import driver_pool
-from common_regex import DECIMAL_REGEX, INTEGER_REGEX, PACK_REGEX_GUDVIN
+import soupsieve
+from bs4 import SoupStrainer
+from common_regex import DECIMAL_REGEX, INTEGER_REGEX, PACK_REGEX_GUDVIN, CARD_CLASS_GUDVIN, PAGE_PARAM_REGEX
+from html_parsing import make_soup, unique_by_link
 from timer_utils import timer
-from page_loader import load_page
+from page_loader import fetch_result_pages
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def parse_gudvin(query: str):
+# В дерево попадают только карточки товаров
+CARD_STRAINER = SoupStrainer("div", {"class": CARD_CLASS_GUDVIN})
+ALTERNATIVE_CARDS = soupsieve.compile("div.product-item, div.product-snippet")
+
+def parse_gudvin(query: str, max_pages=None, tracker=None, raise_errors=False):
     encoded_query = quote(query)
     url = f"https://gudvin-group.ru/?search={encoded_query}&s=1"
     logger.info("[GUDVIN DEBUG] Request URL: %s", url)
 
-    with timer("Gudvin: Driver acquisition"):
-        driver = driver_pool.acquire_driver(timeout=10)
-
     try:
-        with timer("Gudvin: Page loading and waiting"):
-            page_source = load_page(driver, url, ".product-card, .product-item, .product-snippet",
-                                    wait_time=15, sleep_after=0.3, attempts=3)
+        with timer("Gudvin: Page loading and parsing"):
+            pages = fetch_result_pages("gudvin", url, ".product-card, .product-item, .product-snippet",
+                                       PAGE_PARAM_REGEX, extract_gudvin, max_pages, wait_time=15, attempts=3,
+                                       tracker=tracker)
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error("[GUDVIN DEBUG] Ошибка при загрузке страницы: %s", e)
-        page_source = ""
-    finally:
-        driver.delete_all_cookies()
-        driver_pool.release_driver(driver)
+        pages = []
+
+    return unique_by_link(pages)
+
+def extract_gudvin(page_source):
+    soup = make_soup(page_source, CARD_STRAINER)
+    product_elems = soup.find_all("div", class_="product-card")
+    if not product_elems:
+        product_elems = ALTERNATIVE_CARDS.select(soup)
+        logger.info("[GUDVIN DEBUG] Использую альтернативный селектор, найдено %d элементов", len(product_elems))
 
-    with timer("Gudvin: DOM parsing"):
-        soup = BeautifulSoup(page_source, "html.parser")
-        product_elems = soup.find_all("div", class_="product-card")
-        if not product_elems:
-            product_elems = soup.select("div.product-item, div.product-snippet")
-            logger.info("[GUDVIN DEBUG] Использую альтернативный селектор, найдено %d элементов", len(product_elems))
-    
     products = []
     for elem in product_elems:
         try:
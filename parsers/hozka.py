@@ -1,20 +1,23 @@
 import logging
-import re
 from typing import List, Dict, Optional
 from urllib.parse import quote, urljoin
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
-from driver_pool import driver_pool
-from common_regex import INTEGER_REGEX
+from common_regex import (DECIMAL_REGEX, INTEGER_REGEX, UNAVAILABLE_REGEX_HOZKA, TITLE_CLASS_HOZKA,
+                          PRICE_CLASS_HOZKA, QUANTITY_CLASS_HOZKA, LINK_REGEX_HOZKA, PAGE_PARAM_REGEX)
+from html_parsing import make_soup, unique_by_link
 from timer_utils import timer
-from page_loader import load_page
+from page_loader import fetch_result_pages
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# В дерево попадают только ссылки на товары – карточка целиком внутри ссылки
+CARD_STRAINER = SoupStrainer("a", {"href": LINK_REGEX_HOZKA})
 
-def parse_hozka(query: str) -> List[Dict]:
+
+def parse_hozka(query: str, max_pages=None, tracker=None, raise_errors=False) -> List[Dict]:
     """
     Парсит результаты поиска с сайта Hozka.pro и возвращает список товаров.
     
@@ -23,6 +26,8 @@ def parse_hozka(query: str) -> List[Dict]:
       - Если найдено количество штук в упаковке (целое число > 1), цена делится на количество для расчёта цены за единицу.
       - Если упаковка не указана или равна 1, цена остаётся без изменений.
       - Если в содержимом товара встречается "Под заказ" или "Скоро появится", товар считается недоступным.
+      - Если выдачу не удалось загрузить, возвращается пустой список, а с raise_errors
+        (фоновый обход) ошибка выбрасывается.
     
     Возвращает:
       List[Dict]: список товаров с полями:
@@ -40,30 +45,33 @@ def parse_hozka(query: str) -> List[Dict]:
     url = f"https://hozka.pro/search?search={encoded_query}"
     logger.info("Request URL: %s", url)
 
-    with timer("Hozka: Driver acquisition"):
-        driver = driver_pool.acquire_driver(timeout=10)
-
     try:
-        with timer("Hozka: Page loading and waiting"):
-            page_source = load_page(
-                driver,
+        with timer("Hozka: Page loading and parsing"):
+            pages = fetch_result_pages(
+                "hozka",
                 url,
                 css_selector="a[href^='/catalog/']",
+                page_regex=PAGE_PARAM_REGEX,
+                extract=extract_hozka,
+                max_pages=max_pages,
                 wait_time=15,
-                sleep_after=0.3,
-                attempts=3
+                attempts=3,
+                tracker=tracker
             )
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error("Ошибка при загрузке страницы: %s", e)
-        page_source = ""
-    finally:
-        driver.delete_all_cookies()
-        driver_pool.release_driver(driver)
+        pages = []
+
+    return unique_by_link(pages)
+
 
+def extract_hozka(page_source: str) -> List[Dict]:
+    """Товары из HTML страницы поиска Hozka.pro (см. parse_hozka)."""
     products: List[Dict] = []
-    with timer("Hozka: DOM parsing"):
-        soup = BeautifulSoup(page_source, "html.parser")
-        product_elems = soup.find_all("a", href=lambda href: href and href.startswith("/catalog/"))
+    soup = make_soup(page_source, CARD_STRAINER)
+    product_elems = soup.find_all("a", href=LINK_REGEX_HOZKA)
 
     for elem in product_elems:
         product = _parse_product_element(elem)
@@ -94,21 +102,21 @@ def _parse_product_element(elem: BeautifulSoup) -> Optional[Dict]:
         link = urljoin("https://hozka.pro/", raw_href)
 
         # Извлечение названия товара
-        title_elem = elem.find("div", class_=lambda c: c and "line-clamp-2" in c)
+        title_elem = elem.find("div", class_=TITLE_CLASS_HOZKA)
         name = title_elem.get_text(strip=True) if title_elem else ""
         if not name:
             return None
 
         # Парсинг цены, указанной на сайте
         total_price = 0.0
-        price_elem = elem.find("div", class_=lambda c: c and "font-bold" in c)
+        price_elem = elem.find("div", class_=PRICE_CLASS_HOZKA)
         if price_elem:
             price_text = price_elem.get_text(strip=True)
-            numbers = re.findall(r'\d+[,.]\d+', price_text)
+            numbers = DECIMAL_REGEX.findall(price_text)
             if numbers:
                 total_price = float(numbers[0].replace(',', '.'))
             else:
-                match = re.search(r'\d+', price_text)
+                match = INTEGER_REGEX.search(price_text)
                 if match:
                     total_price = float(match.group())
 
@@ -117,7 +125,7 @@ def _parse_product_element(elem: BeautifulSoup) -> Optional[Dict]:
         unit_price = total_price
 
         # Поиск количества штук в упаковке (например, с классом "mt-3")
-        quantity_elem = elem.find("div", class_=lambda c: c and "mt-3" in c)
+        quantity_elem = elem.find("div", class_=QUANTITY_CLASS_HOZKA)
         if quantity_elem:
             qty_text = quantity_elem.get_text(strip=True)
             m = INTEGER_REGEX.search(qty_text)
@@ -137,7 +145,7 @@ def _parse_product_element(elem: BeautifulSoup) -> Optional[Dict]:
 
         # Определение доступности: ищем индикаторы "Под заказ" или "Скоро появится"
         availability = "В наличии"
-        if elem.find(text=re.compile(r"(Под заказ|Скоро появится)", re.IGNORECASE)):
+        if elem.find(string=UNAVAILABLE_REGEX_HOZKA):
             availability = "Не в наличии"
 
         # Извлечение ссылки на изображение
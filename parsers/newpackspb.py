@@ -2,48 +2,50 @@
 import logging
 import re
 from urllib.parse import urljoin, quote
-from bs4 import BeautifulSoup
-from driver_pool import driver_pool
-from common_regex import DECIMAL_REGEX, INTEGER_REGEX
+from common_regex import DECIMAL_REGEX, INTEGER_REGEX, PRICE_CLASS_NEWPACKSPB, AMOUNT_CLASS_NEWPACKSPB, PAGE_PATH_REGEX
+from html_parsing import make_soup, product_cards, unique_by_link
 from timer_utils import timer
-from page_loader import load_page
+from page_loader import fetch_result_pages
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def parse_newpackspb(query: str):
+def parse_newpackspb(query: str, max_pages=None, tracker=None, raise_errors=False):
     encoded_query = quote(query)
     url = f"https://newpackspb.ru/?s={encoded_query}&post_type=product"
     logger.info("[NEWPACKSPB DEBUG] Request URL: %s", url)
 
-    with timer("NewPacksPB: Driver acquisition"):
-        driver = driver_pool.acquire_driver(timeout=10)
-
     try:
-        with timer("NewPacksPB: Page loading and waiting"):
-            page_source = load_page(driver, url, "a.woocommerce-LoopProduct-link",
-                                    wait_time=15, sleep_after=0.3, attempts=3)
+        with timer("NewPacksPB: Page loading and parsing"):
+            pages = fetch_result_pages("newpackspb", url, "a.woocommerce-LoopProduct-link",
+                                       PAGE_PATH_REGEX, lambda page: extract_newpackspb(page, url), max_pages,
+                                       wait_time=15, attempts=3, tracker=tracker)
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error("[NEWPACKSPB DEBUG] Ошибка при загрузке страницы: %s", e)
-        page_source = ""
-    finally:
-        driver.delete_all_cookies()
-        driver_pool.release_driver(driver)
+        pages = []
+
+    return unique_by_link(pages)
+
+
+def extract_newpackspb(page_source, url):
+    # url – ссылка для товаров без своей ссылки; цена и картинка ищутся
+    # в карточке вокруг ссылки на товар (product_cards)
+    soup = make_soup(page_source)
+    product_elems = soup.find_all("a", class_="woocommerce-LoopProduct-link")
+    cards = product_cards(product_elems, lambda elem: elem.get("href"))
 
-    with timer("NewPacksPB: DOM parsing"):
-        soup = BeautifulSoup(page_source, "html.parser")
-        product_elems = soup.find_all("a", class_="woocommerce-LoopProduct-link")
-    
     products = []
-    for elem in product_elems:
+    for elem, card in zip(product_elems, cards):
         try:
             name = elem.get_text(strip=True) if elem.get_text(strip=True) else "Без названия"
             link = elem.get("href") or url
             price_numeric = 0.0
             price_display = ""
-            price_div = elem.find_next("div", class_=lambda c: c and "price-wrapper" in c)
+            price_div = card.find("div", class_=PRICE_CLASS_NEWPACKSPB)
             if price_div:
-                price_span = price_div.find("span", class_=lambda c: c and "woocommerce-Price-amount" in c)
+                price_span = price_div.find("span", class_=AMOUNT_CLASS_NEWPACKSPB)
                 if price_span:
                     bdi = price_span.find("bdi")
                     if bdi:
@@ -64,7 +66,7 @@ def parse_newpackspb(query: str):
             else:
                 price_numeric = 0.0
                 price_display = ""
-            img_tag = elem.find_previous("img")
+            img_tag = card.find("img")
             img_url = ""
             if img_tag:
                 img_url = img_tag.get("data-src") or img_tag.get("src") or ""
@@ -2,37 +2,41 @@
 import logging
 import re
 from urllib.parse import quote, urljoin
-from bs4 import BeautifulSoup
-from driver_pool import driver_pool
-from common_regex import DECIMAL_REGEX, INTEGER_REGEX
+from bs4 import SoupStrainer
+from common_regex import DECIMAL_REGEX, INTEGER_REGEX, CARD_CLASS_PROMISPB, PAGE_PARAM_REGEX
+from html_parsing import make_soup, unique_by_link
 from timer_utils import timer
-from page_loader import load_page
+from page_loader import fetch_result_pages
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def parse_promispb(query: str):
+# В дерево попадают только карточки товаров
+CARD_STRAINER = SoupStrainer("div", {"class": CARD_CLASS_PROMISPB})
+
+def parse_promispb(query: str, max_pages=None, tracker=None, raise_errors=False):
     encoded_query = quote(query)
     url = f"https://promispb.ru/search/?query={encoded_query}"
     logger.info("[PROMISPB DEBUG] Request URL: %s", url)
 
-    with timer("Promispb: Driver acquisition"):
-        driver = driver_pool.acquire_driver(timeout=10)
     try:
-        with timer("Promispb: Page loading and waiting"):
-            page_source = load_page(driver, url, ".products__pr-price-base, .price-wrapper",
-                                    wait_time=15, sleep_after=0.3, attempts=3)
+        with timer("Promispb: Page loading and parsing"):
+            pages = fetch_result_pages("promispb", url, ".products__pr-price-base, .price-wrapper",
+                                       PAGE_PARAM_REGEX, lambda page: extract_promispb(page, url), max_pages,
+                                       wait_time=15, attempts=3, tracker=tracker)
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error("[PROMISPB DEBUG] Ошибка при загрузке страницы: %s", e)
-        page_source = ""
-    finally:
-        driver.delete_all_cookies()
-        driver_pool.release_driver(driver)
-    
-    with timer("Promispb: DOM parsing"):
-        soup = BeautifulSoup(page_source, "html.parser")
-        product_elems = soup.find_all("div", class_="products__item")
-    
+        pages = []
+
+    return unique_by_link(pages)
+
+def extract_promispb(page_source, url):
+    # url – ссылка для товаров без своей ссылки
+    soup = make_soup(page_source, CARD_STRAINER)
+    product_elems = soup.find_all("div", class_="products__item")
+
     products = []
     for elem in product_elems:
         try:
@@ -0,0 +1,128 @@
+# product_attributes.py
+"""
+Извлечение числовых атрибутов из названий товаров и запросов.
+
+Из строки вида "Стакан бумажный 400 мл (50шт)" получаются типизированные
+значения: объём в мл, диаметр, размеры, количество в упаковке, материал.
+Для товаров атрибуты сохраняются в таблицу product_attributes при загрузке.
+Атрибуты из текста запроса поднимают совпавшие товары в выдаче, но не
+отбрасывают остальные; жёсткие фильтры – только явные фильтры API.
+"""
+import re
+
+from common_regex import VOLUME_REGEX, DIAMETER_REGEX, DIMENSIONS_REGEX, PACK_COUNT_REGEX
+
+# Числовые атрибуты, по которым API принимает фильтры (значение или диапазон min/max)
+NUMERIC_ATTRIBUTES = ("volume_ml", "diameter_mm", "dim_a", "dim_b", "dim_c", "pack_count")
+
+# Материал: короткие обозначения сравниваются целиком, длинные – по началу слова
+MATERIAL_WORDS = {
+    "пп": "пп", "pp": "пп", "пэт": "пэт", "pet": "пэт", "пс": "пс", "ps": "пс",
+    "пэ": "пэ", "пнд": "пнд", "пвд": "пвд",
+}
+MATERIAL_PREFIXES = {
+    "полипропилен": "пп", "полистирол": "пс", "полиэтилен": "пэ",
+    "бумаг": "бумага", "бумаж": "бумага", "картон": "картон", "крафт": "крафт",
+    "дерев": "дерево", "алюмин": "алюминий", "пластик": "пластик", "стекл": "стекло",
+}
+
+# Слова запроса, которые относятся к числу рядом, а не к товару: "400 мл", "d 90", "100 шт"
+UNIT_WORDS = {"мл", "л", "мм", "см", "шт", "уп", "d", "ø", "диаметр"}
+
+
+def _number(text):
+    return float(text.replace(",", "."))
+
+
+def _material(text):
+    for token in re.findall(r'\w+', text.lower()):
+        if token in MATERIAL_WORDS:
+            return MATERIAL_WORDS[token]
+        for prefix, material in MATERIAL_PREFIXES.items():
+            if token.startswith(prefix):
+                return material
+    return None
+
+
+def _scan(text):
+    """Атрибуты, найденные в строке."""
+    attributes = {}
+    match = VOLUME_REGEX.search(text)
+    if match:
+        # Для "400/473мл" – номинальный объём, как его называют в запросах
+        value = _number(match.group(1))
+        attributes["volume_ml"] = value * 1000 if match.group(3).lower() == "л" else value
+    match = DIAMETER_REGEX.search(text)
+    if match:
+        attributes["diameter_mm"] = _number(match.group(1))
+    match = DIMENSIONS_REGEX.search(text)
+    if match:
+        attributes["dim_a"] = _number(match.group(1))
+        attributes["dim_b"] = _number(match.group(2))
+        if match.group(3):
+            attributes["dim_c"] = _number(match.group(3))
+    match = PACK_COUNT_REGEX.search(text)
+    if match:
+        attributes["pack_count"] = int(match.group(1))
+    return attributes
+
+
+def extract_attributes(name):
+    """Атрибуты товара по названию (для сохранения в product_attributes)."""
+    attributes = _scan(name)
+    attributes["material"] = _material(name)
+    return attributes
+
+
+def query_attribute_filters(query):
+    """
+    Фильтры по числовым атрибутам, упомянутым в запросе:
+    "стакан 400 мл" -> {"volume_ml": 400.0}. Размеры запроса ищутся в любом
+    порядке сторон ("dimensions"). Текст запроса не меняется – числа
+    участвуют и в оценке схожести.
+    """
+    attributes = _scan(query)
+    filters = {key: attributes[key] for key in ("volume_ml", "diameter_mm", "pack_count") if key in attributes}
+    if "dim_a" in attributes:
+        filters["dimensions"] = [attributes[key] for key in ("dim_a", "dim_b", "dim_c") if key in attributes]
+    return filters
+
+
+def is_attribute_token(token):
+    """Слово запроса задаёт атрибут: число ("400", "0,5", "400мл", "24х37", "d90") или единицу измерения."""
+    token = token.lower()
+    return any(ch.isdigit() for ch in token) or token in UNIT_WORDS
+
+
+def normalize_filters(raw):
+    """
+    Проверяет фильтры из запроса API и приводит значения к числам.
+    Числовой атрибут: число или {"min": ..., "max": ...}; "material": строка
+    (как в названии или обозначение: "полипропилен" и "пп" – одно и то же);
+    "dimensions": список из 2–3 чисел. При ошибке – ValueError.
+    """
+    if not raw:
+        return {}
+    if not isinstance(raw, dict):
+        raise ValueError("filters должен быть объектом")
+    filters = {}
+    for key, value in raw.items():
+        if key in NUMERIC_ATTRIBUTES:
+            if isinstance(value, dict):
+                bounds = {bound: float(value[bound]) for bound in ("min", "max") if value.get(bound) is not None}
+                if not bounds:
+                    raise ValueError(f"для {key} не задан ни min, ни max")
+                filters[key] = bounds
+            else:
+                filters[key] = float(value)
+        elif key == "material":
+            # Материал приводится к тому же обозначению, что и в названиях: "полипропилен" -> "пп"
+            text = str(value).strip().lower()
+            filters[key] = _material(text) or text
+        elif key == "dimensions":
+            if not isinstance(value, (list, tuple)) or len(value) not in (2, 3):
+                raise ValueError("dimensions должен содержать 2 или 3 числа")
+            filters[key] = [float(v) for v in value]
+        else:
+            raise ValueError(f"неизвестный фильтр {key}")
+    return filters
@@ -0,0 +1,165 @@
+# product_matching.py
+"""
+Сопоставление одинаковых товаров разных магазинов для сравнения цен.
+
+После каждой загрузки каталога товары разбиваются на блоки по первому значимому
+слову канонической формы названия ("стакан", "крышка") и числовым атрибутам
+(объём, диаметр, размеры). Внутри блока названия сравниваются попарно
+rapidfuzz.process.cdist: среднее token_set_ratio и token_sort_ratio, чтобы
+короткое общее название ("тарталетка бумажная белая") не совпадало полностью
+с любым более длинным. Пары из разных магазинов с непротиворечивым
+материалом объединяются в группы по убыванию схожести так, чтобы в группе было
+не больше одного товара каждого магазина. Группы сохраняются в product_matches,
+а при поиске остаётся только найти группу товара по id.
+"""
+import logging
+import threading
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+import config
+from models import db, Product, ProductSearchData, ProductAttributes, ProductMatch
+from smart_search import STOP_WORDS, select_top
+
+logger = logging.getLogger(__name__)
+
+
+def _block_key(norm_name, attributes):
+    word = next((token for token in norm_name.split()
+                 if len(token) > 1 and not token.isdigit() and token not in STOP_WORDS), None)
+    if word is None:
+        return None
+    if attributes is None:
+        return (word,)
+    dims = tuple(v for v in (attributes.dim_a, attributes.dim_b, attributes.dim_c) if v is not None)
+    # "30х40" и "40х30" – один размер
+    if len(dims) == 2:
+        dims = tuple(sorted(dims))
+    return (word, attributes.volume_ml, attributes.diameter_mm, dims)
+
+
+def _find(parent, item):
+    while parent[item] != item:
+        parent[item] = parent[parent[item]]
+        item = parent[item]
+    return item
+
+
+def match_products():
+    """
+    Возвращает {id товара: (id группы, схожесть)} только для товаров, у которых нашлась пара.
+    id группы – наименьший id товара в ней.
+    """
+    rows = (db.session.query(Product.id, Product.site, ProductSearchData.norm_name, ProductAttributes)
+            .join(ProductSearchData, ProductSearchData.product_id == Product.id)
+            .outerjoin(ProductAttributes, ProductAttributes.product_id == Product.id)
+            .order_by(Product.id)
+            .all())
+    blocks = {}
+    for product_id, site, norm_name, attributes in rows:
+        key = _block_key(norm_name, attributes)
+        if key is not None:
+            material = attributes.material if attributes is not None else None
+            blocks.setdefault(key, []).append((product_id, site or "", norm_name, material))
+
+    pairs = []
+    for members in blocks.values():
+        if len(members) < 2 or len({site for _, site, _, _ in members}) < 2:
+            continue
+        names = [norm_name for _, _, norm_name, _ in members]
+        scores = (process.cdist(names, names, scorer=fuzz.token_set_ratio, dtype=np.float64, workers=-1)
+                  + process.cdist(names, names, scorer=fuzz.token_sort_ratio, dtype=np.float64, workers=-1)) / 2
+        left, right = np.nonzero(np.triu(scores >= config.MATCH_MIN_SIMILARITY, k=1))
+        for i, j in zip(left.tolist(), right.tolist()):
+            a, b = members[i], members[j]
+            if a[1] == b[1] or (a[3] and b[3] and a[3] != b[3]):
+                continue
+            pairs.append((float(scores[i, j]), a[0], b[0], a[1], b[1]))
+
+    parent = {}
+    sites = {}
+    similarity = {}
+    # Сначала самые похожие пары; группа не может содержать два товара одного магазина
+    for score, a, b, site_a, site_b in sorted(pairs, key=lambda pair: (-pair[0], pair[1], pair[2])):
+        for product_id, site in ((a, site_a), (b, site_b)):
+            if product_id not in parent:
+                parent[product_id] = product_id
+                sites[product_id] = {site}
+        root_a, root_b = _find(parent, a), _find(parent, b)
+        if root_a == root_b or sites[root_a] & sites[root_b]:
+            continue
+        root, child = min(root_a, root_b), max(root_a, root_b)
+        parent[child] = root
+        sites[root] |= sites.pop(child)
+        similarity[a] = max(similarity.get(a, 0.0), score)
+        similarity[b] = max(similarity.get(b, 0.0), score)
+    return {product_id: (_find(parent, product_id), similarity[product_id]) for product_id in similarity}
+
+
+_groups = {}  # id товара -> id группы
+_groups_lock = threading.Lock()
+
+
+def _set_groups(groups):
+    global _groups
+    with _groups_lock:
+        _groups = groups
+
+
+def rebuild_product_matches():
+    """Пересчитывает группы и перезаписывает product_matches. Возвращает число групп."""
+    matches = match_products()
+    db.session.query(ProductMatch).delete()
+    db.session.bulk_save_objects([ProductMatch(product_id=product_id, group_id=group_id, similarity=score)
+                                  for product_id, (group_id, score) in matches.items()])
+    db.session.commit()
+    _set_groups({product_id: group_id for product_id, (group_id, _) in matches.items()})
+    groups = len(set(_groups.values()))
+    logger.info("Product matching: %d groups, %d products", groups, len(matches))
+    return groups
+
+
+def load_product_matches():
+    """Загружает группы из product_matches; если таблица пуста, считает их заново."""
+    rows = db.session.query(ProductMatch.product_id, ProductMatch.group_id).all()
+    if not rows:
+        return rebuild_product_matches()
+    _set_groups(dict(rows))
+    return len(set(_groups.values()))
+
+
+def _offer_sort_key(item):
+    # Товары без цены – в конце группы
+    unit_price = item["unit_price"] or 0.0
+    return (unit_price <= 0, unit_price, item["id"])
+
+
+def group_offers(items, limit=None, offset=0, sort=None):
+    """
+    Группирует найденные товары по группам сопоставления. В группе предложения
+    идут от самой низкой цены за штуку; группы упорядочены как в select_top:
+    по схожести лучшего предложения или по его цене.
+    """
+    groups = {}
+    for item in items:
+        groups.setdefault(_groups.get(item["id"], item["id"]), []).append(item)
+    offer_groups = []
+    for group_id, offers in groups.items():
+        offers = sorted(offers, key=_offer_sort_key)
+        best = max(offers, key=lambda item: item["similarity"])
+        offer_groups.append({
+            "group_id": group_id,
+            "name": best["name"],
+            "similarity": best["similarity"],
+            "price": offers[0]["price"],
+            "unit_price": offers[0]["unit_price"],
+            "stores": len(offers),
+            "offers": offers,
+        })
+    return {
+        "total": len(offer_groups),
+        "offset": offset,
+        "limit": limit,
+        "offer_groups": select_top(offer_groups, limit, offset, sort, getter=dict.get),
+    }
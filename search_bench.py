@@ -0,0 +1,310 @@
+# search_bench.py
+"""
+Замеры скорости и качества smart_search на замороженной копии myapp.db.
+
+Прогоняет запросы фонового парсера (config.PREDEFINED_QUERIES), запросы с
+опечатками и цепочки уточнений, печатает p50/p95/p99 задержки, число
+кандидатов, время отбора кандидатов, загрузки из БД и оценки, полноту
+выдачи относительно эталона search_golden.json, а также ускорение и
+совпадение выдачи уточняющих запросов, оцениваемых по кандидатам предыдущего.
+
+    python search_bench.py                    # отчёт
+    python search_bench.py --check            # код возврата 1 при регрессии выдачи
+    python search_bench.py --update-golden    # перезаписать эталонную выдачу
+    python search_bench.py --update-baseline  # запомнить задержки на этой машине
+    python search_bench.py --check --check-timing  # и при замедлении относительно них
+
+Выдача сверяется с эталоном всегда, задержки – только по запросу (--check-timing)
+и только с замерами той же машины: абсолютный порог зависел бы от её скорости.
+Проверка выдачи запускается и из pytest (tests/test_search_golden.py).
+"""
+import inspect
+
+if not hasattr(inspect, "getargspec"):
+    def getargspec(func):
+        full_spec = inspect.getfullargspec(func)
+        return full_spec.args, full_spec.varargs, full_spec.varkw, full_spec.defaults
+    inspect.getargspec = getargspec
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from flask import Flask
+
+import config
+from models import db
+
+GOLDEN_PATH = "search_golden.json"
+# Задержки, записанные --update-baseline на этой машине (в репозиторий не попадают)
+BASELINE_PATH = "search_bench_baseline.json"
+# Сколько лучших результатов каждого запроса сравнивается с эталоном
+GOLDEN_TOP_N = 20
+# Пороги для --check; MAX_P95_RATIO – во сколько раз p95 может превысить записанный (--check-timing)
+MIN_RECALL = 0.95
+MAX_P95_RATIO = 1.5
+
+# Запросы с опечатками -> правильное написание
+TYPO_QUERIES = {
+    "стокан": "стакан",
+    "Уголоки": "Уголок",
+    "крышька": "крышка",
+    "пакэт": "пакет",
+    "контеинер": "контейнер",
+    "салфктки": "салфетки",
+    "Размешеватель": "Размешиватель",
+    "пиргамент": "пергамент",
+}
+
+# Цепочки уточняющих запросов, как их набирают пользователи
+REFINEMENT_CHAINS = [
+    ["стакан", "стакан 400", "стакан 400 мл"],
+    ["крышка", "крышка для стакана", "крышка для стакана 90"],
+    ["пакет", "пакет фасовочный", "пакет фасовочный 24х37"],
+    ["контейнер", "контейнер 500 мл"],
+]
+
+
+def bench_queries():
+    queries = list(dict.fromkeys(config.PREDEFINED_QUERIES))
+    queries += [q for q in TYPO_QUERIES if q not in queries]
+    for chain in REFINEMENT_CHAINS:
+        queries += [q for q in chain if q not in queries]
+    return queries
+
+
+def create_bench_app(db_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.abspath(db_path)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100.0
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def top_ids(results):
+    return [item["id"] for item in results[:GOLDEN_TOP_N]]
+
+
+def recall(got, expected):
+    if not expected:
+        return 1.0 if not got else 0.0
+    return len(set(got) & set(expected)) / len(expected)
+
+
+def run_benchmark(db_path="myapp.db", engine=None, repeat=3):
+    """Возвращает отчёт: задержки, замеры по этапам и выдачу по каждому запросу."""
+    work_dir = tempfile.mkdtemp(prefix="search_bench_")
+    frozen_db = os.path.join(work_dir, "bench.db")
+    shutil.copy(db_path, frozen_db)
+    config.SEARCH_VOCABULARY_PATH = os.path.join(work_dir, "vocabulary.txt")
+    if engine:
+        config.SEARCH_ENGINE = engine
+
+    import smart_search
+    from search_fts import ensure_fts_index
+
+    app = create_bench_app(frozen_db)
+    report = {"engine": config.SEARCH_ENGINE, "queries": {}}
+    try:
+        with app.app_context():
+            db.create_all()
+            smart_search.ensure_search_data()
+            smart_search.refresh_search_structures()
+            if config.SEARCH_ENGINE == "fts":
+                ensure_fts_index()
+            queries = bench_queries()
+            for query in queries:  # прогрев кэша лемм
+                smart_search.search_products(query, group=False)
+
+            latencies = []
+            stage_totals = {"candidates_ms": 0.0, "db_ms": 0.0, "scoring_ms": 0.0}
+            for query in queries:
+                samples = []
+                for _ in range(repeat):
+                    smart_search.clear_result_cache()
+                    started = time.perf_counter()
+                    results = smart_search.search_products(query, group=False)
+                    samples.append((time.perf_counter() - started) * 1000)
+                stats = smart_search.last_search_stats()
+                for key in stage_totals:
+                    stage_totals[key] += stats.get(key, 0.0)
+                latencies.extend(samples)
+                report["queries"][query] = {
+                    "ms": min(samples),
+                    "candidates": stats.get("candidates", 0),
+                    "results": len(results),
+                    "top": [[item["id"], round(item["similarity"], 4)] for item in results[:GOLDEN_TOP_N]],
+                }
+
+            # Весь список запросов одним пакетом
+            samples = []
+            for _ in range(repeat):
+                smart_search.clear_result_cache()
+                started = time.perf_counter()
+                smart_search.search_products_batch(queries)
+                samples.append((time.perf_counter() - started) * 1000)
+            report["batch_ms"] = min(samples)
+
+            # Цепочки уточнений в рамках одной сессии поиска
+            report["refinement"] = {}
+            for number, chain in enumerate(REFINEMENT_CHAINS):
+                for _ in range(repeat):
+                    smart_search.clear_result_cache()
+                    for query in chain:
+                        started = time.perf_counter()
+                        results = smart_search.search_products(query, group=False, session_key=f"bench-{number}")
+                        elapsed = (time.perf_counter() - started) * 1000
+                        if not smart_search.last_search_stats().get("refined"):
+                            continue
+                        entry = report["refinement"].setdefault(query, {"ms": elapsed})
+                        entry["ms"] = min(entry["ms"], elapsed)
+                        full = [i for i, _ in report["queries"][query]["top"]]
+                        entry["recall"] = recall(top_ids(results), full)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    count = len(report["queries"]) or 1
+    report["latency_ms"] = {p: percentile(latencies, p) for p in (50, 95, 99)}
+    report["stages_ms"] = {key: value / count for key, value in stage_totals.items()}
+    report["mean_candidates"] = sum(q["candidates"] for q in report["queries"].values()) / count
+    report["typo_recall"] = {
+        typo: recall([i for i, _ in report["queries"][typo]["top"]],
+                     [i for i, _ in report["queries"][correct]["top"]])
+        for typo, correct in TYPO_QUERIES.items() if correct in report["queries"]
+    }
+    refinement = report["refinement"]
+    report["refinement_speedup"] = (
+        sum(report["queries"][q]["ms"] for q in refinement) / max(sum(r["ms"] for r in refinement.values()), 1e-9)
+        if refinement else 0.0
+    )
+    return report
+
+
+def compare_with_golden(report, golden):
+    """Полнота топ-N относительно эталона и число запросов с изменившимся порядком."""
+    recalls = {}
+    reordered = []
+    for query, expected in golden.items():
+        got = report["queries"].get(query)
+        if got is None:
+            continue
+        got_ids = [i for i, _ in got["top"]]
+        expected_ids = [i for i, _ in expected]
+        recalls[query] = recall(got_ids, expected_ids)
+        if got["top"] != expected:
+            reordered.append(query)
+    return recalls, reordered
+
+
+def check_regressions(report, golden, baseline=None):
+    """Список найденных регрессий (пустой, если всё в порядке); задержки – только если задан baseline."""
+    problems = []
+    recalls, _ = compare_with_golden(report, golden)
+    for query, value in sorted(recalls.items()):
+        if value < MIN_RECALL:
+            problems.append(f"полнота для '{query}' {value:.2f} < {MIN_RECALL}")
+    for typo, value in sorted(report["typo_recall"].items()):
+        if value < MIN_RECALL:
+            problems.append(f"опечатка '{typo}': совпадение с правильным запросом {value:.2f}")
+    for query, data in sorted(report["refinement"].items()):
+        if data["recall"] < MIN_RECALL:
+            problems.append(f"уточнение '{query}': совпадение с полным поиском {data['recall']:.2f}")
+    if baseline:
+        limit = baseline["latency_ms"]["95"] * MAX_P95_RATIO
+        if report["latency_ms"][95] > limit:
+            problems.append(f"p95 {report['latency_ms'][95]:.1f} мс > {limit:.1f} мс "
+                            f"({MAX_P95_RATIO} x записанных {baseline['latency_ms']['95']:.1f} мс)")
+    return problems
+
+
+def load_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_report(report, golden):
+    latency = report["latency_ms"]
+    stages = report["stages_ms"]
+    print(f"Движок: {report['engine']}, запросов: {len(report['queries'])}")
+    print(f"Задержка: p50 {latency[50]:.1f} мс, p95 {latency[95]:.1f} мс, p99 {latency[99]:.1f} мс")
+    print(f"Среднее по этапам: кандидаты {stages['candidates_ms']:.2f} мс, "
+          f"БД {stages['db_ms']:.2f} мс, оценка {stages['scoring_ms']:.2f} мс")
+    print(f"Кандидатов в среднем: {report['mean_candidates']:.0f}")
+    slowest = sorted(report["queries"].items(), key=lambda item: item[1]["ms"], reverse=True)[:5]
+    for query, data in slowest:
+        print(f"  {data['ms']:7.1f} мс  {data['candidates']:5d} канд.  {data['results']:4d} рез.  {query}")
+    if golden:
+        recalls, reordered = compare_with_golden(report, golden)
+        if recalls:
+            print(f"Полнота топ-{GOLDEN_TOP_N} к эталону: средняя {sum(recalls.values()) / len(recalls):.3f}, "
+                  f"минимальная {min(recalls.values()):.3f}; порядок изменился в {len(reordered)} запросах")
+    typo = report["typo_recall"]
+    if typo:
+        print(f"Опечатки: совпадение с правильным запросом в среднем {sum(typo.values()) / len(typo):.3f}")
+    sequential = sum(data["ms"] for data in report["queries"].values())
+    print(f"Пакетный поиск: {report['batch_ms']:.1f} мс на весь список против {sequential:.1f} мс по одному")
+    refinement = report["refinement"]
+    if refinement:
+        print(f"Уточнения: {len(refinement)} запросов, быстрее полного поиска в {report['refinement_speedup']:.1f} раза, "
+              f"совпадение с полным поиском минимум {min(r['recall'] for r in refinement.values()):.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры скорости и качества smart_search")
+    parser.add_argument("--db", default="myapp.db", help="база, копия которой используется для замеров")
+    parser.add_argument("--engine", choices=["index", "fts", "like"], help="движок отбора кандидатов")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов каждого запроса")
+    parser.add_argument("--golden", default=GOLDEN_PATH, help="файл эталонной выдачи")
+    parser.add_argument("--update-golden", action="store_true", help="сохранить текущую выдачу как эталон")
+    parser.add_argument("--check", action="store_true", help="завершиться с кодом 1 при регрессии")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="файл записанных задержек")
+    parser.add_argument("--update-baseline", action="store_true", help="записать задержки этого прогона")
+    parser.add_argument("--check-timing", action="store_true",
+                        help="с --check: считать регрессией p95 больше записанного в MAX_P95_RATIO раз")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.db, args.engine, args.repeat)
+    golden = load_json(args.golden)
+    print_report(report, golden)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"engine": report["engine"], "latency_ms": report["latency_ms"]}, f, indent=1)
+        print(f"Задержки сохранены в {args.baseline}")
+    if args.update_golden:
+        golden = {query: data["top"] for query, data in report["queries"].items()}
+        with open(args.golden, "w", encoding="utf-8") as f:
+            json.dump(golden, f, ensure_ascii=False, indent=1, sort_keys=True)
+        print(f"Эталон сохранён в {args.golden}")
+    elif args.check:
+        baseline = None
+        if args.check_timing:
+            baseline = load_json(args.baseline)
+            if not baseline:
+                print(f"Нет записанных задержек ({args.baseline}): сначала запустите с --update-baseline")
+                return 1
+        problems = check_regressions(report, golden, baseline)
+        for problem in problems:
+            print("РЕГРЕССИЯ:", problem)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
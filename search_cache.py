@@ -0,0 +1,80 @@
+# search_cache.py
+"""
+Кэш результатов поиска с учётом поколения каталога.
+
+Каждая запись помнит поколение каталога, для которого она вычислена.
+Фоновый парсер после записи изменений увеличивает счётчик поколения,
+и все ранее сохранённые результаты становятся недействительными без
+явного обхода кэша. Для короткоживущих данных (кандидаты сессии поиска)
+задаётся ещё и время жизни записи.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def current_generation():
+    return _generation
+
+
+def bump_generation():
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        return _generation
+
+
+class SearchResultCache:
+    def __init__(self, maxsize=512, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl  # секунды; None – без ограничения
+        self._entries = OrderedDict()  # ключ -> (поколение, время записи, результат)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            generation, stored_at, value = entry
+            if generation != _generation or (self.ttl is not None and time.monotonic() - stored_at > self.ttl):
+                # Результат вычислен для старой версии каталога или устарел
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (_generation, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "generation": _generation,
+            }
@@ -0,0 +1,100 @@
+# search_fts.py
+"""
+Полнотекстовый движок отбора кандидатов на SQLite FTS5.
+
+Виртуальная таблица products_fts зеркалирует products: название товара и
+предвычисленные термины (токены, леммы, стеммы) из product_search_data.
+Синхронизация выполняется триггерами на product_search_data, которую
+обновляет фоновый парсер, поэтому отдельного шага в загрузке не требуется.
+"""
+import logging
+
+from sqlalchemy import text
+
+from models import db
+from search_index import MIN_PREFIX_LENGTH
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "products_fts"
+
+_SCHEMA = [
+    # remove_diacritics 0: "й" и "ё" не сворачиваются в "и" и "е"
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+        USING fts5(name, terms, tokenize = 'unicode61 remove_diacritics 0')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON product_search_data BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, terms)
+        SELECT p.id, p.name, new.index_terms FROM products p WHERE p.id = new.product_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON product_search_data BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.product_id;
+        INSERT INTO {FTS_TABLE}(rowid, name, terms)
+        SELECT p.id, p.name, new.index_terms FROM products p WHERE p.id = new.product_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON product_search_data BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.product_id;
+    END""",
+]
+
+_available = None
+
+
+def ensure_fts_index():
+    """
+    Создаёт таблицу FTS5 и триггеры, при расхождении с product_search_data
+    перезаполняет таблицу целиком. Возвращает False, если SQLite собран без FTS5.
+    """
+    global _available
+    try:
+        for statement in _SCHEMA:
+            db.session.execute(text(statement))
+        fts_count = db.session.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+        data_count = db.session.execute(text("SELECT count(*) FROM product_search_data")).scalar()
+        if fts_count != data_count:
+            db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+            db.session.execute(text(
+                f"""INSERT INTO {FTS_TABLE}(rowid, name, terms)
+                    SELECT p.id, p.name, d.index_terms
+                    FROM products p JOIN product_search_data d ON d.product_id = p.id"""
+            ))
+            logger.info("FTS5 index rebuilt: %d rows", data_count)
+        db.session.commit()
+        _available = True
+    except Exception as e:
+        db.session.rollback()
+        logger.error("FTS5 недоступен, используется индекс в памяти: %s", e)
+        _available = False
+    return _available
+
+
+def fts_available():
+    if _available is None:
+        ensure_fts_index()
+    return _available
+
+
+def _term(word):
+    quoted = '"' + word.replace('"', '""') + '"'
+    # Как и в индексе в памяти, короткие слова ищутся только целиком
+    return quoted + "*" if len(word) >= MIN_PREFIX_LENGTH else quoted
+
+
+def build_match_expression(groups):
+    """Группы слов -> выражение MATCH: слова группы через AND, группы через OR, поиск по префиксу."""
+    clauses = []
+    for words in groups:
+        if words:
+            clauses.append("(" + " AND ".join(_term(word) for word in words) + ")")
+    return " OR ".join(clauses)
+
+
+def fts_candidate_ids(groups, limit):
+    """Возвращает id лучших по bm25 товаров (не более limit)."""
+    expression = build_match_expression(groups)
+    if not expression:
+        return set()
+    rows = db.session.execute(
+        text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :expr ORDER BY bm25({FTS_TABLE}) LIMIT :limit"),
+        {"expr": expression, "limit": limit},
+    )
+    return {row[0] for row in rows}
@@ -0,0 +1,108 @@
+# search_index.py
+"""
+Инвертированный индекс по названиям товаров.
+
+Индекс хранит для каждого термина (токен, лемма, стем) множество id товаров,
+в названии которых он встречается. Поиск кандидатов сводится к объединению и
+пересечению списков вхождений вместо полного прохода по таблице с ILIKE.
+Индекс собирается целиком и подменяется атомарно, поэтому читатели никогда
+не видят его в полупостроенном состоянии.
+
+Дополнительно по словам названий и их нормальным формам строится индекс триграмм:
+для слова с опечаткой он быстро отбирает похожие слова каталога.
+"""
+import bisect
+import threading
+
+# Минимальная длина термина, начиная с которой ищем и по префиксу
+# (аналог подстрочного ILIKE для словоформ: "стакан" -> "стаканчик")
+MIN_PREFIX_LENGTH = 3
+
+
+def word_trigrams(word):
+    padded = f"${word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}    # термин -> множество id товаров
+        self.vocabulary = []  # отсортированный словарь для поиска по префиксу
+        self.product_ids = set()
+        self.words = set()    # слова названий и их нормальные формы
+        self.trigrams = {}    # триграмма -> множество слов
+
+    def add(self, product_id, terms, words=()):
+        self.product_ids.add(product_id)
+        for term in terms:
+            self.postings.setdefault(term, set()).add(product_id)
+        for word in words:
+            if word not in self.words:
+                self.words.add(word)
+                for trigram in word_trigrams(word):
+                    self.trigrams.setdefault(trigram, set()).add(word)
+
+    def finalize(self):
+        self.vocabulary = sorted(self.postings)
+        return self
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def lookup(self, word):
+        """Возвращает id товаров, содержащих термин или термин с таким префиксом."""
+        if len(word) < MIN_PREFIX_LENGTH:
+            return self.postings.get(word, set())
+        found = set()
+        pos = bisect.bisect_left(self.vocabulary, word)
+        while pos < len(self.vocabulary) and self.vocabulary[pos].startswith(word):
+            found |= self.postings[self.vocabulary[pos]]
+            pos += 1
+        return found
+
+    def similar_words(self, word, limit):
+        """Не более limit слов каталога с наибольшим числом общих с word триграмм."""
+        shared = {}
+        for trigram in word_trigrams(word):
+            for other in self.trigrams.get(trigram, ()):
+                shared[other] = shared.get(other, 0) + 1
+        return sorted(shared, key=lambda other: (-shared[other], other))[:limit]
+
+    def candidates(self, groups, memo=None):
+        """
+        groups – список групп слов. Внутри группы (например, многословный
+        синоним) списки вхождений пересекаются, между группами – объединяются.
+        memo – словарь найденных списков, общий для нескольких запросов.
+        """
+        result = set()
+        for words in groups:
+            if not words:
+                continue
+            matched = None
+            for word in sorted(words, key=len, reverse=True):
+                if memo is None:
+                    ids = self.lookup(word)
+                else:
+                    if word not in memo:
+                        memo[word] = self.lookup(word)
+                    ids = memo[word]
+                matched = set(ids) if matched is None else matched & ids
+                if not matched:
+                    break
+            if matched:
+                result |= matched
+        return result
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    return _index
+
+
+def set_search_index(index):
+    global _index
+    with _index_lock:
+        _index = index
@@ -1,40 +1,58 @@
+import os
 import re
+import json
+import time
+import heapq
+import hashlib
+import logging
+import threading
+from collections import Counter
+from functools import lru_cache
+import numpy as np
 import pymorphy2
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 from nltk.stem.snowball import SnowballStemmer
-from sqlalchemy import or_
-from models import Product
+from sqlalchemy import or_, and_
+import config
+from common_regex import NUMBER_UNIT_REGEX
+from models import db, Product, ProductSearchData, ProductAttributes
+from product_attributes import NUMERIC_ATTRIBUTES, extract_attributes, is_attribute_token, query_attribute_filters
+from search_index import SearchIndex, get_search_index, set_search_index
+from search_fts import fts_available, fts_candidate_ids
+from search_cache import SearchResultCache, bump_generation, current_generation
+from catalog_snapshot import IN_STOCK_MARKER, build_catalog_snapshot, get_catalog_snapshot, set_catalog_snapshot
 
-# Инициализация pymorphy2 для лемматизации
+logger = logging.getLogger(__name__)
+
+# Инициализация pymorphy2 для лемматизации.
+# Разборы кэшируются в ограниченном LRU, чтобы память долгоживущих воркеров не росла.
 morph = pymorphy2.MorphAnalyzer()
-_cached = {}
 _old_parse = morph.parse
 
-def _cached_parse(word, *args, **kwargs):
-    if word in _cached:
-        return _cached[word]
-    result = _old_parse(word, *args, **kwargs)
-    _cached[word] = result
-    return result
+@lru_cache(maxsize=config.LEMMA_CACHE_SIZE)
+def _cached_parse(word):
+    return _old_parse(word)
 
 morph.parse = _cached_parse
 stemmer = SnowballStemmer("russian")
 
-# Словарь синонимов
-SYNONYMS = {
-    "пергамент": ["бумага для выпечки", "бумага для выпекания", "бумага"],
-    "бумага": ["пергамент", "бумага для выпечки", "бумага для выпекания", "бумага для принтера"],
-    "крышка": ["накрытие", "топпер"],
-    "мешалка": ["размешиватель"],
-    "контейнер для супа": ["супница"],
-    "купольная": ["купол"],
-    "двухслойные": ["двухслойные", "2 слойные", "2-слойные"],
-    "стакан": ["чашка", "пластиковый стакан", "стеклянный стакан"]
-}
+@lru_cache(maxsize=config.STEM_CACHE_SIZE)
+def stem_word(word):
+    return stemmer.stem(word)
+
+# Список стоп-слов
+STOP_WORDS = {"для", "и", "на", "в", "с", "по", "без", "от"}
+
+# Версия нормализации названий: при изменении правил предвычисленные данные пересчитываются
+NORMALIZER_VERSION = "5"
 
-# Токенизация: приведение к нижнему регистру, выделение буквенно-цифровых последовательностей
+# Размер пачки id в запросе IN (ограничение SQLite на число параметров)
+ID_CHUNK_SIZE = 900
+
+# Токенизация: приведение к нижнему регистру, выделение буквенно-цифровых последовательностей;
+# число и единица измерения – отдельные токены ("400мл" -> "400", "мл")
 def tokenize(text):
-    text = text.lower()
+    text = NUMBER_UNIT_REGEX.sub(" ", text.lower())
     return re.findall(r'\w+', text)
 
 # Получение нормальных форм слова (лемматизация)
@@ -55,20 +73,9 @@ def lemmatize_tokens(tokens):
 def stem_tokens(tokens):
     words = set()
     for token in tokens:
-        words.add(stemmer.stem(token))
+        words.add(stem_word(token))
     return list(words)
 
-# Расширение набора токенов синонимами
-def expand_synonyms(tokens):
-    expanded = set(tokens)
-    for token in tokens:
-        token_lower = token.lower()
-        if token_lower in SYNONYMS:
-            for syn in SYNONYMS[token_lower]:
-                expanded.add(syn)
-                expanded.update(get_normal_forms(syn))
-    return list(expanded)
-
 # Нормализация текста: лемматизация с сохранением порядка
 def normalize_text(text):
     tokens = tokenize(text)
@@ -78,25 +85,131 @@ def normalize_text(text):
         normalized.append(p.normal_form)
     return " ".join(normalized)
 
-# Преобразование строки в каноническую форму: замена токенов по словарю синонимов
+# Основная нормальная форма слова (первый разбор pymorphy2)
+def first_normal_form(token):
+    return morph.parse(token)[0].normal_form
+
+# Нормальные формы синонима: для слова – все варианты разбора, для фразы – лемматизированная фраза
+def phrase_normal_forms(phrase):
+    tokens = tokenize(phrase)
+    if len(tokens) == 1:
+        return get_normal_forms(tokens[0])
+    return [normalize_text(phrase)]
+
+# Скомпилированный словарь синонимов. Ключи – последовательности лемм, поэтому
+# "стаканы" и "стакан" находят одну запись, а многословные ключи
+# ("контейнер для супа") распознаются в тексте целиком.
+class SynonymTable:
+    def __init__(self, raw):
+        source = json.dumps(raw, ensure_ascii=False, sort_keys=True)
+        self.digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+        self.entries = {}  # кортеж лемм ключа -> (каноническая фраза, все формы синонимов)
+        self.words = set()  # нормальные формы всех слов ключей и синонимов
+        self.max_length = 1
+        for key, synonyms in raw.items():
+            lemma_key = tuple(first_normal_form(token) for token in tokenize(key))
+            if not lemma_key or not synonyms:
+                continue
+            expansions = set()
+            for syn in synonyms:
+                expansions.add(syn)
+                expansions.update(phrase_normal_forms(syn))
+            for token in tokenize(" ".join([key, *synonyms])):
+                self.words.update(get_normal_forms(token))
+            self.entries[lemma_key] = (synonyms[0], frozenset(expansions))
+            self.max_length = max(self.max_length, len(lemma_key))
+
+    def lookup(self, token):
+        """Запись для отдельного слова (по любой из его нормальных форм)."""
+        entry = self.entries.get((first_normal_form(token),))
+        if entry is None:
+            entry = self.entries.get((token,))
+        return entry
+
+    def knows(self, token):
+        """Слово встречается в словаре (в ключе или среди синонимов) в какой-либо форме."""
+        return token in self.words or any(form in self.words for form in get_normal_forms(token))
+
+    def spans(self, tokens):
+        """Жадный поиск самых длинных ключей в последовательности токенов: (начало, конец, запись)."""
+        lemmas = [first_normal_form(token) for token in tokens]
+        pos = 0
+        while pos < len(tokens):
+            for length in range(min(self.max_length, len(tokens) - pos), 0, -1):
+                if length == 1:
+                    entry = self.lookup(tokens[pos])
+                else:
+                    entry = self.entries.get(tuple(lemmas[pos:pos + length]))
+                if entry is not None:
+                    yield pos, pos + length, entry
+                    pos += length
+                    break
+            else:
+                pos += 1
+
+_synonyms = None
+_synonyms_mtime = None
+_synonyms_checked = 0.0
+_synonyms_lock = threading.Lock()
+
+def _load_synonyms(path):
+    with open(path, encoding="utf-8") as f:
+        return SynonymTable(json.load(f))
+
+# Текущий словарь синонимов. Файл проверяется не чаще раза в SYNONYMS_RELOAD_INTERVAL секунд
+# и при изменении перекомпилируется; результаты поиска со старым словарём сбрасываются.
+def get_synonyms():
+    global _synonyms, _synonyms_mtime, _synonyms_checked
+    now = time.monotonic()
+    if _synonyms is not None and now - _synonyms_checked < config.SYNONYMS_RELOAD_INTERVAL:
+        return _synonyms
+    with _synonyms_lock:
+        _synonyms_checked = now
+        try:
+            mtime = os.path.getmtime(config.SYNONYMS_PATH)
+            if mtime != _synonyms_mtime:
+                table = _load_synonyms(config.SYNONYMS_PATH)
+                reloaded = _synonyms is not None
+                _synonyms, _synonyms_mtime = table, mtime
+                if reloaded:
+                    bump_generation()
+                    logger.info("Словарь синонимов перезагружен: %d записей", len(table.entries))
+        except (OSError, ValueError) as e:
+            logger.error("Не удалось загрузить словарь синонимов %s: %s", config.SYNONYMS_PATH, e)
+            if _synonyms is None:
+                _synonyms = SynonymTable({})
+    return _synonyms
+
+# Расширение набора токенов синонимами (с учётом многословных ключей)
+def expand_synonyms(tokens):
+    expanded = set(tokens)
+    for _, _, (_, synonyms) in get_synonyms().spans(list(tokens)):
+        expanded.update(synonyms)
+    return list(expanded)
+
+# Преобразование строки в каноническую форму: замена ключей словаря синонимов
 def canonicalize_text(text):
     tokens = tokenize(text)
     canonical_tokens = []
-    for token in tokens:
-        if token in SYNONYMS:
-            canonical_tokens.append(SYNONYMS[token][0])
-        else:
-            canonical_tokens.append(token)
+    pos = 0
+    for start, end, (canonical, _) in get_synonyms().spans(tokens):
+        canonical_tokens.extend(tokens[pos:start])
+        canonical_tokens.append(canonical)
+        pos = end
+    canonical_tokens.extend(tokens[pos:])
     return " ".join(canonical_tokens)
 
+# Каноническая нормальная форма строки (запроса или названия товара)
+def normalize_name(text):
+    return normalize_text(canonicalize_text(text))
+
 # Функция вычисления схожести между запросом и названием товара
 def compute_similarity(query, product_name):
     # Приводим запрос и название к каноническому и нормальному виду
-    canon_query  = canonicalize_text(query)
-    canon_product = canonicalize_text(product_name)
-    norm_query   = normalize_text(canon_query)
-    norm_product = normalize_text(canon_product)
-    
+    return score_normalized(normalize_name(query), normalize_name(product_name))
+
+# Схожесть уже нормализованных запроса и названия (только сравнения RapidFuzz)
+def score_normalized(norm_query, norm_product, query_tokens=None):
     # Базовый показатель схожести с помощью RapidFuzz
     base_similarity = fuzz.token_set_ratio(norm_query, norm_product)
     
@@ -109,7 +222,8 @@ def compute_similarity(query, product_name):
         base_similarity += 20
 
     # Токенизация нормализованных строк
-    query_tokens = tokenize(norm_query)
+    if query_tokens is None:
+        query_tokens = tokenize(norm_query)
     product_tokens = tokenize(norm_product)
     
     # Учитываем порядок токенов в названии
@@ -121,10 +235,8 @@ def compute_similarity(query, product_name):
         if "стакан" in product_tokens:
             base_similarity += 20
 
-    # Список стоп-слов
-    stop_words = {"для", "и", "на", "в", "с", "по", "без", "от"}
     # Формируем список обязательных токенов из запроса
-    required_tokens = [t for t in query_tokens if t not in stop_words]
+    required_tokens = [t for t in query_tokens if t not in STOP_WORDS]
     
     # Вычисляем коэффициенты по обязательным токенам с учетом сокращенных форм
     if required_tokens:
@@ -151,84 +263,719 @@ def compute_similarity(query, product_name):
     final_score = base_similarity * multiplier
     return final_score
 
-# Функция генерации условий поиска для SQLAlchemy
-def smart_search_query(query):
+# Токены нормальных форм товаров для пакетной оценки: общий словарь и
+# плоский массив номеров токенов. Одна таблица может обслуживать несколько
+# запросов по разным подмножествам товаров (см. search_products_batch).
+class TokenTable:
+    def __init__(self, norm_products):
+        self.norm_products = norm_products
+        self.product_tokens = [tokenize(p) for p in norm_products]
+        self.vocabulary = {}
+        flat = []
+        self.lengths = np.zeros(len(norm_products), dtype=np.int64)
+        for i, tokens in enumerate(self.product_tokens):
+            self.lengths[i] = len(tokens)
+            for token in tokens:
+                flat.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+        self.flat = np.array(flat, dtype=np.int64)
+        self.starts = np.cumsum(self.lengths) - self.lengths
+        self.words = list(self.vocabulary)
+        self.word_array = np.array(self.words)
+        self.long_words = np.array([len(w) > 3 for w in self.words], dtype=bool)
+
+    def __len__(self):
+        return len(self.norm_products)
+
+    def token_matrix(self, required_tokens, word_ids):
+        """Схожесть токенов запроса со словами word_ids с учётом сокращённых форм."""
+        words = [self.words[i] for i in word_ids]
+        word_array = self.word_array[word_ids]
+        long_words = self.long_words[word_ids]
+        matrix = process.cdist(required_tokens, words, scorer=fuzz.ratio, dtype=np.float64, workers=-1)
+        for row, rt in enumerate(required_tokens):
+            if len(rt) > 3:
+                prefix = long_words & (np.char.startswith(word_array, rt) |
+                                       np.char.startswith(np.full(len(words), rt), word_array))
+                matrix[row, prefix] = 100
+        return matrix
+
+    def score(self, norm_query, query_tokens=None, columns=None):
+        """Оценки score_normalized для товаров columns (по умолчанию – для всех)."""
+        if columns is None:
+            norm_products, product_tokens = self.norm_products, self.product_tokens
+            lengths, flat = self.lengths, self.flat
+        else:
+            columns = np.asarray(columns, dtype=np.int64)
+            norm_products = [self.norm_products[i] for i in columns]
+            product_tokens = [self.product_tokens[i] for i in columns]
+            lengths = self.lengths[columns]
+            # Номера токенов только выбранных товаров, подряд
+            flat = self.flat[np.repeat(self.starts[columns] - np.cumsum(lengths) + lengths, lengths)
+                             + np.arange(lengths.sum())]
+        count = len(norm_products)
+        if not count:
+            return np.zeros(0)
+        if query_tokens is None:
+            query_tokens = tokenize(norm_query)
+
+        # Базовый показатель схожести для всей матрицы кандидатов
+        scores = process.cdist([norm_query], norm_products, scorer=fuzz.token_set_ratio,
+                               dtype=np.float64, workers=-1)[0]
+
+        exact = np.array([p == norm_query for p in norm_products])
+        contains = np.array([norm_query in p or p in norm_query for p in norm_products])
+        starts = np.array([p.startswith(norm_query + " ") for p in norm_products]) | exact
+        scores += np.where(exact, 50, 0)
+        scores += np.where(contains, 10, 0)
+        scores += np.where(starts, 20, 0)
+
+        if query_tokens:
+            first = np.array([bool(tokens) and tokens[0] == query_tokens[0] for tokens in product_tokens])
+            scores += np.where(first, 15, 0)
+        if "стакан" in query_tokens and "стакан" in self.vocabulary:
+            glass = np.array(["стакан" in tokens for tokens in product_tokens])
+            scores += np.where(glass, 20, 0)
+
+        required_tokens = [t for t in query_tokens if t not in STOP_WORDS]
+        if not required_tokens:
+            return scores * 1.0
+        if not len(flat):
+            return scores * 0.0
+
+        # Матрица "обязательный токен запроса x слово товаров", затем лучшее
+        # совпадение по токенам каждого товара и минимум по токенам запроса
+        word_ids, local = np.unique(flat, return_inverse=True)
+        matrix = self.token_matrix(required_tokens, word_ids)
+        has_tokens = lengths > 0
+        offsets = (np.cumsum(lengths) - lengths)[has_tokens]
+        best = np.zeros((len(required_tokens), count))
+        best[:, has_tokens] = np.maximum.reduceat(matrix[:, local], offsets, axis=1)
+        multiplier = (best / 100.0).min(axis=0)
+        return scores * multiplier
+
+# Пакетный вариант score_normalized: оценки для всех кандидатов сразу.
+# Бонусы прибавляются в том же порядке, что и в score_normalized, поэтому
+# результат совпадает с поштучным расчётом до последнего бита.
+def score_batch(norm_query, norm_products, query_tokens=None):
+    if not len(norm_products):
+        return np.zeros(0)
+    return TokenTable(norm_products).score(norm_query, query_tokens)
+
+# Расширение запроса: исходные токены, леммы, стеммы и синонимы
+def smart_search_terms(query):
     tokens = tokenize(query)
     if not tokens:
-        return []
+        return set()
     lemmas = lemmatize_tokens(tokens)
     stems  = stem_tokens(tokens)
     synonyms_original = expand_synonyms(tokens)
     synonyms_lemmas   = expand_synonyms(lemmas)
     synonyms_stems    = expand_synonyms(stems)
-    combined_tokens = set(tokens + lemmas + stems + synonyms_original + synonyms_lemmas + synonyms_stems)
+    return set(tokens + lemmas + stems + synonyms_original + synonyms_lemmas + synonyms_stems)
+
+# Функция генерации условий поиска для SQLAlchemy
+def smart_search_query(query):
     conditions = []
-    for token in combined_tokens:
+    for token in smart_search_terms(query):
         conditions.append(Product.name.ilike(f"%{token}%"))
         conditions.append(Product.search_query.ilike(f"%{token}%"))
     return conditions
 
-# Функция выполнения поиска
-def search_products_improved(query, available_only=False, similarity_threshold=60):
+# Термины индекса для текста: токены, их леммы и стеммы
+def product_index_terms(text):
+    tokens = tokenize(text)
+    return set(tokens) | set(lemmatize_tokens(tokens)) | set(stem_tokens(tokens))
+
+# Отпечаток исходных данных, по которым считались поля для поиска
+def _signature(name, search_query=None):
+    source = f"{NORMALIZER_VERSION}|{get_synonyms().digest}|{name}|{search_query or ''}"
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+# Поля для поиска, вычисляемые один раз при загрузке товара
+def build_search_fields(name, search_query=None):
+    terms = product_index_terms(name)
+    if search_query and search_query != name.lower():
+        terms |= product_index_terms(search_query)
+    return {
+        "signature": _signature(name, search_query),
+        "norm_name": normalize_name(name),
+        "index_terms": " ".join(sorted(terms)),
+    }
+
+# Обновление предвычисленных данных товара (вызывается при добавлении/изменении записи)
+def update_search_data(product):
+    data = db.session.get(ProductSearchData, product.id)
+    if data is not None and data.signature == _signature(product.name, product.search_query):
+        return data
+    fields = build_search_fields(product.name, product.search_query)
+    if data is None:
+        data = ProductSearchData(product_id=product.id)
+        db.session.add(data)
+    data.signature = fields["signature"]
+    data.norm_name = fields["norm_name"]
+    data.index_terms = fields["index_terms"]
+    # Числовые атрибуты и материал для фильтров поиска
+    attributes = db.session.get(ProductAttributes, product.id)
+    if attributes is None:
+        attributes = ProductAttributes(product_id=product.id)
+        db.session.add(attributes)
+    values = extract_attributes(product.name)
+    for column in NUMERIC_ATTRIBUTES + ("material",):
+        setattr(attributes, column, values.get(column))
+    return data
+
+# Заполнение отсутствующих и устаревших данных для всех товаров
+def ensure_search_data():
+    stored = dict(db.session.query(ProductSearchData.product_id, ProductSearchData.signature).all())
+    updated = 0
+    for product in Product.query.all():
+        if stored.get(product.id) != _signature(product.name, product.search_query):
+            update_search_data(product)
+            updated += 1
+    if updated:
+        db.session.commit()
+    return updated
+
+# Полная пересборка инвертированного индекса по предвычисленным терминам
+def rebuild_search_index():
+    index = SearchIndex()
+    rows = (db.session.query(Product.id, Product.name, Product.search_query,
+                             ProductSearchData.index_terms, ProductSearchData.norm_name)
+            .outerjoin(ProductSearchData, ProductSearchData.product_id == Product.id)
+            .all())
+    for product_id, name, search_query, index_terms, norm_name in rows:
+        if index_terms is None:
+            fields = build_search_fields(name, search_query)
+            index_terms, norm_name = fields["index_terms"], fields["norm_name"]
+        index.add(product_id, index_terms.split(), tokenize(name) + tokenize(norm_name))
+    set_search_index(index.finalize())
+    return index
+
+# Статистика кэшей лемм и стемов
+def lemma_cache_stats():
+    stats = {}
+    for name, cached in (("lemmas", _cached_parse), ("stems", stem_word)):
+        info = cached.cache_info()
+        stats[name] = {"hits": info.hits, "misses": info.misses,
+                       "size": info.currsize, "maxsize": info.maxsize}
+    return stats
+
+# Сохранение словаря всех различных токенов из названий товаров
+def save_vocabulary(path=None):
+    path = path or config.SEARCH_VOCABULARY_PATH
+    vocabulary = set()
+    for (name,) in Product.query.with_entities(Product.name).all():
+        vocabulary.update(tokenize(name))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(sorted(vocabulary)))
+    os.replace(tmp_path, path)
+    return len(vocabulary)
+
+# Прогрев кэшей лемм и стемов по сохранённому словарю
+def warm_lemma_cache(path=None):
+    path = path or config.SEARCH_VOCABULARY_PATH
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as f:
+        words = [line.strip() for line in f if line.strip()]
+    words = words[:config.LEMMA_CACHE_SIZE]
+    for word in words:
+        morph.parse(word)
+        stem_word(word)
+    return len(words)
+
+# Обновление всех поисковых структур после изменения каталога
+def refresh_search_structures():
+    index = rebuild_search_index()
+    set_catalog_snapshot(build_catalog_snapshot())
+    # Новое поколение каталога делает недействительными сохранённые результаты поиска
+    bump_generation()
+    try:
+        save_vocabulary()
+    except OSError as e:
+        logger.error("Не удалось сохранить словарь для прогрева кэша: %s", e)
+    return index
+
+# Текущий снимок цен и наличия (строится при первом обращении)
+def current_snapshot():
+    snapshot = get_catalog_snapshot()
+    if snapshot is None:
+        snapshot = build_catalog_snapshot()
+        set_catalog_snapshot(snapshot)
+    return snapshot
+
+# Группы слов для поиска по индексу: фраза-синоним даёт группу из нескольких слов.
+# Стоп-слова не участвуют в отборе, если в запросе есть что-то кроме них.
+def index_term_groups(query):
+    groups = []
+    for term in smart_search_terms(query):
+        words = tokenize(term)
+        significant = tuple(w for w in words if w not in STOP_WORDS)
+        groups.append(significant or tuple(words))
+    if any(not set(words) <= STOP_WORDS for words in groups):
+        groups = [words for words in groups if not set(words) <= STOP_WORDS]
+    return groups
+
+# Текущий индекс (строится при первом обращении)
+def current_index():
+    index = get_search_index()
+    if index is None:
+        index = rebuild_search_index()
+    return index
+
+# id товаров-кандидатов по инвертированному индексу
+def index_candidate_ids(query, memo=None):
+    return current_index().candidates(index_term_groups(query), memo)
+
+# Ближайшее по написанию слово из названий товаров (по индексу триграмм)
+def closest_catalog_word(token):
+    index = current_index()
+    best_word, best_score = None, config.TYPO_MIN_RATIO
+    for word in index.similar_words(token, config.TYPO_MAX_CANDIDATES):
+        score = fuzz.ratio(token, word)
+        if score > best_score or (score == best_score and best_word is not None
+                                  and len(index.postings.get(word, ())) > len(index.postings.get(best_word, ()))):
+            best_word, best_score = word, score
+    return best_word
+
+# Исправление опечаток: слово запроса, которого нет ни в каталоге, ни в словаре
+# синонимов ни в какой форме, заменяется ближайшим словом из названий товаров.
+# Возвращает исправленный запрос или None, если исправлять нечего. Исходный запрос
+# остаётся основным: исправление только добавляет кандидатов и вариант для оценки.
+def correct_query(query):
+    index = current_index()
+    synonyms = get_synonyms()
+    tokens = tokenize(query)
+    corrected = []
+    changed = False
+    for token in tokens:
+        known = (token in index.postings or len(token) < config.TYPO_MIN_LENGTH
+                 or any(ch.isdigit() for ch in token)
+                 or any(form in index.postings for form in get_normal_forms(token))
+                 or synonyms.knows(token))
+        replacement = None if known else closest_catalog_word(token)
+        if replacement:
+            corrected.append(replacement)
+            changed = True
+        else:
+            corrected.append(token)
+    return " ".join(corrected) if changed else None
+
+# id товаров-кандидатов через исходную цепочку ILIKE (полный проход таблицы)
+def like_candidate_ids(query):
     conditions = smart_search_query(query)
     if not conditions:
+        return set()
+    return {row[0] for row in Product.query.with_entities(Product.id).filter(or_(*conditions)).all()}
+
+# Отбор кандидатов движком, выбранным в config.SEARCH_ENGINE
+# memo – общие для нескольких запросов результаты поиска слов в индексе
+def candidate_ids(query, memo=None):
+    engine = config.SEARCH_ENGINE
+    if engine == "fts" and fts_available():
+        return fts_candidate_ids(index_term_groups(query), config.FTS_CANDIDATE_LIMIT)
+    if engine == "like":
+        return like_candidate_ids(query)
+    return index_candidate_ids(query, memo)
+
+# Условия SQL по фильтрам атрибутов (см. product_attributes.normalize_filters)
+def attribute_conditions(filters):
+    conditions = []
+    for key, value in filters.items():
+        if key in NUMERIC_ATTRIBUTES:
+            column = getattr(ProductAttributes, key)
+            if isinstance(value, dict):
+                if "min" in value:
+                    conditions.append(column >= value["min"])
+                if "max" in value:
+                    conditions.append(column <= value["max"])
+            else:
+                conditions.append(column == value)
+        elif key == "material":
+            conditions.append(ProductAttributes.material == value)
+        elif key == "dimensions":
+            a, b = value[0], value[1]
+            if len(value) == 3:
+                conditions.append(and_(ProductAttributes.dim_a == a, ProductAttributes.dim_b == b,
+                                       ProductAttributes.dim_c == value[2]))
+            else:
+                # Стороны "30х40" и "40х30" считаем одним размером
+                conditions.append(or_(and_(ProductAttributes.dim_a == a, ProductAttributes.dim_b == b),
+                                      and_(ProductAttributes.dim_a == b, ProductAttributes.dim_b == a)))
+    return conditions
+
+# id товаров, подходящих под фильтры атрибутов (по индексам product_attributes)
+def attribute_filter_ids(filters):
+    query = db.session.query(ProductAttributes.product_id).filter(*attribute_conditions(filters))
+    return {row[0] for row in query.all()}
+
+# Поля товара, которые нужны поиску и ответу API
+SEARCH_COLUMNS = (Product.id, Product.name, Product.search_query, Product.price, Product.price_display,
+                  Product.site, Product.link, Product.img_url, Product.quantity, Product.step,
+                  Product.availability)
+
+# Найденный товар: только поля ответа API, без ORM-объекта.
+# Записи из кэша результатов общие для всех запросов и не изменяются.
+class SearchResult:
+    __slots__ = ("id", "name", "price", "price_display", "site", "link", "img_url",
+                 "quantity", "step", "availability", "similarity", "unit_price")
+
+    def __init__(self, row, similarity, unit_price):
+        # Распаковка по позициям SEARCH_COLUMNS заметно быстрее обращения к полям Row по имени
+        (self.id, self.name, _, self.price, self.price_display, self.site, self.link,
+         self.img_url, self.quantity, self.step, self.availability) = row[:len(SEARCH_COLUMNS)]
+        self.similarity = similarity
+        self.unit_price = unit_price
+
+    def to_dict(self, with_site=True):
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "price": self.price,
+            "price_display": self.price_display,
+            "link": self.link,
+            "img_url": self.img_url,
+            "quantity": self.quantity,
+            "step": self.step,
+            "availability": self.availability,
+            "similarity": self.similarity,
+            "unit_price": self.unit_price,
+        }
+        if with_site:
+            data["site"] = self.site
+        return data
+
+# Загрузка строк товаров по id пачками, в порядке id (как при полном проходе таблицы).
+# Выбираются только SEARCH_COLUMNS, предвычисленная нормальная форма названия и её отпечаток,
+# поэтому ORM-объекты и карта идентичности сессии не создаются.
+def load_products(product_ids):
+    ids = sorted(product_ids)
+    rows = []
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        chunk = ids[start:start + ID_CHUNK_SIZE]
+        rows.extend(db.session.query(*SEARCH_COLUMNS, ProductSearchData.norm_name, ProductSearchData.signature)
+                    .outerjoin(ProductSearchData, ProductSearchData.product_id == Product.id)
+                    .filter(Product.id.in_(chunk))
+                    .order_by(Product.id)
+                    .all())
+    return rows
+
+# Проверка наличия и цены по самому товару – для товаров, которых ещё нет в снимке каталога
+def product_matches(product, available_only=False, min_price=None, max_price=None, store=None):
+    if store is not None and product.site != store:
+        return False
+    if available_only and IN_STOCK_MARKER not in (product.availability or "").lower():
+        return False
+    price = product.price or 0.0
+    if min_price is not None and price < min_price:
+        return False
+    if max_price is not None and price > max_price:
+        return False
+    return True
+
+# Отобранные и загруженные из БД кандидаты запроса.
+# Уточняющий запрос той же сессии пересчитывает оценки только по ним,
+# не обращаясь ни к индексу, ни к БД.
+class CandidateSet:
+    def __init__(self, query, rows, conditions, generation, boosted=frozenset()):
+        self.query = query
+        self.rows = rows              # (строка товара, нормальная форма названия) в порядке id
+        self.conditions = conditions  # наличие, цены, магазин и фильтры, с которыми отобраны кандидаты
+        self.generation = generation
+        self.boosted = boosted        # id товаров с атрибутами, совпавшими с атрибутами из текста запроса
+
+    def ids(self):
+        return {product.id for product, _ in self.rows}
+
+    def covers(self, conditions):
+        """Можно ли отбирать из этих кандидатов при новых условиях (фильтры атрибутов – только строже)."""
+        for name in ("available_only", "min_price", "max_price", "store"):
+            if conditions[name] != self.conditions[name]:
+                return False
+        filters = conditions["filters"]
+        return all(filters.get(key) == value for key, value in self.conditions["filters"].items())
+
+# Является ли new_query уточнением base_query: все слова прежнего запроса остались,
+# добавились только числа и единицы ("стакан" -> "стакан 400 мл"). Кандидаты такого
+# запроса – подмножество прежних; укороченный запрос или новое слово о самом товаре
+# ищутся полностью.
+def is_refinement(new_query, base_query):
+    new_tokens = Counter(new_query.lower().split())
+    base_tokens = Counter(base_query.lower().split())
+    added = new_tokens - base_tokens
+    if not added or base_tokens - new_tokens:
+        return False
+    return all(is_attribute_token(token) for token in added)
+
+# id кандидатов запроса после фильтров атрибутов и проверки по снимку каталога.
+# Второе значение – id, которых нет в снимке: их проверяет load_candidate_rows.
+# corrected – запрос с исправленными опечатками: его кандидаты добавляются к кандидатам исходного.
+def select_candidate_ids(query, available_only=False, filters=None, min_price=None, max_price=None,
+                         store=None, base=None, memo=None, corrected=None):
+    if base is not None:
+        ids = base.ids()
+    else:
+        ids = candidate_ids(query if corrected is None else f"{query} {corrected}", memo)
+    if filters and ids:
+        # Фильтры по атрибутам сужают кандидатов до оценки
+        ids &= attribute_filter_ids(filters)
+    # Наличие, диапазон цен и магазин проверяются по снимку каталога до загрузки строк из БД
+    unchecked = set()
+    if base is None and ids and (available_only or min_price is not None or max_price is not None
+                                 or store is not None):
+        ids, unchecked = current_snapshot().filter_ids(ids, available_only=available_only, min_price=min_price,
+                                                       max_price=max_price, store=store)
+        ids |= unchecked
+    return ids, unchecked
+
+# Строки кандидатов с нормальными формами названий, в порядке id
+def load_candidate_rows(ids, unchecked=(), available_only=False, min_price=None, max_price=None, store=None):
+    # Если форма не посчитана или устарела (например, после правки словаря синонимов),
+    # она вычисляется на лету до следующего пересчёта в ensure_search_data
+    return [(row, row.norm_name if row.signature == _signature(row.name, row.search_query)
+             else normalize_name(row.name))
+            for row in (load_products(ids) if ids else [])
+            if row.id not in unchecked or product_matches(row, available_only, min_price, max_price, store)]
+
+# Отбор кандидатов и загрузка их строк.
+# base – кандидаты предыдущего запроса, уточнением которого является query.
+def search_candidates(query, available_only=False, filters=None, min_price=None, max_price=None,
+                      store=None, base=None, soft_filters=None, corrected=None):
+    stats = {"candidates": 0, "candidates_ms": 0.0, "db_ms": 0.0, "scoring_ms": 0.0, "refined": base is not None}
+    _search_stats.last = stats
+    started = time.perf_counter()
+    ids, unchecked = select_candidate_ids(query, available_only, filters, min_price, max_price, store, base,
+                                          corrected=corrected)
+    stats["candidates"] = len(ids)
+    stats["candidates_ms"] = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    if base is not None:
+        rows = [row for row in base.rows if row[0].id in ids]
+    else:
+        rows = load_candidate_rows(ids, unchecked, available_only, min_price, max_price, store)
+    stats["db_ms"] = (time.perf_counter() - started) * 1000
+    return CandidateSet(query, rows, search_conditions(available_only, filters, min_price, max_price, store),
+                        current_generation(), attribute_boost_ids(ids, soft_filters))
+
+# Кандидаты, у которых совпал атрибут из текста запроса ("стакан 400 мл"): их оценка ещё до
+# порога выше на config.ATTRIBUTE_MATCH_BOOST, но остальные не отбрасываются – объём в названии
+# мог не распознаться, а похожие товары другого объёма тоже нужны
+def attribute_boost_ids(ids, soft_filters):
+    if not soft_filters or not ids:
+        return frozenset()
+    return frozenset(ids & attribute_filter_ids(soft_filters))
+
+# Условия отбора кандидатов (см. CandidateSet.covers)
+def search_conditions(available_only=False, filters=None, min_price=None, max_price=None, store=None):
+    return {"available_only": bool(available_only), "min_price": min_price, "max_price": max_price,
+            "store": store, "filters": dict(filters or {})}
+
+# Оценка кандидатов по запросу; возвращает SearchResult для товаров со схожестью не ниже порога.
+# table и columns – общая таблица токенов нескольких запросов и позиции в ней строк candidates.
+# Для запроса с исправленными опечатками (corrected) товару засчитывается лучшая из двух оценок.
+def score_candidates(query, candidates, similarity_threshold=60, table=None, columns=None, corrected=None):
+    stats = getattr(_search_stats, "last", {})
+    if not candidates.rows:
         return []
-    combined_condition = or_(*conditions)
-    results = Product.query.filter(combined_condition).all()
-    for product in results:
-        product.similarity = compute_similarity(query, product.name)
-    sorted_results = sorted(results, key=lambda p: p.similarity, reverse=True)
-    filtered_results = [p for p in sorted_results if p.similarity >= similarity_threshold]
-    if available_only:
-        filtered_results = [p for p in filtered_results if "в наличии" in (p.availability or "").lower()]
+    started = time.perf_counter()
+    # Запрос нормализуется один раз, для товаров используются предвычисленные формы
+    norm_query = normalize_name(query)
+    if table is None:
+        table = TokenTable([norm_name for _, norm_name in candidates.rows])
+    scores = table.score(norm_query, tokenize(norm_query), columns)
+    if corrected is not None:
+        norm_corrected = normalize_name(corrected)
+        scores = np.maximum(scores, table.score(norm_corrected, tokenize(norm_corrected), columns))
+    # Совпадение атрибутов прибавляется до порога: товар нужного объёма, название
+    # которого записано иначе, чем запрос, не должен отсеиваться, пока проходят чужие объёмы
+    if candidates.boosted:
+        boosted = np.array([row.id in candidates.boosted for row, _ in candidates.rows])
+        scores = scores + np.where(boosted, config.ATTRIBUTE_MATCH_BOOST, 0)
+    # Полная сортировка не нужна: нужную страницу выбирает select_top
+    passed = [(row, score) for (row, _), score in zip(candidates.rows, scores.tolist())
+              if score >= similarity_threshold]
+    snapshot = current_snapshot()
+    positions, found = snapshot.locate([row.id for row, _ in passed])
+    unit_prices = np.where(found, snapshot.unit_prices[positions], np.nan).tolist()
+    filtered_results = [SearchResult(row, score, row.price if unit_price != unit_price else unit_price)
+                        for (row, score), unit_price in zip(passed, unit_prices)]
+    stats["scoring_ms"] = (time.perf_counter() - started) * 1000
     return filtered_results
 
-# Функция группировки найденных товаров по поставщику
-def group_results(products):
+# Функция выполнения поиска
+def search_products_improved(query, available_only=False, similarity_threshold=60, filters=None,
+                             min_price=None, max_price=None, store=None):
+    candidates = search_candidates(query, available_only, filters, min_price, max_price, store)
+    return score_candidates(query, candidates, similarity_threshold)
+
+# Замеры последнего поиска в текущем потоке (для search_bench.py)
+_search_stats = threading.local()
+
+def last_search_stats():
+    return dict(getattr(_search_stats, "last", {}))
+
+# Варианты сортировки выдачи (значения параметра sort в /api/search):
+# поле и направление; по умолчанию – по схожести
+SORT_OPTIONS = {
+    "default": ("similarity", True),
+    "priceAsc": ("price", False),
+    "priceDesc": ("price", True),
+    "unitPriceAsc": ("unit_price", False),
+}
+
+# Элементы страницы [offset, offset + limit) в порядке сортировки sort.
+# heapq.nlargest/nsmallest устойчивы так же, как sorted, но не сортируют весь список.
+# getter достаёт поле из элемента: getattr для SearchResult, dict.get для словарей.
+# Товары без цены (0.0 – цену не удалось разобрать) при сортировке по цене идут
+# в конце в обоих направлениях, как в product_matching._offer_sort_key.
+def select_top(items, limit=None, offset=0, sort=None, getter=getattr):
+    field, descending = SORT_OPTIONS[sort or "default"]
+    if field == "similarity":
+        key = lambda item: getter(item, field)
+    else:
+        def key(item):
+            price = getter(item, field) or 0.0
+            return ((price > 0) if descending else (price <= 0), price)
+    if limit is None:
+        return sorted(items, key=key, reverse=descending)[offset:]
+    select = heapq.nlargest if descending else heapq.nsmallest
+    return select(offset + limit, items, key=key)[offset:]
+
+# Функция группировки найденных товаров по поставщику.
+# Для каждого магазина возвращается общее число товаров и запрошенная страница.
+def group_results(items, limit=None, offset=0, store=None, sort=None):
+    by_store = {}
+    for item in items:
+        site = item.site if item.site else "неизвестный поставщик"
+        if store is None or site == store:
+            by_store.setdefault(site, []).append(item)
     groups = {}
-    for product in products:
-        store = product.site if product.site else "неизвестный поставщик"
-        if store not in groups:
-            groups[store] = {"count": 0, "products": []}
-        groups[store]["products"].append({
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "price_display": product.price_display,
-            "link": product.link,
-            "img_url": product.img_url,
-            "quantity": product.quantity,
-            "step": product.step,
-            "availability": product.availability,
-            "similarity": product.similarity
-        })
-        groups[store]["count"] += 1
-    for group in groups.values():
-        group["products"].sort(key=lambda item: item["similarity"], reverse=True)
+    for site, store_items in by_store.items():
+        page = select_top(store_items, limit, offset, sort)
+        groups[site] = {
+            "count": len(store_items),
+            "total": len(store_items),
+            "offset": offset,
+            "limit": limit,
+            "products": [item.to_dict(with_site=False) for item in page]
+        }
     return groups
 
-# Основная функция поиска
-def search_products(query, available_only=False, similarity_threshold=60, group=True):
-    filtered_results = search_products_improved(query, available_only, similarity_threshold)
+# Ключ кэша результатов: каноническая нормальная форма запроса (по ней идёт оценка)
+# и отсортированный набор лемм (по нему отбираются кандидаты), так что
+# "Ложка" и "Ложки" попадают в одну запись
+def result_cache_key(query, available_only, similarity_threshold, filters=None,
+                     min_price=None, max_price=None, store=None):
+    tokens = tokenize(query)
+    return (normalize_name(query), tuple(sorted(lemmatize_tokens(tokens))),
+            bool(available_only), float(similarity_threshold),
+            json.dumps(filters or {}, sort_keys=True), min_price, max_price, store)
+
+_result_cache = SearchResultCache(maxsize=config.SEARCH_RESULT_CACHE_SIZE)
+# Кандидаты последнего запроса каждой сессии поиска
+_session_candidates = SearchResultCache(maxsize=config.REFINEMENT_SESSIONS, ttl=config.REFINEMENT_TTL)
+
+# Статистика кэша результатов поиска
+def result_cache_stats():
+    return _result_cache.stats()
+
+def clear_result_cache():
+    _result_cache.clear()
+
+# Основная функция поиска.
+# limit/offset задают страницу (для group=True – отдельно в каждом магазине),
+# store ограничивает ответ одним магазином, filters – фильтры по атрибутам товара,
+# min_price/max_price – диапазон цен, sort – один из SORT_OPTIONS.
+# session_key – идентификатор сессии поиска: уточняющий запрос ("стакан" -> "стакан 400")
+# оценивается только по кандидатам предыдущего запроса этой сессии.
+def search_products(query, available_only=False, similarity_threshold=60, group=True,
+                    limit=None, offset=0, store=None, filters=None,
+                    min_price=None, max_price=None, sort=None, session_key=None):
+    # Для слов с опечаткой кандидаты ищутся и по исправленному написанию,
+    # в кэше запрос хранится в том виде, в каком его ввели
+    corrected = correct_query(query)
+    # Объём, диаметр, размеры и количество из запроса – мягкий фильтр,
+    # явные фильтры из API имеют приоритет
+    filters = dict(filters or {})
+    soft_filters = {key: value for key, value in query_attribute_filters(query).items() if key not in filters}
+    # Сгруппированная выдача кэшируется по всем магазинам, чтобы страницы отдельных
+    # магазинов брались из одной записи; плоская – сразу отбирается по магазину
+    search_store = None if group else store
+    key = result_cache_key(query, available_only, similarity_threshold, filters,
+                           min_price, max_price, search_store)
+    items = _result_cache.get(key)
+    if items is None:
+        base = _session_candidates.get(session_key) if session_key else None
+        if base is not None and not (is_refinement(query, base.query) and base.covers(
+                search_conditions(available_only, filters, min_price, max_price, search_store))):
+            base = None
+        candidates = search_candidates(query, available_only, filters, min_price, max_price, search_store, base,
+                                       soft_filters, corrected)
+        items = score_candidates(query, candidates, similarity_threshold, corrected=corrected)
+        if session_key:
+            _session_candidates.set(session_key, candidates)
+        # Выдача уточнения зависит от истории сессии, в общий кэш попадает только полный поиск
+        if base is None:
+            _result_cache.set(key, items)
     if group:
-        return group_results(filtered_results)
-    else:
-        results = []
-        for product in filtered_results:
-            results.append({
-                "id": product.id,
-                "name": product.name,
-                "price": product.price,
-                "price_display": product.price_display,
-                "link": product.link,
-                "img_url": product.img_url,
-                "quantity": product.quantity,
-                "step": product.step,
-                "availability": product.availability,
-                "similarity": product.similarity,
-                "site": product.site
-            })
-        return results
+        return group_results(items, limit, offset, store, sort)
+    return [item.to_dict() for item in select_top(items, limit, offset, sort)]
+
+# Пакетный поиск по списку запросов (например, списку закупок).
+# Запросы исправляются и нормализуются вместе, слова ищутся в индексе один раз
+# на весь список, строки всех кандидатов загружаются из БД одним проходом и
+# оцениваются по общей таблице токенов. Результат каждого запроса совпадает
+# с search_products и попадает в общий кэш результатов.
+# Возвращает {запрос: результаты по магазинам}, страница – первые limit товаров магазина.
+def search_products_batch(queries, available_only=False, similarity_threshold=60, limit=None,
+                          filters=None, min_price=None, max_price=None, sort=None):
+    stats = {"queries": 0, "cached": 0, "candidates": 0, "candidates_ms": 0.0, "db_ms": 0.0, "scoring_ms": 0.0}
+    _search_stats.last = stats
+    queries = list(dict.fromkeys(queries))
+    items_by_query = {}
+    pending = []
+    for query in queries:
+        corrected = correct_query(query)
+        soft_filters = {key: value for key, value in query_attribute_filters(query).items()
+                        if key not in (filters or {})}
+        key = result_cache_key(query, available_only, similarity_threshold, filters, min_price, max_price)
+        items = _result_cache.get(key)
+        if items is None:
+            pending.append((query, corrected, soft_filters, key))
+        else:
+            items_by_query[query] = items
+    stats["queries"] = len(queries)
+    stats["cached"] = len(queries) - len(pending)
+
+    started = time.perf_counter()
+    memo = {}
+    selected = [select_candidate_ids(query, available_only, filters, min_price, max_price, memo=memo,
+                                     corrected=corrected)
+                for query, corrected, _, _ in pending]
+    all_ids = set().union(*(ids for ids, _ in selected))
+    unchecked = set().union(*(query_unchecked for _, query_unchecked in selected))
+    stats["candidates"] = len(all_ids)
+    stats["candidates_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    rows = load_candidate_rows(all_ids, unchecked, available_only, min_price, max_price)
+    stats["db_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    position = {row.id: i for i, (row, _) in enumerate(rows)}
+    table = TokenTable([norm_name for _, norm_name in rows])
+    for (query, corrected, soft_filters, key), (ids, _) in zip(pending, selected):
+        # Строки общей выборки идут в порядке id, поэтому и позиции кандидатов запроса – тоже
+        columns = sorted(position[product_id] for product_id in ids if product_id in position)
+        candidates = CandidateSet(query, [rows[i] for i in columns],
+                                  search_conditions(available_only, filters, min_price, max_price),
+                                  current_generation(), attribute_boost_ids(ids, soft_filters))
+        items = score_candidates(query, candidates, similarity_threshold, table, columns, corrected)
+        _result_cache.set(key, items)
+        items_by_query[query] = items
+    stats["scoring_ms"] = (time.perf_counter() - started) * 1000
+    return {query: group_results(items_by_query[query], limit, 0, None, sort) for query in queries}
 
 # Если модуль запускается напрямую, выполняем тестовый запрос
 if __name__ == "__main__":
@@ -26,6 +26,18 @@ document.addEventListener('DOMContentLoaded', function () {
   let storePages = {}; // текущая страница для каждого магазина
   let updateIntervalId = null;
   const itemsPerPage = 5;
+  // Параметры последнего поиска – нужны для запроса следующих страниц с сервера
+  let currentQuery = "";
+  let currentAvailableOnly = false;
+
+  // Диапазон цен и сортировка применяются на сервере (параметры minPrice/maxPrice/sort)
+  function priceParams(minPrice, maxPrice, sortOption) {
+    return {
+      minPrice: minPrice > 0 ? minPrice : null,
+      maxPrice: isFinite(maxPrice) ? maxPrice : null,
+      sort: sortOption || "default"
+    };
+  }
 
   /* ----------- Scroll-to-top functionality ----------- */
   const scrollBtn = document.getElementById('scrollToTop');
@@ -80,11 +92,19 @@ document.addEventListener('DOMContentLoaded', function () {
       const response = await fetch("/api/search", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ query: query, availableOnly: availableOnly })
+        body: JSON.stringify({
+          query: query,
+          availableOnly: availableOnly,
+          limit: itemsPerPage,
+          offset: 0,
+          ...priceParams(minPrice, maxPrice, sortOption)
+        })
       });
       const data = await response.json();
       globalData = data;
       storePages = {}; // сброс страниц
+      currentQuery = query;
+      currentAvailableOnly = availableOnly;
       displayStoreProducts(minPrice, maxPrice, sortOption);
       
       // Сохранение параметров запроса и результатов в localStorage
@@ -140,25 +160,50 @@ document.addEventListener('DOMContentLoaded', function () {
     }
   }
 
+  /* ----------- Загрузка страницы результатов одного магазина с сервера ----------- */
+  async function fetchStorePage(store, page, minPrice, maxPrice, sortOption) {
+    try {
+      const response = await fetch("/api/search", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          query: currentQuery,
+          availableOnly: currentAvailableOnly,
+          store: store,
+          limit: itemsPerPage,
+          offset: page * itemsPerPage,
+          ...priceParams(minPrice, maxPrice, sortOption)
+        })
+      });
+      const data = await response.json();
+      if (data[store]) {
+        globalData[store] = data[store];
+        storePages[store] = page;
+        localStorage.setItem("lastSearchData", JSON.stringify(globalData));
+        displayStoreProducts(minPrice, maxPrice, sortOption);
+      }
+    } catch (error) {
+      console.error("Ошибка загрузки страницы:", error);
+      showToast("Ошибка загрузки страницы");
+    }
+  }
+
 function displayStoreProducts(minPrice, maxPrice, sortOption) {
   const resultsContainer = document.getElementById("results");
   resultsContainer.innerHTML = "";
   let storesFound = false;
   for (let store in globalData) {
     if (!globalData[store] || !globalData[store].products) continue;
-    let products = globalData[store].products.filter(item => item.price >= minPrice && item.price <= maxPrice);
-    if (sortOption === "priceAsc") {
-      products.sort((a, b) => a.price - b.price);
-    } else if (sortOption === "priceDesc") {
-      products.sort((a, b) => b.price - a.price);
-    }
+    // Страница уже отфильтрована по цене и отсортирована сервером
+    let products = globalData[store].products;
 
     const storeBlock = document.createElement("div");
     storeBlock.classList.add("store-block");
 
     const storeHeading = document.createElement("h2");
     storeHeading.classList.add("store-heading");
-    storeHeading.textContent = `${getStoreName(store)} (${globalData[store].count} товаров)`;
+    const storeTotal = globalData[store].total !== undefined ? globalData[store].total : globalData[store].count;
+    storeHeading.textContent = `${getStoreName(store)} (${storeTotal} товаров)`;
     storeBlock.appendChild(storeHeading);
 
     const productGrid = document.createElement("div");
@@ -176,19 +221,17 @@ function displayStoreProducts(minPrice, maxPrice, sortOption) {
         </div>`;
       productGrid.appendChild(spinner);
     } else {
+      // Сервер возвращает только текущую страницу магазина
       let currentPage = storePages.hasOwnProperty(store) ? storePages[store] : 0;
-      const startIndex = currentPage * itemsPerPage;
-      const endIndex = startIndex + itemsPerPage;
-      const pageProducts = products.slice(startIndex, endIndex);
-      pageProducts.forEach(product => {
+      products.forEach(product => {
         if (!product.name || !product.link) return;
         product.store = store;
         const card = createProductCard(product);
         productGrid.appendChild(card);
       });
 
-      // Если общее число товаров меньше 6 – не создаём кнопки
-      if (products.length >= 6) {
+      // Если все товары магазина помещаются на одну страницу – не создаём кнопки
+      if (storeTotal > itemsPerPage) {
         setTimeout(() => {
           const firstCard = productGrid.firstElementChild;
           const lastCard = productGrid.lastElementChild;
@@ -196,29 +239,27 @@ function displayStoreProducts(minPrice, maxPrice, sortOption) {
             const backButton = document.createElement("button");
             backButton.classList.add("pagination-btn", "pagination-prev");
             backButton.textContent = "Назад";
-            backButton.disabled = (storePages[store] || 0) === 0;
+            backButton.disabled = currentPage === 0;
             const backTop = firstCard.offsetTop + firstCard.offsetHeight / 2;
             backButton.style.position = "absolute";
             backButton.style.left = "-69px"; // смещаем кнопку дальше за пределы карточки
             backButton.style.top = backTop + "px";
             backButton.style.transform = "translateY(-50%)";
             backButton.addEventListener("click", () => {
-              storePages[store] = (storePages[store] || 0) - 1;
-              displayStoreProducts(minPrice, maxPrice, sortOption);
+              fetchStorePage(store, currentPage - 1, minPrice, maxPrice, sortOption);
             });
 
             const forwardButton = document.createElement("button");
             forwardButton.classList.add("pagination-btn", "pagination-next");
             forwardButton.textContent = "Вперед";
-            forwardButton.disabled = products.length <= ((storePages[store] || 0) + 1) * itemsPerPage;
+            forwardButton.disabled = storeTotal <= (currentPage + 1) * itemsPerPage;
             const forwardTop = lastCard.offsetTop + lastCard.offsetHeight / 2;
             forwardButton.style.position = "absolute";
             forwardButton.style.right = "-99px"; // смещаем кнопку дальше за пределы карточки
             forwardButton.style.top = forwardTop + "px";
             forwardButton.style.transform = "translateY(-50%)";
             forwardButton.addEventListener("click", () => {
-              storePages[store] = (storePages[store] || 0) + 1;
-              displayStoreProducts(minPrice, maxPrice, sortOption);
+              fetchStorePage(store, currentPage + 1, minPrice, maxPrice, sortOption);
             });
 
             productGrid.appendChild(backButton);
@@ -361,6 +402,29 @@ function displayStoreProducts(minPrice, maxPrice, sortOption) {
     e.preventDefault();
     performSearch();
   });
+
+  /* ----------- Подсказки по мере ввода (без полного поиска) ----------- */
+  let suggestTimeoutId = null;
+  document.getElementById("search-input").addEventListener("input", (e) => {
+    const prefix = e.target.value.trim();
+    clearTimeout(suggestTimeoutId);
+    if (prefix.length < 2) return;
+    suggestTimeoutId = setTimeout(async () => {
+      try {
+        const response = await fetch(`/api/suggest?q=${encodeURIComponent(prefix)}`);
+        const data = await response.json();
+        const datalist = document.getElementById("search-suggestions");
+        datalist.innerHTML = "";
+        (data.suggestions || []).forEach(suggestion => {
+          const option = document.createElement("option");
+          option.value = suggestion.text;
+          datalist.appendChild(option);
+        });
+      } catch (error) {
+        console.error("Ошибка загрузки подсказок:", error);
+      }
+    }, 150);
+  });
   const checkoutBtn = document.getElementById("checkout-btn");
   if (checkoutBtn) {
     checkoutBtn.addEventListener("click", (e) => {
@@ -417,6 +481,8 @@ function displayStoreProducts(minPrice, maxPrice, sortOption) {
     const lastMax = parseFloat(localStorage.getItem("lastSearchMaxPrice")) || Infinity;
     const lastSort = localStorage.getItem("lastSearchSort") || "default";
     const lastAvail = localStorage.getItem("lastSearchAvailable") === "true";
+    currentQuery = lastQuery;
+    currentAvailableOnly = lastAvail;
     document.getElementById("search-input").value = lastQuery;
     document.getElementById("min-price").value = lastMin;
     if (lastMax !== Infinity) document.getElementById("max-price").value = lastMax;
@@ -0,0 +1,175 @@
+# suggest.py
+"""
+Подсказки для строки поиска (/api/suggest).
+
+Индекс состоит из двух отсортированных массивов ключей: леммы слов из названий
+товаров (вес – число товаров со словом) и запросы из истории поиска (вес – сколько
+раз их искали; запросы копятся в памяти и пишутся в базу пачками). Поиск по префиксу – bisect до начала диапазона совпадений,
+лучшие по весу отбирает heapq.nlargest. Индекс пересобирается после каждого
+обновления каталога и подменяется целиком, как и поисковый индекс.
+"""
+import bisect
+import heapq
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy.exc import SQLAlchemyError
+
+import config
+from models import db, Product, SearchQuery
+from smart_search import STOP_WORDS, tokenize, first_normal_form
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query):
+    return " ".join(tokenize(query))
+
+
+class PrefixIndex:
+    def __init__(self, weights):
+        self.keys = sorted(weights)
+        self.weights = [weights[key] for key in self.keys]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def complete(self, prefix, limit):
+        """Не более limit ключей с префиксом prefix по убыванию веса (при равенстве – по алфавиту)."""
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + "\uffff", start)
+        best = heapq.nlargest(limit, range(start, end), key=lambda i: self.weights[i])
+        return [(self.keys[i], self.weights[i]) for i in best]
+
+
+class SuggestIndex:
+    def __init__(self, words, queries):
+        self.words = PrefixIndex(words)
+        self.queries = PrefixIndex(queries)
+
+    def suggest(self, text, limit):
+        """
+        Сначала запросы из истории, начинающиеся с text, затем text с последним
+        словом, дополненным до леммы из названий товаров.
+        """
+        text = normalize_query(text)
+        if not text:
+            return []
+        suggestions = []
+        seen = set()
+        for query, weight in self.queries.complete(text, limit):
+            seen.add(query)
+            suggestions.append({"text": query, "type": "query", "weight": weight})
+        head, _, last = text.rpartition(" ")
+        if len(last) >= config.SUGGEST_MIN_PREFIX and len(suggestions) < limit:
+            for word, weight in self.words.complete(last, limit):
+                completion = f"{head} {word}" if head else word
+                if completion not in seen:
+                    seen.add(completion)
+                    suggestions.append({"text": completion, "type": "name", "weight": weight})
+        return suggestions[:limit]
+
+
+def build_suggest_index():
+    words = {}
+    for (name,) in db.session.query(Product.name).all():
+        lemmas = {first_normal_form(token) for token in tokenize(name)
+                  if len(token) >= config.SUGGEST_MIN_PREFIX and not token.isdigit() and token not in STOP_WORDS}
+        for lemma in lemmas:
+            words[lemma] = words.get(lemma, 0) + 1
+    queries = {normalize_query(query): 1 for query in config.PREDEFINED_QUERIES}
+    history = (db.session.query(SearchQuery.text, SearchQuery.count)
+               .order_by(SearchQuery.count.desc())
+               .limit(config.SUGGEST_HISTORY_SIZE)
+               .all())
+    for query, count in history:
+        queries[query] = queries.get(query, 0) + count
+    return SuggestIndex(words, queries)
+
+
+class SearchQueryCounter:
+    """Запросы, найденные с прошлой записи истории: считаются в памяти и пишутся в базу пачкой."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._last_searched = {}
+
+    def add(self, query, when):
+        with self._lock:
+            self._counts[query] += 1
+            self._last_searched[query] = when
+
+    def take(self):
+        with self._lock:
+            counts, last_searched = self._counts, self._last_searched
+            self._counts, self._last_searched = Counter(), {}
+        return counts, last_searched
+
+    def restore(self, counts, last_searched):
+        """Возвращает незаписанную пачку – она уйдёт в базу со следующей."""
+        with self._lock:
+            self._counts.update(counts)
+            for query, when in last_searched.items():
+                self._last_searched[query] = max(when, self._last_searched.get(query, when))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._counts)
+
+
+search_query_counter = SearchQueryCounter()
+_flush_lock = threading.Lock()
+
+
+def record_search_query(query):
+    """Учитывает запрос в истории поиска. В базу он попадает при flush_search_queries."""
+    query = normalize_query(query)
+    if query:
+        search_query_counter.add(query, datetime.utcnow())
+
+
+def flush_search_queries():
+    """
+    Записывает накопленные запросы в историю поиска одной транзакцией
+    (по таймеру раз в config.SEARCH_HISTORY_FLUSH_INTERVAL секунд и перед
+    пересборкой подсказок). Возвращает число записанных запросов.
+    """
+    with _flush_lock:
+        counts, last_searched = search_query_counter.take()
+        if not counts:
+            return 0
+        try:
+            entries = {entry.text: entry for entry in SearchQuery.query.filter(SearchQuery.text.in_(list(counts)))}
+            for query, count in counts.items():
+                entry = entries.get(query)
+                if entry is None:
+                    entry = SearchQuery(text=query, count=0)
+                    db.session.add(entry)
+                entry.count += count
+                entry.last_searched = last_searched[query]
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            search_query_counter.restore(counts, last_searched)
+            logger.error("Не удалось сохранить запросы в историю поиска: %s", e)
+            return 0
+        return len(counts)
+
+
+_suggest_index = None
+_suggest_lock = threading.Lock()
+
+
+def get_suggest_index():
+    return _suggest_index
+
+
+def refresh_suggest_index():
+    global _suggest_index
+    index = build_suggest_index()
+    with _suggest_lock:
+        _suggest_index = index
+    return index
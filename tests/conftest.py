@@ -0,0 +1,48 @@
+# tests/conftest.py
+"""
+Общие фикстуры тестов поиска: приложение на копии myapp.db с посчитанными
+данными для поиска. Тесты с каталогом пропускаются, если нет myapp.db или
+зависимостей поиска.
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(ROOT, "myapp.db")
+sys.path.insert(0, ROOT)
+
+# Модули, без которых не импортируются models, smart_search и search_bench
+SEARCH_DEPENDENCIES = ("flask", "flask_sqlalchemy", "flask_login", "sqlalchemy", "numpy", "pymorphy2",
+                       "rapidfuzz", "nltk")
+
+
+def require_catalog():
+    for module in SEARCH_DEPENDENCIES:
+        pytest.importorskip(module)
+    if not os.path.exists(DB_PATH):
+        pytest.skip("нет myapp.db")
+
+
+@pytest.fixture(scope="session")
+def catalog_app(tmp_path_factory):
+    """Приложение на копии myapp.db с построенным поисковым индексом (контекст приложения открыт)."""
+    require_catalog()
+    import config
+    import search_bench
+    import smart_search
+    from models import db
+
+    work_dir = tmp_path_factory.mktemp("catalog")
+    db_path = str(work_dir / "catalog.db")
+    shutil.copy(DB_PATH, db_path)
+    config.SEARCH_VOCABULARY_PATH = str(work_dir / "vocabulary.txt")
+    config.SYNONYMS_PATH = os.path.join(ROOT, "synonyms.json")
+    app = search_bench.create_bench_app(db_path)
+    with app.app_context():
+        db.create_all()
+        smart_search.ensure_search_data()
+        smart_search.refresh_search_structures()
+        yield app
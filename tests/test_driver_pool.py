@@ -0,0 +1,57 @@
+# tests/test_driver_pool.py
+"""Учёт драйверов в DriverPool: проверяемый перед выдачей драйвер входит в size()."""
+import pytest
+
+pytest.importorskip("selenium")
+
+import driver_pool  # noqa: E402
+
+
+class StubDriver:
+    """Драйвер-заглушка: при проверке is_alive запоминает размер пула."""
+
+    def __init__(self, pool, alive=True):
+        self.pool = pool
+        self.alive = alive
+        self.sizes = []
+        self.quitted = False
+
+    @property
+    def current_url(self):
+        self.sizes.append(self.pool.size())
+        if not self.alive:
+            raise RuntimeError("browser is gone")
+        return "about:blank"
+
+    def delete_all_cookies(self):
+        pass
+
+    def quit(self):
+        self.quitted = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = driver_pool.DriverPool(min_size=0, max_size=1, idle_timeout=0)
+    monkeypatch.setattr(driver_pool, "get_driver", lambda headless=True: StubDriver(pool))
+    return pool
+
+
+def test_idle_driver_is_counted_during_health_check(pool):
+    driver = pool.acquire_driver(timeout=1)
+    pool.release_driver(driver)
+    assert pool.acquire_driver(timeout=1) is driver
+    assert driver.sizes == [1]
+    stats = pool.stats()
+    assert stats["in_use"] == 1 and stats["idle"] == 0
+
+
+def test_broken_driver_is_replaced(pool):
+    broken = pool.acquire_driver(timeout=1)
+    pool.release_driver(broken)
+    broken.alive = False
+    driver = pool.acquire_driver(timeout=1)
+    assert driver is not broken and broken.quitted
+    assert broken.sizes == [1]
+    stats = pool.stats()
+    assert stats["in_use"] == 1 and stats["broken"] == 1 and pool.size() == 1
@@ -0,0 +1,123 @@
+# tests/test_page_loader.py
+"""Выбор способа загрузки в page_loader._fetch_page: HTTP или драйвер из пула."""
+import re
+
+import pytest
+
+for module in ("aiohttp", "bs4", "selenium", "flask_sqlalchemy", "flask_login"):
+    pytest.importorskip(module)
+
+import config  # noqa: E402
+import page_loader  # noqa: E402
+from http_client import HttpResponse  # noqa: E402
+from page_changes import PageTracker  # noqa: E402
+
+URL = "https://shop.test/search?q=стакан"
+LISTING = "<html><body><div class='card'>Стакан 400 мл</div></body></html>"
+SHELL = "<html><body><nav><a href='/catalog/cups'>Стаканы</a></nav><div id='app'></div></body></html>"
+RENDERED = "<html><body><div class='card'>Стакан 400 мл</div><div class='card'>Стакан 300 мл</div></body></html>"
+
+
+def extract(html):
+    return [{"name": name} for name in re.findall(r"class='card'>([^<]*)<", html)]
+
+
+class StubHttp:
+    def __init__(self, text, status=200):
+        self.response = HttpResponse(status, text, "etag-1", None)
+        self.calls = 0
+
+    def fetch(self, url, timeout=10, etag=None, last_modified=None):
+        self.calls += 1
+        return self.response
+
+
+class StubPool:
+    def __init__(self):
+        self.acquired = 0
+        self.released = 0
+
+    def acquire_driver(self, timeout=10):
+        self.acquired += 1
+        return object()
+
+    def release_driver(self, driver):
+        self.released += 1
+
+
+@pytest.fixture
+def loader(monkeypatch):
+    """Магазин "shop" с загрузкой по HTTP; драйвер отдаёт RENDERED."""
+    monkeypatch.setitem(config.FETCH_STRATEGIES, "shop", "http")
+    monkeypatch.setattr(config, "PARSER_SAVE_PAGES_DIR", None)
+    monkeypatch.setattr(page_loader, "fetch_stats", page_loader.FetchStats())
+    pool = StubPool()
+    monkeypatch.setattr(page_loader, "driver_pool", pool)
+    monkeypatch.setattr(page_loader, "set_blocked_urls", lambda driver, patterns: None)
+    monkeypatch.setattr(page_loader, "page_bytes", lambda driver: 0)
+    monkeypatch.setattr(page_loader, "load_page", lambda driver, url, css_selector, wait_time=15, attempts=3: RENDERED)
+
+    def use_http(text, status=200):
+        http = StubHttp(text, status)
+        monkeypatch.setattr(page_loader, "http_client", http)
+        return http
+
+    return pool, use_http
+
+
+def fetch(tracker=None):
+    return page_loader._fetch_page("shop", URL, ".card", extract, 15, 3, tracker, 1)
+
+
+def test_http_page_with_products_is_accepted(loader):
+    pool, use_http = loader
+    http = use_http(LISTING)
+    html, products = fetch()
+    assert html == LISTING
+    assert [p["name"] for p in products] == ["Стакан 400 мл"]
+    assert http.calls == 1 and pool.acquired == 0
+    stats = page_loader.fetch_stats.snapshot()["shop"]
+    assert stats["http"] == 1 and stats["browser"] == 0 and stats["http_misses"] == 0
+
+
+def test_http_page_without_products_falls_back_to_browser(loader):
+    pool, use_http = loader
+    use_http(SHELL)
+    html, products = fetch()
+    assert html == RENDERED
+    assert len(products) == 2
+    assert pool.acquired == pool.released == 1
+    stats = page_loader.fetch_stats.snapshot()["shop"]
+    assert stats["http"] == 0 and stats["browser"] == 1 and stats["http_misses"] == 1
+
+
+def test_failed_http_request_falls_back_to_browser(loader, monkeypatch):
+    pool, use_http = loader
+    http = use_http(LISTING)
+
+    def fail(*args, **kwargs):
+        raise OSError("connection reset")
+
+    monkeypatch.setattr(http, "fetch", fail)
+    html, products = fetch()
+    assert html == RENDERED and len(products) == 2
+    assert pool.acquired == 1
+
+
+def test_browser_strategy_skips_http(loader, monkeypatch):
+    pool, use_http = loader
+    http = use_http(LISTING)
+    monkeypatch.setitem(config.FETCH_STRATEGIES, "shop", "browser")
+    html, _ = fetch()
+    assert html == RENDERED
+    assert http.calls == 0 and pool.acquired == 1
+
+
+def test_http_not_modified_returns_none(loader):
+    pool, use_http = loader
+    use_http("", status=304)
+    previous = {1: {"url": URL, "fingerprint": "x", "etag": "etag-1", "last_modified": None, "parsed_at": None}}
+    tracker = PageTracker("shop", "стакан", previous)
+    assert fetch(tracker) is None
+    assert pool.acquired == 0
+    assert tracker.unchanged
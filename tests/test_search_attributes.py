@@ -0,0 +1,24 @@
+# tests/test_search_attributes.py
+"""Атрибуты из текста запроса и фильтры атрибутов в поиске."""
+import pytest
+
+from product_attributes import normalize_filters
+
+
+@pytest.mark.parametrize("query", ["стакан 400 мл", "стакан 400мл"])
+def test_volume_query_finds_cups_of_that_volume(catalog_app, query):
+    from models import Product, ProductAttributes
+    from smart_search import clear_result_cache, search_products
+
+    rows = (Product.query.join(ProductAttributes, ProductAttributes.product_id == Product.id)
+            .filter(ProductAttributes.volume_ml == 400).all())
+    cups = {row.id for row in rows if "стакан" in row.name.lower()}
+    assert cups, "в каталоге нет стаканов 400 мл"
+    clear_result_cache()
+    top = {item["id"] for item in search_products(query, group=False, limit=20)}
+    assert cups <= top
+
+
+@pytest.mark.parametrize("value", ["полипропилен", "Полипропиленовый", "PP", "пп"])
+def test_material_filter_uses_stored_notation(value):
+    assert normalize_filters({"material": value}) == {"material": "пп"}
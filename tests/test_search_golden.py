@@ -0,0 +1,50 @@
+# tests/test_search_golden.py
+"""
+Проверка выдачи smart_search по эталону search_golden.json – то же, что
+`python search_bench.py --check`, но без порога задержек: время зависит от машины
+и проверяется только вручную (search_bench.py --check --check-timing).
+Пропускается, если нет myapp.db или зависимостей поиска.
+"""
+import os
+
+import pytest
+
+from conftest import DB_PATH, ROOT, require_catalog
+
+
+@pytest.fixture(scope="module")
+def bench():
+    require_catalog()
+    import search_bench
+
+    # Словарь синонимов, эталон и словарь лемм заданы путями относительно корня репозитория
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        report = search_bench.run_benchmark(DB_PATH, repeat=1)
+        golden = search_bench.load_json(search_bench.GOLDEN_PATH)
+    finally:
+        os.chdir(cwd)
+    return search_bench, report, golden
+
+
+def test_golden_recall(bench):
+    search_bench, report, golden = bench
+    assert golden, "пустой эталон search_golden.json"
+    recalls, _ = search_bench.compare_with_golden(report, golden)
+    low = {query: value for query, value in recalls.items() if value < search_bench.MIN_RECALL}
+    assert not low
+
+
+def test_typo_queries_match_correct_spelling(bench):
+    search_bench, report, _ = bench
+    low = {typo: value for typo, value in report["typo_recall"].items() if value < search_bench.MIN_RECALL}
+    assert not low
+
+
+def test_refinement_matches_full_search(bench):
+    search_bench, report, _ = bench
+    low = {query: data["recall"] for query, data in report["refinement"].items()
+           if data["recall"] < search_bench.MIN_RECALL}
+    assert not low
+
@@ -0,0 +1,45 @@
+# tests/test_search_scoring.py
+"""
+Пакетная оценка (TokenTable.score, score_batch) должна совпадать с поштучной
+score_normalized до последнего бита – иначе меняется порядок выдачи.
+Сравнение идёт по кандидатам запросов из каталога myapp.db.
+"""
+import pytest
+
+
+@pytest.fixture(scope="module")
+def search(catalog_app):
+    """Модуль smart_search, запросы для сравнения и строки всего каталога (в порядке id)."""
+    import config
+    import search_bench
+    import smart_search
+    from models import Product
+
+    queries = list(dict.fromkeys(config.PREDEFINED_QUERIES + list(search_bench.TYPO_QUERIES)))
+    rows = smart_search.load_candidate_rows({product_id for (product_id,) in Product.query.with_entities(Product.id)})
+    return smart_search, queries, rows
+
+
+def scalar_scores(smart_search, norm_query, norm_products):
+    return [smart_search.score_normalized(norm_query, norm_product) for norm_product in norm_products]
+
+
+def test_score_batch_matches_scalar(search):
+    smart_search, queries, _ = search
+    for query in queries:
+        norm_products = [norm_name for _, norm_name in smart_search.search_candidates(query).rows]
+        norm_query = smart_search.normalize_name(query)
+        batch = smart_search.score_batch(norm_query, norm_products).tolist()
+        assert batch == scalar_scores(smart_search, norm_query, norm_products), query
+
+
+def test_shared_table_columns_match_scalar(search):
+    # Общая таблица всего каталога и позиции кандидатов в ней, как в search_products_batch
+    smart_search, queries, rows = search
+    table = smart_search.TokenTable([norm_name for _, norm_name in rows])
+    position = {row.id: i for i, (row, _) in enumerate(rows)}
+    for query in queries:
+        columns = [position[row.id] for row, _ in smart_search.search_candidates(query).rows]
+        norm_query = smart_search.normalize_name(query)
+        batch = table.score(norm_query, smart_search.tokenize(norm_query), columns).tolist()
+        assert batch == scalar_scores(smart_search, norm_query, [rows[i][1] for i in columns]), query
@@ -0,0 +1,29 @@
+# tests/test_search_sort.py
+"""Сортировка выдачи select_top: товары без цены (0.0) идут в конце."""
+import pytest
+
+from conftest import SEARCH_DEPENDENCIES
+
+for module in SEARCH_DEPENDENCIES:
+    pytest.importorskip(module)
+
+import search_bench  # noqa: E402,F401  (совместимость inspect.getargspec для pymorphy2)
+from smart_search import select_top  # noqa: E402
+
+ITEMS = [{"id": i, "price": price, "unit_price": price, "similarity": 100 - i}
+         for i, price in enumerate([0.0, 5.0, 2.0, 0.0, 9.0])]
+
+
+def prices(items):
+    return [item["price"] for item in items]
+
+
+@pytest.mark.parametrize("sort, expected", [
+    ("priceAsc", [2.0, 5.0, 9.0, 0.0, 0.0]),
+    ("unitPriceAsc", [2.0, 5.0, 9.0, 0.0, 0.0]),
+    ("priceDesc", [9.0, 5.0, 2.0, 0.0, 0.0]),
+])
+def test_unknown_prices_sort_last(sort, expected):
+    assert prices(select_top(ITEMS, sort=sort, getter=dict.get)) == expected
+    # Страница через heapq совпадает с полной сортировкой
+    assert prices(select_top(ITEMS, limit=2, offset=2, sort=sort, getter=dict.get)) == expected[2:4]